@@ -0,0 +1,168 @@
+"""
+ASGI entry point serving the same routes as app.py from an event loop:
+
+    hypercorn asgi:app --bind 0.0.0.0:8000
+
+Requests never hold a thread while they wait. Encoding and vector search
+run on a pool of CORTEX_ENCODE_THREADS threads (which also feed the
+request batcher), session/database reads and writes on the loop's default executor,
+and the web fallback is awaited with its deadline on the searcher's own pool.
+"""
+import asyncio
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from typing import Iterator
+
+from quart import Quart, Request, request
+from quart_cors import cors
+
+import metrics
+import service
+
+
+class CortexRequest(Request):
+    """/add/batch bodies get their own size limit instead of the app-wide MAX_CONTENT_LENGTH."""
+
+    def __init__(self, method, scheme, path, *args, **kwargs):
+        if path == "/add/batch":
+            kwargs["max_content_length"] = service.ADD_BATCH_MAX_BYTES
+        super().__init__(method, scheme, path, *args, **kwargs)
+
+
+app = cors(Quart(__name__))
+app.request_class = CortexRequest
+app.config["MAX_CONTENT_LENGTH"] = int(os.environ.get("CORTEX_MAX_BODY_MB", "16")) * 1024 * 1024
+
+encode_pool = ThreadPoolExecutor(
+    max_workers=int(os.environ.get("CORTEX_ENCODE_THREADS", "8")),
+    thread_name_prefix="encode",
+)
+
+
+async def _run_cpu(fn, *args):
+    return await asyncio.get_running_loop().run_in_executor(encode_pool, fn, *args)
+
+
+async def _run_io(fn, *args):
+    return await asyncio.get_running_loop().run_in_executor(None, fn, *args)
+
+
+def respond(body, status: int = 200):
+    with metrics.stage("serialize"):
+        data = app.json.dumps(body)
+    return app.response_class(f"{data}\n", status=status, mimetype="application/json")
+
+
+def _body_chunks(body, loop) -> Iterator[bytes]:
+    """
+    The request body for a CPU-pool thread: each chunk is awaited on the
+    event loop as the consumer gets to it, so the body is never buffered whole.
+    """
+    chunks = body.__aiter__()
+    while True:
+        try:
+            yield asyncio.run_coroutine_threadsafe(chunks.__anext__(), loop).result()
+        except StopAsyncIteration:
+            return
+
+
+@app.after_serving
+async def shutdown():
+    encode_pool.shutdown(wait=False, cancel_futures=True)
+
+
+@app.route("/")
+async def home():
+    return respond(service.home_info())
+
+
+@app.route("/session/new", methods=["POST"])
+async def create_new_session():
+    body, status = await _run_io(service.handle_new_session)
+    return respond(body, status)
+
+
+@app.route("/session/clear", methods=["POST"])
+async def clear_session():
+    body, status = await _run_io(service.handle_clear_session, await request.get_json())
+    return respond(body, status)
+
+
+@app.route("/session/info", methods=["GET"])
+async def get_session_info():
+    body, status = await _run_io(service.handle_session_info, request.args.get("session_id"))
+    return respond(body, status)
+
+
+@app.route("/ask", methods=["POST"])
+async def ask_question():
+    try:
+        question, session_id, error = service.parse_ask(await request.get_json())
+        if error:
+            body, status = error
+            return respond(body, status)
+
+        started = time.perf_counter()
+        session_id, context_vector, cache_key, payload, embedding = await _run_io(service.start_ask, question, session_id)
+        cached = payload is not None
+
+        if payload is None:
+            result, embedding = await _run_cpu(service.lookup_answer, question, context_vector)
+            web_result = None
+            if service.needs_web_search(result):
+                service.logger.debug("Low confidence, trying web search...")
+                with metrics.stage("web_fallback"):
+                    web_result = await service.web_searcher.search_async(question)
+            payload = service.build_answer_payload(question, result, web_result)
+
+        # Session write, context fold and expiry sweep: off the loop like the reads
+        response = await _run_io(
+            service.finish_ask, session_id, question, context_vector, cache_key, payload, cached, started, embedding
+        )
+        return respond(response, 200)
+
+    except Exception as e:
+        body, status = service.ask_error(e)
+        return respond(body, status)
+
+
+@app.route("/add", methods=["POST"])
+async def add_qa_pair():
+    body, status = await _run_cpu(service.handle_add, await request.get_json())
+    return respond(body, status)
+
+
+@app.route("/add/batch", methods=["POST"])
+async def add_qa_batch():
+    if service.is_ndjson(request.content_type):
+        # Parsed line by line while the pool thread pulls chunks off the stream
+        items = service.iter_ndjson(service.split_lines(_body_chunks(request.body, asyncio.get_running_loop())))
+    else:
+        items, error = service.parse_json_array(await request.get_data())
+        if error:
+            body, status = error
+            return respond(body, status)
+    body, status = await _run_cpu(service.handle_add_batch, items)
+    return respond(body, status)
+
+
+@app.route("/cache/clear", methods=["POST"])
+async def clear_cache():
+    body, status = await _run_io(service.handle_clear_cache)
+    return respond(body, status)
+
+
+@app.route("/stats", methods=["GET"])
+async def get_stats():
+    return respond(await _run_io(service.collect_stats))
+
+
+@app.route("/metrics", methods=["GET"])
+async def get_metrics():
+    return app.response_class(metrics.REGISTRY.render(), content_type=metrics.CONTENT_TYPE)
+
+
+if __name__ == "__main__":
+    app.run(port=8000)
@@ -0,0 +1,90 @@
+"""
+Exact-search benchmark: ExactIndex vs the previous QAEngine path
+(sklearn cosine_similarity + full argsort, np.vstack per insert).
+
+    python benchmarks/bench_exact_index.py --sizes 10000 100000 1000000
+
+Vectors are random, so only latency is measured; results are printed as
+one JSON object per size.
+"""
+import argparse
+import json
+import statistics
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from vector_index import ExactIndex  # noqa: E402
+
+
+def _timed(fn, repeats: int) -> dict:
+    samples = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - started) * 1000)
+    samples.sort()
+    return {
+        "p50_ms": statistics.median(samples),
+        "p95_ms": samples[min(len(samples) - 1, int(len(samples) * 0.95))],
+    }
+
+
+def bench_size(rows: int, dim: int, top_k: int, batch: int, repeats: int, inserts: int, baseline: bool) -> dict:
+    rng = np.random.default_rng(0)
+    corpus = rng.standard_normal((rows, dim), dtype=np.float32)
+    queries = rng.standard_normal((batch, dim), dtype=np.float32)
+    new_rows = rng.standard_normal((inserts, dim), dtype=np.float32)
+
+    result = {"rows": rows, "dim": dim, "top_k": top_k, "batch": batch}
+
+    index = ExactIndex()
+    started = time.perf_counter()
+    index.reset(corpus)
+    result["build_s"] = time.perf_counter() - started
+
+    result["single_query"] = _timed(lambda: index.search(queries[:1], top_k), repeats)
+    result["batched_query"] = _timed(lambda: index.search(queries, top_k), repeats)
+    result["batched_query"]["per_query_ms"] = result["batched_query"]["p50_ms"] / batch
+
+    started = time.perf_counter()
+    for row in new_rows:
+        index.add(row)
+    result["insert_us_per_row"] = (time.perf_counter() - started) / inserts * 1e6
+
+    if baseline:
+        from sklearn.metrics.pairwise import cosine_similarity
+
+        def old_search():
+            similarities = cosine_similarity(queries[:1], corpus)[0]
+            similarities.argsort()[-top_k:][::-1]
+
+        result["baseline_single_query"] = _timed(old_search, repeats)
+
+        matrix = corpus
+        started = time.perf_counter()
+        for row in new_rows:
+            matrix = np.vstack([matrix, row])
+        result["baseline_insert_us_per_row"] = (time.perf_counter() - started) / inserts * 1e6
+
+    return result
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--top-k", type=int, default=5)
+    parser.add_argument("--batch", type=int, default=32)
+    parser.add_argument("--repeats", type=int, default=20)
+    parser.add_argument("--inserts", type=int, default=50)
+    parser.add_argument("--no-baseline", action="store_true", help="skip the sklearn/vstack comparison")
+    args = parser.parse_args()
+
+    for rows in args.sizes:
+        print(json.dumps(bench_size(
+            rows, args.dim, args.top_k, args.batch, args.repeats, args.inserts, not args.no_baseline
+        )), flush=True)
@@ -0,0 +1,91 @@
+"""
+Dense vs hybrid vs lexical-only retrieval on the real knowledge bases.
+
+    python benchmarks/bench_hybrid_search.py --csv ../data/knowledge_base.csv ../data/technical_qa.csv
+
+Every question in a CSV is asked as-is and in a perturbed form (lowercased,
+punctuation stripped, one word dropped). For each mode the script reports
+search latency, top-1 agreement with the dense result and how often the
+top-1 match is the row the question came from. The query embedding cache is
+cleared before each mode so dense/hybrid latency includes encoding.
+Prints one JSON object per CSV and query set.
+"""
+import argparse
+import json
+import random
+import re
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import pandas as pd
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BACKEND_DIR))
+from latency import summarize  # noqa: E402
+from rag_engine import SEARCH_MODES, QAEngineRag  # noqa: E402
+
+
+def perturb(question: str, rng: random.Random) -> str:
+    words = re.sub(r"[^\w\s+#]", " ", question.lower()).split()
+    if len(words) > 2:
+        del words[rng.randrange(len(words))]
+    return " ".join(words)
+
+
+def bench_queries(engine: QAEngineRag, queries: list, expected: list, modes: list, top_k: int) -> dict:
+    top1 = {}
+    result = {}
+    for mode in modes:
+        engine.clear_query_cache()
+        latencies_ms = []
+        top1[mode] = []
+        for query in queries:
+            started = time.perf_counter()
+            matches = engine.search(query, top_k=top_k, mode=mode)
+            latencies_ms.append((time.perf_counter() - started) * 1000)
+            top1[mode].append(matches[0]["id"] if matches else None)
+        result[mode] = {
+            "latency_ms": summarize(latencies_ms),
+            "top1_correct": sum(a == b for a, b in zip(top1[mode], expected)) / len(expected),
+        }
+
+    if "dense" in top1:
+        for mode in modes:
+            result[mode]["top1_agreement_with_dense"] = (
+                sum(a == b for a, b in zip(top1[mode], top1["dense"])) / len(queries)
+            )
+    return result
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--csv", nargs="+", default=[
+        str(BACKEND_DIR.parent / "data" / "knowledge_base.csv"),
+        str(BACKEND_DIR.parent / "data" / "technical_qa.csv"),
+    ])
+    parser.add_argument("--modes", nargs="+", choices=SEARCH_MODES, default=list(SEARCH_MODES))
+    parser.add_argument("--top-k", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as persist_root:
+        for csv_path in args.csv:
+            engine = QAEngineRag(persist_directory=Path(persist_root) / Path(csv_path).stem)
+            engine.load_from_csv(csv_path)
+
+            df = pd.read_csv(csv_path, encoding="utf-8").drop_duplicates("question", keep="last")
+            questions = df["question"].astype(str).tolist()
+            expected = [QAEngineRag._make_id(q) for q in questions]
+            rng = random.Random(args.seed)
+            query_sets = {"original": questions, "perturbed": [perturb(q, rng) for q in questions]}
+
+            for name, queries in query_sets.items():
+                print(json.dumps({
+                    "csv": Path(csv_path).name,
+                    "queries": name,
+                    "count": len(queries),
+                    "lexical_index": engine.lexical_index.stats(),
+                    "modes": bench_queries(engine, queries, expected, args.modes, args.top_k),
+                }, ensure_ascii=False), flush=True)
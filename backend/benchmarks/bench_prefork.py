@@ -0,0 +1,204 @@
+"""
+Per-worker memory and aggregate throughput of the pre-fork layout
+(gunicorn preload, workers share the model copy-on-write) against every
+worker loading its own copy (CORTEX_PRELOAD=0).
+
+    python benchmarks/bench_prefork.py --workers 4 --concurrency 32 --duration 30
+    python benchmarks/bench_prefork.py --rows 100000   # synthetic KB instead of --csv
+
+The index is built once into a temporary state directory (reload_db.py),
+then for each layout the server is started on it from gunicorn.conf.py with
+the stub web provider, measured at idle and again after a fixed-duration
+/ask load, and stopped. Every ask is a reworded KB question with a random
+number appended, so neither the exact index nor the response or query
+caches answer it: each request runs the encoder and the vector search.
+RSS counts shared pages in every process, PSS splits them between the
+processes sharing them, so sum(PSS) is the real footprint.
+Linux only (reads /proc). Prints one JSON object per layout.
+"""
+import argparse
+import json
+import os
+import random
+import signal
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.request
+from pathlib import Path
+
+import pandas as pd
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BACKEND_DIR))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+from latency import summarize  # noqa: E402
+from synthetic_kb import reword_question, write_kb  # noqa: E402
+
+LAYOUTS = {"preload": "1", "per-worker": "0"}
+
+
+def _memory_kb(pid: int) -> dict:
+    fields = {}
+    with open(f"/proc/{pid}/smaps_rollup") as f:
+        for line in f:
+            parts = line.split()
+            if parts[0] in ("Rss:", "Pss:"):
+                fields[parts[0][:-1].lower() + "_mb"] = int(parts[1]) / 1024
+    return fields
+
+
+def _children(pid: int) -> list:
+    children = []
+    for task in Path(f"/proc/{pid}/task").iterdir():
+        children.extend(int(c) for c in (task / "children").read_text().split())
+    return children
+
+
+def _memory(master: int) -> dict:
+    workers = [_memory_kb(pid) for pid in _children(master)]
+    master_mem = _memory_kb(master)
+    return {
+        "master": master_mem,
+        "workers": workers,
+        "worker_rss_mb_mean": sum(w["rss_mb"] for w in workers) / max(1, len(workers)),
+        "total_pss_mb": master_mem["pss_mb"] + sum(w["pss_mb"] for w in workers),
+    }
+
+
+def _post(url: str, body: dict) -> dict:
+    request = urllib.request.Request(
+        url, data=json.dumps(body).encode("utf-8"), headers={"Content-Type": "application/json"}
+    )
+    with urllib.request.urlopen(request, timeout=60) as response:
+        return json.loads(response.read())
+
+
+def _wait_ready(base_url: str, timeout: float) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            urllib.request.urlopen(base_url + "/stats", timeout=5).read()
+            return
+        except OSError:
+            time.sleep(0.5)
+    raise TimeoutError(f"server at {base_url} not ready after {timeout}s")
+
+
+def _ask(questions: list, rng: random.Random) -> dict:
+    # Unique text every time: no exact hit, no cached answer or query vector
+    return {"question": f"{reword_question(rng.choice(questions), rng)} {rng.randrange(1_000_000)}"}
+
+
+def _load(base_url: str, questions: list, concurrency: int, duration: float) -> dict:
+    latencies_ms = []
+    errors = 0
+    lock = threading.Lock()
+    stop_at = time.monotonic() + duration
+
+    def run(seed: int) -> None:
+        nonlocal errors
+        rng = random.Random(seed)
+        while time.monotonic() < stop_at:
+            started = time.perf_counter()
+            try:
+                _post(base_url + "/ask", _ask(questions, rng))
+            except OSError:
+                with lock:
+                    errors += 1
+                continue
+            with lock:
+                latencies_ms.append((time.perf_counter() - started) * 1000)
+
+    threads = [threading.Thread(target=run, args=(i,)) for i in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    return {"requests": len(latencies_ms), "errors": errors, "qps": len(latencies_ms) / duration, "latency_ms": summarize(latencies_ms)}
+
+
+def _server_env(state_dir: Path, kb_path: Path) -> dict:
+    return {
+        **os.environ,
+        "CORTEX_KB_CSV": str(kb_path),
+        "CORTEX_STATE_DIR": str(state_dir),
+        "CORTEX_CSV_WRITE_BEHIND": "0",
+    }
+
+
+def build_index(state_dir: Path, kb_path: Path) -> float:
+    """Embed the KB once so neither layout's startup includes the index build."""
+    started = time.perf_counter()
+    subprocess.run(
+        [sys.executable, "reload_db.py"],
+        cwd=BACKEND_DIR, env=_server_env(state_dir, kb_path), stdout=subprocess.DEVNULL, check=True
+    )
+    return time.perf_counter() - started
+
+
+def bench_layout(layout: str, args, questions: list, state_dir: Path, kb_path: Path) -> dict:
+    port = args.port
+    base_url = f"http://127.0.0.1:{port}"
+    env = {
+        **_server_env(state_dir, kb_path),
+        "CORTEX_PRELOAD": LAYOUTS[layout],
+        "CORTEX_WORKERS": str(args.workers),
+        "CORTEX_WORKER_THREADS": str(args.threads),
+        "CORTEX_BIND": f"127.0.0.1:{port}",
+        "CORTEX_WEB_PROVIDER": "stub",
+        "CORTEX_SESSION_DB": str(state_dir / "sessions" / f"bench-{layout}.db"),
+    }
+
+    started = time.perf_counter()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py"],
+        cwd=BACKEND_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    try:
+        _wait_ready(base_url, args.startup_timeout)
+        # Every worker has to have loaded the app before memory is comparable
+        rng = random.Random(args.seed)
+        for _ in range(args.workers * 4):
+            _post(base_url + "/ask", _ask(questions, rng))
+        result = {
+            "layout": layout,
+            "workers": args.workers,
+            "startup_s": time.perf_counter() - started,
+            "idle": _memory(server.pid),
+        }
+        result["load"] = _load(base_url, questions, args.concurrency, args.duration)
+        result["after_load"] = _memory(server.pid)
+        return result
+    finally:
+        server.send_signal(signal.SIGTERM)
+        server.wait(timeout=60)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--layouts", nargs="+", choices=list(LAYOUTS), default=list(LAYOUTS))
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--duration", type=float, default=30.0)
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--startup-timeout", type=float, default=600.0)
+    parser.add_argument("--csv", type=Path, default=BACKEND_DIR.parent / "data" / "knowledge_base.csv")
+    parser.add_argument("--rows", type=int, help="benchmark a synthetic KB of this many rows instead of --csv")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix="cortex-prefork-") as work_dir:
+        work_dir = Path(work_dir)
+        kb_path = write_kb(work_dir / "kb.csv", args.rows, args.seed) if args.rows else args.csv
+        questions = pd.read_csv(kb_path, encoding="utf-8", usecols=["question"])["question"].dropna().astype(str).tolist()
+        state_dir = work_dir / "state"
+        index_build_s = build_index(state_dir, kb_path)
+
+        for layout in args.layouts:
+            result = bench_layout(layout, args, questions, state_dir, kb_path)
+            print(json.dumps({**result, "kb_rows": len(questions), "index_build_s": index_build_s}), flush=True)
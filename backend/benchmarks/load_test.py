@@ -0,0 +1,304 @@
+"""
+End-to-end load test of the HTTP API for both engines (QAEngineRag on
+Chroma, QAEngine in memory) over synthetic knowledge bases.
+
+    python benchmarks/load_test.py --engines rag memory --rows 1000 100000 \\
+        --concurrency 32 --duration 60 --output results.jsonl
+
+For every engine/size pair a KB is generated (synthetic_kb.py), a fresh
+gunicorn server is started from gunicorn.conf.py on its own state
+directory with the stub web provider, and client threads drive a mix of
+/ask, /add and /session/* requests:
+
+- asks are known questions (exact path), reworded ones (vector search) or
+  unknown ones (web fallback), per --reworded-ratio / --unknown-ratio
+- --session-reuse is the chance an ask continues one of the thread's
+  sessions instead of starting a new one
+- /add needs --workers 1, servers with more workers are read-only
+
+Each scenario prints one JSON object: startup time (wall clock plus the
+engine's own breakdown), RSS/PSS idle and after load, QPS and p50/p95/p99
+latency per endpoint, error counts and the git commit, so runs can be
+appended to one file and compared across commits. Linux only (reads /proc).
+"""
+import argparse
+import json
+import os
+import random
+import signal
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.request
+from collections import defaultdict
+from datetime import datetime, timezone
+from pathlib import Path
+
+import pandas as pd
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BACKEND_DIR))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+from latency import summarize  # noqa: E402
+from synthetic_kb import reword_question, write_kb  # noqa: E402
+
+ENGINES = ("rag", "memory")
+SESSION_OPS = ("/session/new", "/session/info", "/session/clear")
+UNKNOWN_QUESTIONS = [
+    "How do I tune the garbage collector of a JVM in production?",
+    "ما هي أفضل طريقة لنشر تطبيق على Kubernetes؟",
+    "Wie richte ich einen Reverse Proxy mit nginx ein?",
+    "What is the capital of Australia?",
+    "كيف أتعلم الطبخ بسرعة؟",
+]
+
+
+def _git_commit() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _process_tree(pid: int) -> list:
+    pids = [pid]
+    for task in Path(f"/proc/{pid}/task").iterdir():
+        for child in (task / "children").read_text().split():
+            pids.extend(_process_tree(int(child)))
+    return pids
+
+
+def _memory_mb(master: int) -> dict:
+    rss = pss = 0.0
+    for pid in _process_tree(master):
+        with open(f"/proc/{pid}/smaps_rollup") as f:
+            for line in f:
+                parts = line.split()
+                if parts[0] == "Rss:":
+                    rss += int(parts[1]) / 1024
+                elif parts[0] == "Pss:":
+                    pss += int(parts[1]) / 1024
+    return {"rss_mb": rss, "pss_mb": pss}
+
+
+def _request(base_url: str, method: str, path: str, body: dict | None = None) -> dict:
+    data = json.dumps(body).encode("utf-8") if body is not None else None
+    request = urllib.request.Request(
+        base_url + path, data=data, method=method, headers={"Content-Type": "application/json"}
+    )
+    with urllib.request.urlopen(request, timeout=60) as response:
+        return json.loads(response.read())
+
+
+def _wait_ready(base_url: str, timeout: float) -> dict:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            return _request(base_url, "GET", "/stats")
+        except OSError:
+            time.sleep(0.2)
+    raise TimeoutError(f"server at {base_url} not ready after {timeout}s")
+
+
+class Workload:
+    """One client thread's request mix; sessions it creates are reused for later asks."""
+
+    def __init__(self, questions: list, args, seed: int):
+        self.questions = questions
+        self.args = args
+        self.rng = random.Random(seed)
+        self.sessions: list = []
+        self.added = 0
+        self.seed = seed
+
+    def _session(self) -> str | None:
+        if self.sessions and self.rng.random() < self.args.session_reuse:
+            return self.rng.choice(self.sessions)
+        return None
+
+    def _remember(self, session_id: str) -> None:
+        self.sessions.append(session_id)
+        del self.sessions[:-20]
+
+    def next_request(self) -> tuple:
+        """(endpoint label, method, path, body)"""
+        roll = self.rng.random()
+        if roll < self.args.add_ratio:
+            self.added += 1
+            question = f"Load test question {self.seed}-{self.added}: {self.rng.choice(self.questions)}"
+            return "/add", "POST", "/add", {"question": question, "answer": "Added by the load test."}
+
+        if roll < self.args.add_ratio + self.args.session_ratio:
+            endpoint = self.rng.choice(SESSION_OPS)
+            session_id = self.rng.choice(self.sessions) if self.sessions else None
+            if endpoint == "/session/new" or session_id is None:
+                return "/session/new", "POST", "/session/new", {}
+            if endpoint == "/session/info":
+                return endpoint, "GET", f"/session/info?session_id={session_id}", None
+            self.sessions.remove(session_id)
+            return endpoint, "POST", "/session/clear", {"session_id": session_id}
+
+        kind = self.rng.random()
+        if kind < self.args.unknown_ratio:
+            question = self.rng.choice(UNKNOWN_QUESTIONS)
+        elif kind < self.args.unknown_ratio + self.args.reworded_ratio:
+            question = reword_question(self.rng.choice(self.questions), self.rng)
+        else:
+            question = self.rng.choice(self.questions)
+        body = {"question": question}
+        session_id = self._session()
+        if session_id:
+            body["session_id"] = session_id
+        return "/ask", "POST", "/ask", body
+
+    def record(self, endpoint: str, response: dict) -> None:
+        if endpoint in ("/ask", "/session/new") and "session_id" in response:
+            if response["session_id"] not in self.sessions:
+                self._remember(response["session_id"])
+
+
+def drive(base_url: str, questions: list, args) -> dict:
+    latencies_ms = defaultdict(list)
+    errors = defaultdict(int)
+    sources = defaultdict(int)
+    lock = threading.Lock()
+    stop_at = time.monotonic() + args.duration
+
+    def run(seed: int) -> None:
+        workload = Workload(questions, args, seed)
+        while time.monotonic() < stop_at:
+            endpoint, method, path, body = workload.next_request()
+            started = time.perf_counter()
+            try:
+                response = _request(base_url, method, path, body)
+            except (OSError, ValueError):
+                # Error statuses land here too, HTTPError is an OSError
+                with lock:
+                    errors[endpoint] += 1
+                continue
+            elapsed_ms = (time.perf_counter() - started) * 1000
+            workload.record(endpoint, response)
+            with lock:
+                latencies_ms[endpoint].append(elapsed_ms)
+                if endpoint == "/ask":
+                    sources[("cached-" if response.get("cached") else "") + str(response.get("source"))] += 1
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=run, args=(args.seed * 1000 + i,)) for i in range(args.concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    total = sum(len(samples) for samples in latencies_ms.values())
+    return {
+        "duration_s": elapsed,
+        "requests": total,
+        "qps": total / elapsed,
+        "errors": dict(errors),
+        "ask_sources": dict(sources),
+        "endpoints": {
+            endpoint: {"qps": len(samples) / elapsed, "latency_ms": summarize(samples)}
+            for endpoint, samples in sorted(latencies_ms.items())
+        },
+    }
+
+
+def run_scenario(engine: str, rows: int, args, work_dir: Path) -> dict:
+    state_dir = work_dir / f"{engine}-{rows}"
+    kb_path = work_dir / f"kb_{rows}.csv"
+    if not kb_path.exists():
+        write_kb(kb_path, rows, args.seed)
+    questions = pd.read_csv(kb_path, encoding="utf-8", usecols=["question"])["question"].astype(str)
+    questions = questions.sample(min(len(questions), 10_000), random_state=args.seed).tolist()
+
+    base_url = f"http://127.0.0.1:{args.port}"
+    env = {
+        **os.environ,
+        "CORTEX_ENGINE": engine,
+        "CORTEX_KB_CSV": str(kb_path),
+        "CORTEX_STATE_DIR": str(state_dir),
+        "CORTEX_WEB_PROVIDER": "stub",
+        # /add traffic must not grow the shared kb_{rows}.csv between scenarios
+        "CORTEX_CSV_WRITE_BEHIND": "0",
+        "CORTEX_WORKERS": str(args.workers),
+        "CORTEX_WORKER_THREADS": str(args.threads),
+        "CORTEX_BIND": f"127.0.0.1:{args.port}",
+    }
+
+    started = time.perf_counter()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py"],
+        cwd=BACKEND_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    try:
+        stats = _wait_ready(base_url, args.startup_timeout)
+        result = {
+            "commit": _git_commit(),
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "engine": engine,
+            "rows": rows,
+            "workers": args.workers,
+            "threads": args.threads,
+            "concurrency": args.concurrency,
+            "mix": {
+                "add": args.add_ratio,
+                "session": args.session_ratio,
+                "session_reuse": args.session_reuse,
+                "reworded": args.reworded_ratio,
+                "unknown": args.unknown_ratio,
+            },
+            "startup_s": time.perf_counter() - started,
+            "engine_startup": stats.get("startup"),
+            "idle_memory": _memory_mb(server.pid),
+        }
+        result["load"] = drive(base_url, questions, args)
+        result["after_load_memory"] = _memory_mb(server.pid)
+        final_stats = _request(base_url, "GET", "/stats")
+        result["server"] = {
+            "response_cache": final_stats.get("response_cache"),
+            "web_search": final_stats.get("web_search"),
+            "sessions": final_stats.get("sessions"),
+        }
+        return result
+    finally:
+        server.send_signal(signal.SIGTERM)
+        server.wait(timeout=60)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--engines", nargs="+", choices=ENGINES, default=list(ENGINES))
+    parser.add_argument("--rows", type=int, nargs="+", default=[1000, 10_000])
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--duration", type=float, default=30.0)
+    parser.add_argument("--add-ratio", type=float, default=0.02)
+    parser.add_argument("--session-ratio", type=float, default=0.05)
+    parser.add_argument("--session-reuse", type=float, default=0.7)
+    parser.add_argument("--reworded-ratio", type=float, default=0.4)
+    parser.add_argument("--unknown-ratio", type=float, default=0.05)
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--port", type=int, default=8766)
+    parser.add_argument("--startup-timeout", type=float, default=3600.0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--work-dir", help="keep KBs and indexes here instead of a temporary directory")
+    parser.add_argument("--output", help="append one JSON line per scenario to this file")
+    args = parser.parse_args()
+    if args.workers > 1 and args.add_ratio > 0:
+        parser.error("multi-worker servers are read-only (see gunicorn.conf.py): use --add-ratio 0 with --workers > 1")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        work_dir = Path(args.work_dir or tmp)
+        for rows in args.rows:
+            for engine in args.engines:
+                line = json.dumps(run_scenario(engine, rows, args, work_dir), ensure_ascii=False)
+                print(line, flush=True)
+                if args.output:
+                    with open(args.output, "a", encoding="utf-8") as f:
+                        f.write(line + "\n")
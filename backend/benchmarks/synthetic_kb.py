@@ -0,0 +1,131 @@
+"""
+Synthetic multilingual knowledge bases shaped like data/knowledge_base.csv
+(question, answer, language, category), for load tests at sizes the real KB
+doesn't reach.
+
+    python benchmarks/synthetic_kb.py --rows 1000 10000 100000 1000000 --out-dir /tmp/kb
+
+Questions are English, Arabic and German templates over programming topics,
+so the encoder and the tokenizers see realistic text; once the template
+space is used up a round number is appended to keep questions unique.
+Output is deterministic for a given --seed and written in chunks, so 1M
+rows never sit in memory at once.
+"""
+import argparse
+import csv
+import itertools
+import random
+from pathlib import Path
+from typing import Iterator, List, Tuple
+
+TOPICS = [
+    "list", "tuple", "dictionary", "set", "string", "generator", "decorator", "iterator",
+    "class", "function", "closure", "lambda", "exception", "module", "package", "thread",
+    "process", "coroutine", "context manager", "recursion", "hash map", "linked list",
+    "binary tree", "queue", "stack", "index", "transaction", "join", "cache", "API",
+]
+
+LANGUAGES = ["Python", "JavaScript", "Java", "Go", "Rust", "C++", "C#", "SQL", "Kotlin", "TypeScript"]
+
+QUESTION_TEMPLATES = {
+    "english": [
+        "What is a {topic} in {lang}?",
+        "How do I use a {topic} in {lang}?",
+        "What is the difference between a {topic} and a {other} in {lang}?",
+        "When should I avoid a {topic} in {lang}?",
+    ],
+    "arabic": [
+        "ما هو {topic} في {lang}؟",
+        "كيف أستخدم {topic} في {lang}؟",
+        "ما الفرق بين {topic} و {other} في {lang}؟",
+        "متى يجب تجنب {topic} في {lang}؟",
+    ],
+    "german": [
+        "Was ist ein {topic} in {lang}?",
+        "Wie verwende ich einen {topic} in {lang}?",
+        "Was ist der Unterschied zwischen {topic} und {other} in {lang}?",
+        "Wann sollte man {topic} in {lang} vermeiden?",
+    ],
+}
+
+ANSWER_TEMPLATES = {
+    "english": "In {lang}, a {topic} is a core building block. It is used to organize code and data, "
+               "and unlike a {other} it has its own rules for creation, access and cost.",
+    "arabic": "في {lang}، يُعد {topic} من العناصر الأساسية. يُستخدم لتنظيم الكود والبيانات، "
+              "ويختلف عن {other} في طريقة الإنشاء والوصول والتكلفة.",
+    "german": "In {lang} ist ein {topic} ein grundlegender Baustein. Er ordnet Code und Daten "
+              "und unterscheidet sich von {other} bei Erzeugung, Zugriff und Kosten.",
+}
+
+# Roughly the real KB's mix, which is about half Arabic
+LANGUAGE_WEIGHTS = {"english": 0.4, "arabic": 0.45, "german": 0.15}
+
+
+def _combinations(seed: int) -> List[Tuple[str, int, str, str, str]]:
+    combos = []
+    for language, templates in QUESTION_TEMPLATES.items():
+        for template, text in enumerate(templates):
+            for i, topic in enumerate(TOPICS):
+                # Answers always name a second topic, single-topic questions use the next one
+                others = [other for other in TOPICS if other != topic] if "{other}" in text else [TOPICS[(i + 1) % len(TOPICS)]]
+                for other in others:
+                    for lang in LANGUAGES:
+                        combos.append((language, template, topic, other, lang))
+    random.Random(seed).shuffle(combos)
+    return combos
+
+
+def generate_rows(rows: int, seed: int = 0) -> Iterator[List[str]]:
+    rng = random.Random(seed)
+    by_language = {language: [] for language in QUESTION_TEMPLATES}
+    for combo in _combinations(seed):
+        by_language[combo[0]].append(combo)
+    cursors = {language: itertools.count() for language in by_language}
+    languages = list(LANGUAGE_WEIGHTS)
+    weights = list(LANGUAGE_WEIGHTS.values())
+
+    for _ in range(rows):
+        language = rng.choices(languages, weights)[0]
+        combos = by_language[language]
+        n = next(cursors[language])
+        _, template, topic, other, lang = combos[n % len(combos)]
+        question = QUESTION_TEMPLATES[language][template].format(topic=topic, other=other, lang=lang)
+        if n >= len(combos):
+            question = f"{question} ({n // len(combos)})"
+        answer = ANSWER_TEMPLATES[language].format(topic=topic, other=other, lang=lang)
+        category = f"{lang.lower().replace('+', 'p').replace('#', 'sharp')}_{topic.replace(' ', '_')}"
+        yield [question, answer, language, category]
+
+
+def reword_question(question: str, rng: random.Random) -> str:
+    """Lowercased with one word dropped: misses the exact index, still close in meaning."""
+    words = question.rstrip("?؟").lower().split()
+    if len(words) > 3:
+        del words[rng.randrange(1, len(words))]
+    return " ".join(words)
+
+
+def write_kb(path: str | Path, rows: int, seed: int = 0, chunk_size: int = 50_000) -> Path:
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    generated = generate_rows(rows, seed)
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["question", "answer", "language", "category"])
+        while True:
+            chunk = list(itertools.islice(generated, chunk_size))
+            if not chunk:
+                break
+            writer.writerows(chunk)
+    return path
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, nargs="+", default=[1000])
+    parser.add_argument("--out-dir", default="synthetic_kb")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    for rows in args.rows:
+        print(write_kb(Path(args.out_dir) / f"kb_{rows}.csv", rows, args.seed))
@@ -1,123 +1,129 @@
 
 
 from typing import Dict, List, Optional
-from datetime import datetime, timedelta
+from datetime import datetime
+from pathlib import Path
+import time
 import uuid
 
+import numpy as np
+
+from session_store import Message, build_session_store
+
 
 class ConversationManager:
-    
-    
-    def __init__(self, max_history: int = 5, session_timeout_minutes: int = 30):
-       
+    """
+    Conversation history on top of a session store: "memory" keeps sessions
+    in this process, "sqlite" shares them between worker processes through
+    `db_path`. See session_store for expiry and eviction.
+
+    Besides the text history every session keeps a context vector: each
+    turn's question embedding is folded in once with weight `context_decay`
+    per later turn, so context-aware search never re-encodes the history.
+    """
+
+    def __init__(
+        self,
+        max_history: int = 5,
+        session_timeout_minutes: int = 30,
+        max_sessions: int = 10000,
+        max_memory_bytes: int = 64 * 1024 * 1024,
+        backend: str = "memory",
+        db_path: Optional[str | Path] = None,
+        context_decay: float = 0.5
+    ):
+
         self.max_history = max_history
-        self.session_timeout = timedelta(minutes=session_timeout_minutes)
-        
-       
-        self.sessions: Dict[str, dict] = {}
-    
-    
+        self.session_timeout = session_timeout_minutes * 60
+
+
+        self.store = build_session_store(
+            backend, max_history, self.session_timeout, max_sessions, max_memory_bytes, db_path, context_decay
+        )
+
+
     def create_session(self) -> str:
-        
+
         session_id = str(uuid.uuid4())
-        self.sessions[session_id] = {
-            "history": [],
-            "created_at": datetime.now(),
-            "last_activity": datetime.now(),
-        }
+        self.store.create(session_id, time.time())
         return session_id
-    
-    
-    def add_message(self, session_id: str, question: str, answer: str, confidence: float):
-  
-        if session_id not in self.sessions:
-         
-            self.sessions[session_id] = {
-                "history": [],
-                "created_at": datetime.now(),
-                "last_activity": datetime.now(),
-            }
-        
-   
-        self.sessions[session_id]["last_activity"] = datetime.now()
-        
-    
-        self.sessions[session_id]["history"].append({
-            "question": question,
-            "answer": answer,
-            "confidence": confidence,
-            "timestamp": datetime.now().isoformat(),
-        })
-        
-       
-        if len(self.sessions[session_id]["history"]) > self.max_history:
-            self.sessions[session_id]["history"].pop(0)
-    
-    
+
+
+    def add_message(
+        self,
+        session_id: str,
+        question: str,
+        answer: str,
+        confidence: float,
+        embedding: Optional[np.ndarray] = None
+    ):
+
+        self.store.append(session_id, Message(question, answer, confidence, time.time()), embedding)
+
+
+    def get_context_vector(self, session_id: str) -> Optional[np.ndarray]:
+        """متجه سياق المحادثة (None إذا لم تكن هناك رسائل سابقة)"""
+        return self.store.context_vector(session_id, time.time())
+
+
     def get_conversation_context(self, session_id: str) -> str:
         """
         الحصول على سياق المحادثة كنص منسق
-        
+
         Returns:
             نص يحتوي على آخر الرسائل في المحادثة
         """
-        if session_id not in self.sessions:
-            return ""
-        
-        history = self.sessions[session_id]["history"]
+        history = self.store.history(session_id, time.time())
         if not history:
             return ""
-        
-       
+
+
         context_parts = []
-        for i, msg in enumerate(history, 1):
-            context_parts.append(f"المستخدم: {msg['question']}")
-            context_parts.append(f"المساعد: {msg['answer'][:200]}...")  
-        
+        for msg in history:
+            context_parts.append(f"المستخدم: {msg.question}")
+            context_parts.append(f"المساعد: {msg.answer[:200]}...")
+
         return "\n".join(context_parts)
-    
-    
+
+
     def get_last_n_questions(self, session_id: str, n: int = 3) -> List[str]:
         """الحصول على آخر N أسئلة"""
-        if session_id not in self.sessions:
-            return []
-        
-        history = self.sessions[session_id]["history"]
-        return [msg["question"] for msg in history[-n:]]
-    
-    
+        history = self.store.history(session_id, time.time()) or []
+        return [msg.question for msg in history[-n:]]
+
+
     def clear_session(self, session_id: str):
         """حذف جلسة محادثة"""
-        if session_id in self.sessions:
-            del self.sessions[session_id]
-    
-    
+        self.store.delete(session_id)
+
+
     def cleanup_old_sessions(self):
         """حذف الجلسات القديمة (انتهت مدتها)"""
-        now = datetime.now()
-        expired_sessions = []
-        
-        for session_id, data in self.sessions.items():
-            if now - data["last_activity"] > self.session_timeout:
-                expired_sessions.append(session_id)
-        
-        for session_id in expired_sessions:
-            del self.sessions[session_id]
-        
-        if expired_sessions:
-            print(f"تم حذف {len(expired_sessions)} جلسة منتهية الصلاحية")
-    
-    
+        removed = self.store.expire(time.time())
+
+        if removed:
+            print(f"تم حذف {removed} جلسة منتهية الصلاحية")
+
+
     def get_session_info(self, session_id: str) -> Optional[dict]:
         """الحصول على معلومات الجلسة"""
-        if session_id not in self.sessions:
+        info = self.store.info(session_id)
+        if info is None:
             return None
-        
-        data = self.sessions[session_id]
+
+        created_at, last_activity, message_count = info
         return {
             "session_id": session_id,
-            "message_count": len(data["history"]),
-            "created_at": data["created_at"].isoformat(),
-            "last_activity": data["last_activity"].isoformat(),
-            "is_expired": datetime.now() - data["last_activity"] > self.session_timeout,
+            "message_count": message_count,
+            "created_at": datetime.fromtimestamp(created_at).isoformat(),
+            "last_activity": datetime.fromtimestamp(last_activity).isoformat(),
+            "is_expired": time.time() - last_activity > self.session_timeout,
         }
+
+
+    def session_count(self) -> int:
+        return self.store.count()
+
+
+    def stats(self) -> Dict:
+        return self.store.stats()
@@ -0,0 +1,122 @@
+import atexit
+import csv
+import io
+import logging
+import os
+import threading
+from pathlib import Path
+from typing import Dict, List, Optional
+
+try:
+    import fcntl
+except ImportError:  # Windows: appends from one process only
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+
+class CsvAppendLog:
+    """
+    Write-behind log of API-added pairs into the knowledge-base CSV.
+
+    Callers only queue rows; a background thread appends them every
+    `flush_interval` seconds in one locked write, matching the file's own
+    header (question, answer[, language, category]). load_from_csv keeps the
+    last row per question, so re-added questions simply update on the next
+    reload_db.py. Rows queued in the last `flush_interval` before a crash
+    are lost; close() (also run at exit) flushes the rest.
+    """
+
+    def __init__(self, path: str | Path, flush_interval: float = 0.5):
+        self.path = Path(path)
+        self.flush_interval = flush_interval
+        self.columns = self._read_header()
+        self.rows_written = 0
+        self.write_errors = 0
+        self._pid: Optional[int] = None
+        self._ensure_started()
+        atexit.register(self.close)
+
+    def _read_header(self) -> List[str]:
+        try:
+            with open(self.path, encoding="utf-8", newline="") as f:
+                header = next(csv.reader(f), None)
+        except FileNotFoundError:
+            header = None
+        return header or ["question", "answer"]
+
+    def _ensure_started(self) -> None:
+        # Same fork handling as SQLiteSessionStore: a child starts its own writer
+        if self._pid == os.getpid():
+            return
+        self._pid = os.getpid()
+        self._pending: List[Dict] = []
+        self._pending_lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="csv-writer", daemon=True)
+        self._thread.start()
+
+    def append(self, rows: List[Dict]) -> None:
+        """Queue rows given as {column: value}; columns the file doesn't have are dropped."""
+        self._ensure_started()
+        with self._pending_lock:
+            self._pending.extend(rows)
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.flush_interval):
+            self.flush()
+
+    def _encode(self, rows: List[Dict]) -> str:
+        buffer = io.StringIO()
+        writer = csv.writer(buffer, lineterminator="\n")
+        for row in rows:
+            writer.writerow([row.get(column, "") for column in self.columns])
+        return buffer.getvalue()
+
+    def flush(self) -> None:
+        with self._flush_lock:
+            with self._pending_lock:
+                rows, self._pending = self._pending, []
+            if not rows:
+                return
+
+            data = self._encode(rows).encode("utf-8")
+            try:
+                with open(self.path, "ab+") as f:
+                    if fcntl is not None:
+                        fcntl.flock(f, fcntl.LOCK_EX)
+                    size = f.seek(0, os.SEEK_END)
+                    if size == 0:
+                        data = self._encode([{column: column for column in self.columns}]).encode("utf-8") + data
+                    else:
+                        # Don't glue the first row onto a last line without a newline
+                        f.seek(size - 1)
+                        if f.read(1) != b"\n":
+                            data = b"\n" + data
+                    f.write(data)
+                    f.flush()
+                    os.fsync(f.fileno())
+                self.rows_written += len(rows)
+            except OSError as e:
+                self.write_errors += 1
+                logger.error(f"Appending {len(rows)} rows to {self.path} failed: {e}")
+                with self._pending_lock:
+                    self._pending[:0] = rows
+
+    def close(self) -> None:
+        if self._pid != os.getpid():
+            return
+        self._stop.set()
+        self._thread.join()
+        self.flush()
+
+    def stats(self) -> Dict:
+        with self._pending_lock:
+            pending = len(self._pending)
+        return {
+            "path": str(self.path),
+            "pending": pending,
+            "rows_written": self.rows_written,
+            "write_errors": self.write_errors,
+        }
@@ -0,0 +1,175 @@
+import hashlib
+import json
+import os
+import re
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Callable, Dict, Iterator, List, Optional
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # Windows: one process per store directory
+    fcntl = None
+
+
+class EmbeddingStore:
+    """
+    Persistent text -> embedding cache for one model.
+
+    Vectors live in a raw float32 file opened through np.memmap and the row
+    of each text is kept in an append-only index file (one text hash per
+    line), so cached corpora are read from disk instead of re-encoded.
+
+    Several processes (gunicorn workers, reload_db.py, merge_data.py) can
+    share one directory: appends hold an exclusive file lock and every
+    process picks up the others' rows from the index before using it.
+    """
+
+    def __init__(self, directory: str | Path, model_name: str):
+        self.model_name = model_name
+        self.directory = Path(directory) / re.sub(r"[^A-Za-z0-9_.-]+", "_", model_name)
+        self.directory.mkdir(parents=True, exist_ok=True)
+
+        self.vectors_path = self.directory / "vectors.f32"
+        self.index_path = self.directory / "index.txt"
+        self.meta_path = self.directory / "meta.json"
+        self.lock_path = self.directory / "lock"
+
+        self._lock = threading.Lock()
+        self._keys: Dict[str, int] = {}
+        self._rows = 0
+        self._index_bytes = 0
+        self._matrix: Optional[np.memmap] = None
+        self.dimension: Optional[int] = None
+        self.hits = 0
+        self.misses = 0
+
+        self._refresh()
+
+    @contextmanager
+    def _file_lock(self) -> Iterator[None]:
+        with open(self.lock_path, "a") as f:
+            if fcntl is not None:
+                fcntl.flock(f, fcntl.LOCK_EX)
+            yield
+
+    def _refresh(self) -> None:
+        """Read index lines appended since the last call, by this process or another one."""
+        if self.dimension is None:
+            try:
+                meta = json.loads(self.meta_path.read_text(encoding="utf-8"))
+            except FileNotFoundError:
+                return
+            self.dimension = int(meta["dimension"])
+
+        try:
+            with open(self.index_path, "rb") as f:
+                f.seek(self._index_bytes)
+                data = f.read()
+        except FileNotFoundError:
+            return
+        stored_rows = self.vectors_path.stat().st_size // (self.dimension * 4) if self.vectors_path.exists() else 0
+
+        # Vectors are written before their index line, so a complete line
+        # normally has its vector; a trailing partial line is skipped
+        lines = data.split(b"\n")[:-1]
+        lines = lines[:max(0, stored_rows - self._rows)]
+        if not lines:
+            return
+        for offset, line in enumerate(lines):
+            self._keys[line.decode("utf-8")] = self._rows + offset
+        self._rows += len(lines)
+        self._index_bytes += sum(len(line) + 1 for line in lines)
+        self._map_rows(self._rows)
+
+    def _map_rows(self, rows: int) -> None:
+        if rows == 0:
+            self._matrix = None
+            return
+        self._matrix = np.memmap(self.vectors_path, dtype=np.float32, mode="r", shape=(rows, self.dimension))
+
+    def _key(self, text: str) -> str:
+        return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def get_or_encode(
+        self,
+        texts: List[str],
+        encode: Callable[[List[str]], np.ndarray]
+    ) -> np.ndarray:
+        """Return embeddings for `texts`, calling `encode` only for cache misses."""
+        keys = [self._key(text) for text in texts]
+
+        with self._lock:
+            self._refresh()
+            missing: Dict[str, str] = {}
+            for key, text in zip(keys, texts):
+                if key not in self._keys and key not in missing:
+                    missing[key] = text
+
+            if missing:
+                encoded = np.asarray(encode(list(missing.values())), dtype=np.float32)
+                self._append(list(missing.keys()), encoded)
+
+            self.misses += len(missing)
+            self.hits += len(texts) - len(missing)
+
+            if not texts:
+                return np.empty((0, self.dimension or 0), dtype=np.float32)
+            rows = np.fromiter((self._keys[key] for key in keys), dtype=np.int64, count=len(keys))
+            return np.asarray(self._matrix[rows])
+
+    def _append(self, keys: List[str], vectors: np.ndarray) -> None:
+        with self._file_lock():
+            # Another process may have appended since the last refresh: rows
+            # start after its rows, and keys it already wrote are skipped
+            self._refresh()
+            if self.dimension is None:
+                self.dimension = int(vectors.shape[1])
+                tmp_path = self.meta_path.with_name(self.meta_path.name + ".tmp")
+                tmp_path.write_text(
+                    json.dumps({"model_name": self.model_name, "dimension": self.dimension}),
+                    encoding="utf-8"
+                )
+                os.replace(tmp_path, self.meta_path)
+            elif vectors.shape[1] != self.dimension:
+                raise ValueError(
+                    f"Embedding dimension {vectors.shape[1]} does not match store dimension {self.dimension}"
+                )
+
+            new = [i for i, key in enumerate(keys) if key not in self._keys]
+            if not new:
+                return
+            keys = [keys[i] for i in new]
+            vectors = vectors[new]
+
+            # Under the lock everything past the indexed rows is left over
+            # from an interrupted append; indexed rows are never cut
+            with open(self.vectors_path, "ab") as f:
+                if f.seek(0, os.SEEK_END) > self._rows * self.dimension * 4:
+                    f.truncate(self._rows * self.dimension * 4)
+                f.write(np.ascontiguousarray(vectors, dtype=np.float32).tobytes())
+            with open(self.index_path, "ab") as f:
+                if f.seek(0, os.SEEK_END) > self._index_bytes:
+                    f.truncate(self._index_bytes)
+                f.write("".join(f"{key}\n" for key in keys).encode("utf-8"))
+
+        for offset, key in enumerate(keys):
+            self._keys[key] = self._rows + offset
+        self._rows += len(keys)
+        self._index_bytes += sum(len(key) + 1 for key in keys)
+        self._map_rows(self._rows)
+
+    def stats(self) -> Dict:
+        return {
+            "path": str(self.directory),
+            "size": len(self._keys),
+            "dimension": self.dimension,
+            "hits": self.hits,
+            "misses": self.misses,
+        }
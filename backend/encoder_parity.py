@@ -0,0 +1,73 @@
+import argparse
+import json
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from encoders import BACKENDS, DEFAULT_MODEL, build_encoder
+from vector_index import ExactIndex, normalize_rows
+
+
+def _leave_one_out_top_k(embeddings: np.ndarray, k: int) -> tuple[np.ndarray, np.ndarray]:
+    # Every question is searched against all the others, like a paraphrased
+    # query would be: one extra neighbour is fetched and the question itself dropped
+    index = ExactIndex()
+    index.attach(embeddings)
+    top, scores = index.search(embeddings, k + 1)
+    keep = top != np.arange(len(top))[:, None]
+    # A row tied with an identical question may not list itself, it drops its last neighbour instead
+    keep[keep.all(axis=1), -1] = False
+    return top[keep].reshape(len(top), k), scores[keep].reshape(len(top), k)
+
+
+def compare(csv_path: Path, backend: str, model_name: str = DEFAULT_MODEL, k: int = 5) -> dict:
+    df = pd.read_csv(csv_path, encoding="utf-8")
+    questions = df["question"].astype(str).drop_duplicates().tolist()
+    k = min(k, len(questions) - 1)
+
+    results = {}
+    embeddings = {}
+    # fp32 against itself is encoded once
+    for name in dict.fromkeys(("fp32", backend)):
+        encoder = build_encoder(model_name, name)
+        encoder.encode(questions[:8])
+        started = time.perf_counter()
+        embeddings[name] = normalize_rows(encoder.encode(questions, batch_size=64))
+        results[f"{name}_encode_s"] = time.perf_counter() - started
+
+    ref_top, ref_scores = _leave_one_out_top_k(embeddings["fp32"], k)
+    cand_top, cand_scores = _leave_one_out_top_k(embeddings[backend], k)
+
+    overlap = [len(set(a) & set(b)) / k for a, b in zip(ref_top, cand_top)]
+    drift = np.abs(ref_scores[:, 0] - cand_scores[:, 0])
+    self_similarity = np.sum(embeddings["fp32"] * embeddings[backend], axis=1)
+
+    results.update({
+        "csv": str(csv_path),
+        "model": model_name,
+        "backend": backend,
+        "questions": len(questions),
+        "k": k,
+        "top1_agreement": float(np.mean(ref_top[:, 0] == cand_top[:, 0])),
+        "top_k_overlap": float(np.mean(overlap)),
+        "confidence_drift_mean": float(drift.mean()),
+        "confidence_drift_max": float(drift.max()),
+        "embedding_cosine_min": float(self_similarity.min()),
+        "embedding_cosine_mean": float(self_similarity.mean()),
+    })
+    return results
+
+
+if __name__ == "__main__":
+    base_dir = Path(__file__).resolve().parent.parent
+
+    parser = argparse.ArgumentParser(description="Compare an encoder backend against the fp32 model")
+    parser.add_argument("--backend", choices=BACKENDS, default="int8")
+    parser.add_argument("--csv", type=Path, default=base_dir / "data" / "knowledge_base.csv")
+    parser.add_argument("--model", default=DEFAULT_MODEL)
+    parser.add_argument("-k", type=int, default=5)
+    args = parser.parse_args()
+
+    print(json.dumps(compare(args.csv, args.backend, args.model, args.k), indent=2))
@@ -0,0 +1,74 @@
+from abc import ABC, abstractmethod
+from typing import List
+
+import numpy as np
+from sentence_transformers import SentenceTransformer
+
+
+DEFAULT_MODEL = "paraphrase-multilingual-MiniLM-L12-v2"
+BACKENDS = ("fp32", "int8")
+
+
+class Encoder(ABC):
+    """
+    Turns texts into embedding vectors.
+
+    `name` identifies the vector space an encoder produces; caches, snapshots
+    and collections are keyed on it so vectors from different backends are
+    never mixed.
+    """
+
+    backend = ""
+
+    def __init__(self, model_name: str = DEFAULT_MODEL):
+        self.model_name = model_name
+
+    @property
+    def name(self) -> str:
+        return self.model_name
+
+    @abstractmethod
+    def encode(self, texts: List[str], batch_size: int = 32, show_progress_bar: bool = False) -> np.ndarray:
+        ...
+
+
+class SentenceTransformerEncoder(Encoder):
+    """Full-precision PyTorch model, the reference every other backend is checked against."""
+
+    backend = "fp32"
+
+    def __init__(self, model_name: str = DEFAULT_MODEL):
+        super().__init__(model_name)
+        self.model = SentenceTransformer(model_name, device="cpu")
+
+    def encode(self, texts: List[str], batch_size: int = 32, show_progress_bar: bool = False) -> np.ndarray:
+        return self.model.encode(
+            texts,
+            batch_size=batch_size,
+            convert_to_tensor=False,
+            show_progress_bar=show_progress_bar
+        )
+
+
+class QuantizedEncoder(SentenceTransformerEncoder):
+    """CPU encoder with int8 dynamic quantization of every Linear layer."""
+
+    backend = "int8"
+
+    def __init__(self, model_name: str = DEFAULT_MODEL):
+        super().__init__(model_name)
+        import torch
+
+        self.model = torch.quantization.quantize_dynamic(self.model, {torch.nn.Linear}, dtype=torch.qint8)
+
+    @property
+    def name(self) -> str:
+        return f"{self.model_name}@int8"
+
+
+def build_encoder(model_name: str = DEFAULT_MODEL, backend: str = "fp32") -> Encoder:
+    if backend == "fp32":
+        return SentenceTransformerEncoder(model_name)
+    if backend == "int8":
+        return QuantizedEncoder(model_name)
+    raise ValueError(f"Unknown encoder backend '{backend}', expected one of {BACKENDS}")
@@ -0,0 +1,62 @@
+"""
+Pre-fork deployment: the master imports the app once (model weights, Chroma
+index, exact-match index) and forks the workers, which share those pages
+copy-on-write instead of each loading its own copy.
+
+    cd backend && gunicorn -c gunicorn.conf.py
+
+CORTEX_WORKERS / CORTEX_WORKER_THREADS size the server; each worker gets
+cpu_count // workers torch threads (CORTEX_TORCH_THREADS overrides) so the
+workers don't oversubscribe the cores. CORTEX_PRELOAD=0 gives the old
+layout, every worker loading everything itself, for comparison
+(benchmarks/bench_prefork.py).
+
+With more than one worker the server is read-only (CORTEX_READ_ONLY=1):
+each worker holds its own indexes and caches, so a write in one would never
+reach the others, and Chroma's persistent client can't take writes from
+several processes. /add and /add/batch answer 503 there; add pairs through
+a single-worker instance (CORTEX_WORKERS=1) or reload_db.py, then restart
+the workers. Setting CORTEX_READ_ONLY=0 explicitly opts out, at that risk.
+"""
+import gc
+import os
+import sys
+
+# Must be set before torch is imported by the app: a single-threaded master
+# never starts an OpenMP pool, which isn't safe to fork
+os.environ.setdefault("OMP_NUM_THREADS", "1")
+os.environ.setdefault("TOKENIZERS_PARALLELISM", "false")
+# Workers are separate processes, so sessions must live in the shared store
+os.environ.setdefault("CORTEX_SESSION_STORE", "sqlite")
+
+wsgi_app = "app:app"
+bind = os.environ.get("CORTEX_BIND", "0.0.0.0:8000")
+workers = int(os.environ.get("CORTEX_WORKERS", "2"))
+worker_class = "gthread"
+threads = int(os.environ.get("CORTEX_WORKER_THREADS", "8"))
+preload_app = os.environ.get("CORTEX_PRELOAD", "1") == "1"
+
+# Read before the app is imported (see the module docstring)
+if workers > 1:
+    os.environ.setdefault("CORTEX_READ_ONLY", "1")
+timeout = 120
+
+torch_threads = int(os.environ.get("CORTEX_TORCH_THREADS", "0")) or max(1, (os.cpu_count() or 1) // workers)
+
+
+def pre_fork(server, worker):
+    # Keep the preloaded objects out of the cyclic GC, whose bookkeeping
+    # writes would otherwise un-share their pages in every worker
+    gc.freeze()
+
+
+def post_fork(server, worker):
+    os.environ["OMP_NUM_THREADS"] = str(torch_threads)
+    if "torch" in sys.modules:
+        sys.modules["torch"].set_num_threads(torch_threads)
+
+    # Without preload the app is imported after this hook, in the worker
+    if "service" in sys.modules:
+        sys.modules["service"].after_fork()
+
+    server.log.info(f"Worker {worker.pid}: {torch_threads} torch threads")
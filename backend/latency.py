@@ -0,0 +1,38 @@
+import threading
+from collections import deque
+from typing import Dict, Iterable
+
+
+def summarize(values: Iterable[float]) -> Dict:
+    values = sorted(values)
+    if not values:
+        return {"count": 0, "mean": 0.0, "p50": 0.0, "p95": 0.0, "p99": 0.0, "max": 0.0}
+    return {
+        "count": len(values),
+        "mean": sum(values) / len(values),
+        "p50": values[len(values) // 2],
+        "p95": values[min(len(values) - 1, int(len(values) * 0.95))],
+        "p99": values[min(len(values) - 1, int(len(values) * 0.99))],
+        "max": values[-1],
+    }
+
+
+class SampleWindow:
+    """Keeps the last `size` samples and summarizes them on demand."""
+
+    def __init__(self, size: int = 1000):
+        self._samples: deque = deque(maxlen=size)
+        self._lock = threading.Lock()
+
+    def add(self, value: float) -> None:
+        with self._lock:
+            self._samples.append(value)
+
+    def extend(self, values: Iterable[float]) -> None:
+        with self._lock:
+            self._samples.extend(values)
+
+    def summary(self) -> Dict:
+        with self._lock:
+            samples = list(self._samples)
+        return summarize(samples)
@@ -0,0 +1,151 @@
+import heapq
+import math
+import re
+import threading
+from collections import Counter
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from text_normalization import normalize_question
+
+# Words plus the symbols technical terms are made of ("c++", "c#", "__init__")
+_TOKEN = re.compile(r"[\w+#]+")
+
+# Arabic definite article, optionally after a one-letter conjunction/preposition
+_ARABIC_ARTICLE = re.compile(r"^[وبفك]?ال(?=\w\w)")
+
+
+def tokenize(text: str) -> List[str]:
+    """Tokens of the normalized question; Arabic words lose a leading article so "البرمجة" matches "برمجة"."""
+    return [_ARABIC_ARTICLE.sub("", token) for token in _TOKEN.findall(normalize_question(text))]
+
+
+class BM25Index:
+    """
+    In-memory inverted index with BM25 scoring.
+
+    Scores are divided by the score a document made of exactly the query
+    terms would get, so they fall in [0, 1] and can be compared with a
+    confidence threshold. Terms found in more than `max_df` of the documents
+    ("what", "is", "ما") only contribute to the score: candidates come from
+    the rarer terms, which keeps short queries from scanning most of the index.
+
+    Safe to share between threads: updates and searches hold one lock, so a
+    search never sees a document half added or removed.
+    """
+
+    def __init__(self, k1: float = 1.2, b: float = 0.75, max_df: float = 0.5):
+        self.k1 = k1
+        self.b = b
+        self.max_df = max_df
+        self._postings: Dict[str, Dict[str, int]] = {}
+        self._lengths: Dict[str, int] = {}
+        self._terms: Dict[str, Tuple[str, ...]] = {}
+        self._payloads: Dict[str, object] = {}
+        self._total_length = 0
+        # Re-entrant: search() calls `accept`, which may call payload()
+        self._lock = threading.RLock()
+
+    def __len__(self) -> int:
+        return len(self._lengths)
+
+    def __contains__(self, item_id: str) -> bool:
+        return item_id in self._lengths
+
+    def clear(self) -> None:
+        with self._lock:
+            self._postings.clear()
+            self._lengths.clear()
+            self._terms.clear()
+            self._payloads.clear()
+            self._total_length = 0
+
+    def add(self, item_id: str, text: str, payload: object = None) -> None:
+        tokens = tokenize(text)
+        counts = Counter(tokens)
+        with self._lock:
+            self.remove(item_id)
+            for token, count in counts.items():
+                self._postings.setdefault(token, {})[item_id] = count
+            self._lengths[item_id] = len(tokens)
+            self._terms[item_id] = tuple(counts)
+            self._payloads[item_id] = payload
+            self._total_length += len(tokens)
+
+    def remove(self, item_id: str) -> None:
+        with self._lock:
+            length = self._lengths.pop(item_id, None)
+            if length is None:
+                return
+            del self._payloads[item_id]
+            self._total_length -= length
+            for token in self._terms.pop(item_id):
+                postings = self._postings[token]
+                del postings[item_id]
+                if not postings:
+                    del self._postings[token]
+
+    def payload(self, item_id: str) -> object:
+        """None once the document is removed, which can happen right after a search returned it."""
+        with self._lock:
+            return self._payloads.get(item_id)
+
+    def _idf(self, term: str) -> float:
+        df = len(self._postings.get(term, ()))
+        return math.log(1 + (len(self._lengths) - df + 0.5) / (df + 0.5))
+
+    def _scorer(self, terms: List[str]) -> Callable[[str], float]:
+        avg_length = self._total_length / max(1, len(self._lengths))
+        weights = [(self._postings.get(term, {}), self._idf(term)) for term in terms]
+        k1, b = self.k1, self.b
+
+        # A document consisting of exactly the query terms scores 1.0
+        norm = 1 + k1 * (1 - b + b * len(terms) / max(avg_length, 1e-9))
+        ideal = sum(idf * (k1 + 1) / norm for _, idf in weights)
+
+        def score(item_id: str) -> float:
+            length_norm = k1 * (1 - b + b * self._lengths[item_id] / max(avg_length, 1e-9))
+            total = 0.0
+            for postings, idf in weights:
+                tf = postings.get(item_id)
+                if tf:
+                    total += idf * tf * (k1 + 1) / (tf + length_norm)
+            return min(1.0, total / ideal) if ideal > 0 else 0.0
+
+        return score
+
+    def search(
+        self,
+        query: str,
+        top_k: int = 5,
+        accept: Optional[Callable[[str], bool]] = None
+    ) -> List[Tuple[str, float]]:
+        """(item_id, score) pairs, best first; `accept` filters candidates before they are ranked."""
+        terms = list(dict.fromkeys(tokenize(query)))
+        with self._lock:
+            known = [term for term in terms if term in self._postings]
+            if not known:
+                return []
+
+            limit = self.max_df * len(self._lengths)
+            rare = [term for term in known if len(self._postings[term]) <= limit] or known
+            candidates = set().union(*(self._postings[term] for term in rare))
+            if accept is not None:
+                candidates = {item_id for item_id in candidates if accept(item_id)}
+
+            score = self._scorer(terms)
+            return heapq.nlargest(top_k, ((item_id, score(item_id)) for item_id in candidates), key=lambda pair: pair[1])
+
+    def score(self, query: str, item_ids: Iterable[str]) -> Dict[str, float]:
+        """Scores of specific documents, e.g. dense matches that BM25 didn't rank."""
+        terms = list(dict.fromkeys(tokenize(query)))
+        with self._lock:
+            score = self._scorer(terms)
+            return {item_id: score(item_id) for item_id in item_ids if item_id in self._lengths}
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                "documents": len(self._lengths),
+                "terms": len(self._postings),
+                "avg_length": self._total_length / max(1, len(self._lengths)),
+            }
@@ -0,0 +1,73 @@
+"""
+Non-blocking logging: request threads only put records on a queue, one
+background listener thread does the formatting and the stream writes.
+
+DEBUG records are sampled - with `debug_sample_rate` 0.01 about one in a
+hundred is kept - so verbose per-request output can stay switched on under
+load without paying for every line.
+"""
+import atexit
+import logging
+import queue
+import random
+from logging.handlers import QueueHandler, QueueListener
+from typing import Optional
+
+LOG_FORMAT = "%(asctime)s - %(levelname)s - %(message)s"
+
+_handler: Optional[QueueHandler] = None
+_listener: Optional[QueueListener] = None
+
+
+class DebugSampler(logging.Filter):
+    """Passes records at `level` or above, plus a random `rate` share of DEBUG ones."""
+
+    def __init__(self, level: int, rate: float):
+        super().__init__()
+        self.level = level
+        self.rate = rate
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= self.level:
+            return True
+        return record.levelno <= logging.DEBUG and random.random() < self.rate
+
+
+def configure_logging(level: int = logging.INFO, debug_sample_rate: float = 0.0) -> None:
+    global _handler, _listener
+    stop()
+
+    stream = logging.StreamHandler()
+    stream.setFormatter(logging.Formatter(LOG_FORMAT))
+
+    _handler = QueueHandler(queue.SimpleQueue())
+    _handler.addFilter(DebugSampler(level, debug_sample_rate))
+    _listener = QueueListener(_handler.queue, stream)
+    _listener.start()
+
+    root = logging.getLogger()
+    root.handlers = [_handler]
+    # Sampled DEBUG records have to reach the handler to be sampled at all
+    root.setLevel(min(level, logging.DEBUG) if debug_sample_rate > 0 else level)
+
+
+def after_fork() -> None:
+    """The listener thread doesn't survive fork(); give the child its own queue and listener."""
+    global _listener
+    if _handler is None or _listener is None:
+        return
+    handlers = _listener.handlers
+    _handler.queue = queue.SimpleQueue()
+    _listener = QueueListener(_handler.queue, *handlers)
+    _listener.start()
+
+
+def stop() -> None:
+    """Flush what is queued and stop the listener thread."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+atexit.register(stop)
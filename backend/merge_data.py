@@ -1,50 +1,375 @@
-import pandas as pd
+"""
+Merge technical_qa.csv into knowledge_base.csv, dropping paraphrased
+duplicates as well as exact ones.
+
+    python merge_data.py                                  # default files, merge in place
+    python merge_data.py a.csv b.csv --output kb.csv --threshold 0.9
+    python merge_data.py --dry-run --report clusters.csv  # only report duplicates
+
+Rows are streamed through these steps, so million-row files never sit in
+memory at once:
+
+1. inputs are read in --chunk-size chunks; rows whose normalized question
+   was already seen are dropped, the rest are staged to a temporary CSV and
+   their questions embedded in batches (through the same embedding cache as
+   reload_db.py) into an on-disk float32 matrix
+2. near-duplicates are found with an inverted-file search instead of
+   comparing every pair: per language, k-means splits the rows into lists of
+   about --list-size rows, each row is searched (top --top-k) only against
+   the lists of its --nprobe nearest centroids, and pairs scoring at least
+   --threshold are candidates
+3. rows are clustered greedily in input order: a row is dropped only when it
+   scores >= --threshold against an earlier row that is kept, so
+   knowledge_base.csv rows win over new ones as before, and a row is never
+   dropped for being close to a row that was itself dropped
+4. the kept rows are written out, and the report (a temporary file unless
+   --report is given) lists every dropped row with the row kept for it, plus
+   kept rows that were only close to a dropped one
+"""
+import argparse
+import csv
+import hashlib
+import os
+import shutil
+import tempfile
 from pathlib import Path
+from typing import Dict, Iterator, List, Tuple
+
+import numpy as np
+import pandas as pd
+
+from embedding_store import EmbeddingStore
+from encoders import BACKENDS, DEFAULT_MODEL, build_encoder
+from parallel_encoder import EncoderPool
+import paths
+from text_normalization import detect_languages, normalize_question
+from vector_index import ExactIndex, normalize_rows
+
+
+DEFAULT_THRESHOLD = 0.92
+REPORT_COLUMNS = ["cluster", "row", "source", "kept", "similarity", "matched_row", "question", "answer", "matched_question"]
+
+
+def _question_key(question: str) -> int:
+    return int.from_bytes(hashlib.blake2b(normalize_question(question).encode("utf-8"), digest_size=8).digest(), "big")
+
+
+def _read_columns(paths: List[Path]) -> List[str]:
+    columns = ["question", "answer"]
+    for path in paths:
+        header = pd.read_csv(path, encoding="utf-8", nrows=0).columns
+        if "question" not in header or "answer" not in header:
+            raise ValueError(f"{path} must have 'question' and 'answer' columns")
+        columns.extend(column for column in header if column not in columns)
+    return columns
+
+
+def _iter_chunks(paths: List[Path], columns: List[str], chunk_size: int) -> Iterator[pd.DataFrame]:
+    for path in paths:
+        # keep_default_na=False: answers like "None" or "NA" stay text, only empty cells are dropped
+        for chunk in pd.read_csv(path, encoding="utf-8", chunksize=chunk_size, dtype=str, keep_default_na=False):
+            chunk = chunk.reindex(columns=columns, fill_value="")
+            chunk["question"] = chunk["question"].str.strip()
+            chunk["answer"] = chunk["answer"].str.strip()
+            chunk = chunk[(chunk["question"] != "") & (chunk["answer"] != "")]
+            chunk["source"] = path.name
+            yield chunk
+
+
+class Staging:
+    """Pass 1: de-duplicated rows in a temporary CSV, their normalized embeddings in a raw float32 file."""
+
+    def __init__(self, work_dir: Path, columns: List[str]):
+        self.rows_path = work_dir / "rows.csv"
+        self.vectors_path = work_dir / "vectors.f32"
+        self.columns = columns + ["source"]
+        self.size = 0
+        self.dimension = 0
+        self.read = 0
+        self.exact_duplicates = 0
+        self._languages: List[np.ndarray] = []
+
+    def build(self, paths: List[Path], encode, chunk_size: int) -> None:
+        seen = set()
+        for chunk in _iter_chunks(paths, self.columns[:-1], chunk_size):
+            self.read += len(chunk)
+            keys = [_question_key(question) for question in chunk["question"]]
+            keep = np.zeros(len(keys), dtype=bool)
+            for i, key in enumerate(keys):
+                if key not in seen:
+                    seen.add(key)
+                    keep[i] = True
+            self.exact_duplicates += int((~keep).sum())
+            chunk = chunk[keep]
+            if chunk.empty:
+                continue
+
+            vectors = normalize_rows(encode(chunk["question"].tolist()))
+            self.dimension = vectors.shape[1]
+            with open(self.vectors_path, "ab") as f:
+                f.write(np.ascontiguousarray(vectors, dtype=np.float32).tobytes())
+            chunk.to_csv(self.rows_path, mode="a", header=self.size == 0, index=False, encoding="utf-8")
+            self._languages.append(detect_languages(chunk["question"]))
+            self.size += len(chunk)
+            print(f" Staged {self.size} rows ({self.read} read, {self.exact_duplicates} exact duplicates)")
+
+    @property
+    def languages(self) -> np.ndarray:
+        return np.concatenate(self._languages) if self._languages else np.empty(0, dtype=str)
+
+    def vectors(self) -> np.ndarray:
+        if self.size == 0:
+            return np.empty((0, 0), dtype=np.float32)
+        return np.memmap(self.vectors_path, dtype=np.float32, mode="r", shape=(self.size, self.dimension))
+
+    def iter_rows(self, chunk_size: int) -> Iterator[Tuple[int, pd.DataFrame]]:
+        if self.size == 0:
+            return
+        start = 0
+        # keep_default_na=False: answers like "None" or "NA" stay text
+        for chunk in pd.read_csv(self.rows_path, encoding="utf-8", chunksize=chunk_size, dtype=str, keep_default_na=False):
+            yield start, chunk
+            start += len(chunk)
+
+
+def _kmeans(vectors: np.ndarray, rows: np.ndarray, n_lists: int, rng: np.random.Generator, iterations: int = 8) -> np.ndarray:
+    """Spherical k-means on a sample of `rows`; returns unit-length centroids."""
+    sample = np.sort(rng.choice(rows, size=min(len(rows), n_lists * 64), replace=False))
+    points = np.asarray(vectors[sample])
+    centroids = points[rng.choice(len(points), size=n_lists, replace=False)].copy()
+    for _ in range(iterations):
+        index = ExactIndex()
+        index.reset(centroids)
+        assigned = index.search(points, 1)[0][:, 0]
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assigned, points)
+        filled = np.bincount(assigned, minlength=n_lists) > 0
+        # Empty lists keep their old centroid
+        centroids[filled] = normalize_rows(sums[filled])
+    return centroids
+
+
+def _probe_lists(vectors: np.ndarray, rows: np.ndarray, centroids: np.ndarray, nprobe: int, block: int) -> np.ndarray:
+    index = ExactIndex()
+    index.reset(centroids)
+    probes = np.empty((len(rows), min(nprobe, len(centroids))), dtype=np.int32)
+    for start in range(0, len(rows), block):
+        probes[start:start + block] = index.search(np.asarray(vectors[rows[start:start + block]]), nprobe)[0]
+    return probes
+
+
+def _group(list_ids: np.ndarray, rows: np.ndarray, n_lists: int) -> List[np.ndarray]:
+    order = np.argsort(list_ids, kind="stable")
+    bounds = np.searchsorted(list_ids[order], np.arange(n_lists + 1))
+    return [rows[order[bounds[i]:bounds[i + 1]]] for i in range(n_lists)]
+
+
+def find_duplicate_pairs(
+    vectors: np.ndarray,
+    rows: np.ndarray,
+    threshold: float,
+    top_k: int,
+    nprobe: int,
+    list_size: int,
+    block: int,
+    seed: int = 0
+) -> Iterator[Tuple[np.ndarray, np.ndarray, np.ndarray]]:
+    """
+    Yield (row, neighbour, score) arrays of pairs among `rows` with cosine
+    similarity >= threshold. Each row is only scored against the members of its `nprobe`
+    nearest lists, about len(rows) * nprobe * list_size products instead of
+    len(rows) ** 2.
+    """
+    n_lists = max(1, len(rows) // list_size)
+    if n_lists == 1:
+        members = queriers = [rows]
+    else:
+        centroids = _kmeans(vectors, rows, n_lists, np.random.default_rng(seed))
+        probes = _probe_lists(vectors, rows, centroids, nprobe, block)
+        members = _group(probes[:, 0], rows, n_lists)
+        queriers = _group(probes.ravel(), np.repeat(rows, probes.shape[1]), n_lists)
+
+    for list_members, list_queriers in zip(members, queriers):
+        if len(list_members) == 0 or len(list_queriers) == 0:
+            continue
+        index = ExactIndex(query_block=block)
+        index.reset(np.asarray(vectors[list_members]))
+        for start in range(0, len(list_queriers), block):
+            batch = list_queriers[start:start + block]
+            # +1: a row finds itself in its own list
+            indices, scores = index.search(np.asarray(vectors[batch]), top_k + 1)
+            neighbours = list_members[indices]
+            hit = (scores >= threshold) & (neighbours != batch[:, None])
+            if hit.any():
+                yield np.broadcast_to(batch[:, None], hit.shape)[hit], neighbours[hit], scores[hit]
+
+
+def cluster_rows(staging: Staging, args) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Pass 2: greedy centre clustering. In row order, a row joins its most
+    similar earlier row that is still kept (a centre), if any scores >=
+    threshold; otherwise it stays a centre itself. Returns (centres, matches):
+    the row kept for every row (itself when kept) and the most similar earlier
+    row above the threshold, kept or not (-1 when there is none).
+
+    Candidate pairs of one language are held in memory, at most
+    rows * nprobe * top_k of them.
+    """
+    vectors = staging.vectors()
+    centres = np.arange(staging.size, dtype=np.int64)
+    matches = np.full(staging.size, -1, dtype=np.int64)
+    languages = staging.languages
+    for language in np.unique(languages):
+        rows = np.flatnonzero(languages == language)
+        found = [
+            (np.maximum(left, right), np.minimum(left, right), scores)
+            for left, right, scores in find_duplicate_pairs(
+                vectors, rows, args.threshold, args.top_k, args.nprobe, args.list_size, args.block_size, args.seed
+            )
+        ]
+        later, earlier, scores = (np.concatenate(parts) for parts in zip(*found)) if found else ((), (), ())
+        print(f" {language}: {len(rows)} rows, {len(later)} near-duplicate pairs")
+        if not found:
+            continue
+
+        # Candidates grouped by later row, ascending, best score first: every
+        # earlier row's own decision is final by the time it is looked at
+        order = np.lexsort((-scores, later))
+        later, earlier = later[order], earlier[order]
+        starts = np.flatnonzero(np.r_[True, later[1:] != later[:-1]])
+        for first, last in zip(starts, np.r_[starts[1:], len(later)]):
+            row = int(later[first])
+            matches[row] = earlier[first]
+            for candidate in earlier[first:last].tolist():
+                if centres[candidate] == candidate:
+                    centres[row] = candidate
+                    break
+    return centres, matches
+
+
+def write_outputs(staging: Staging, centres: np.ndarray, matches: np.ndarray, args) -> Dict:
+    """Pass 3: stream the staged rows into the report and, unless --dry-run, the merged CSV."""
+    vectors = staging.vectors()
+    rows = np.arange(staging.size)
+    kept = centres == rows
+    sizes = np.bincount(centres, minlength=staging.size)
+    # Kept rows whose only close match was dropped: reported, not merged
+    near = kept & (matches >= 0)
+    matched = np.where(near, matches, centres)
+    referenced = np.zeros(staging.size, dtype=bool)
+    referenced[matched[~kept | near]] = True
+    matched_questions: Dict[int, str] = {}
+
+    tmp_output = Path(args.output).with_suffix(".merging.csv")
+    # Left over from an interrupted run
+    tmp_output.unlink(missing_ok=True)
+    with open(args.report, "w", encoding="utf-8", newline="") as report:
+        writer = csv.writer(report)
+        writer.writerow(REPORT_COLUMNS)
+        for start, chunk in staging.iter_rows(args.chunk_size):
+            end = start + len(chunk)
+            questions = chunk["question"].tolist()
+            # Matched rows always come first, so their text is known by the time it is needed
+            for offset in np.flatnonzero(referenced[start:end]):
+                matched_questions[start + int(offset)] = questions[offset]
+
+            chunk_matched = matched[start:end]
+            similarity = np.einsum("ij,ij->i", np.asarray(vectors[start:end]), np.asarray(vectors[chunk_matched]))
+            listed = ~kept[start:end] | near[start:end] | (sizes[start:end] > 1)
+            for offset in np.flatnonzero(listed):
+                row = start + int(offset)
+                writer.writerow([
+                    centres[row], row, chunk["source"].iat[offset], bool(kept[row]),
+                    round(float(similarity[offset]), 4), chunk_matched[offset], questions[offset],
+                    chunk["answer"].iat[offset], matched_questions.get(int(chunk_matched[offset]), questions[offset])
+                ])
+
+            if not args.dry_run:
+                chunk[kept[start:end]].drop(columns="source").to_csv(
+                    tmp_output, mode="a", header=start == 0, index=False, encoding="utf-8"
+                )
+
+    if not args.dry_run:
+        if staging.size == 0:
+            pd.DataFrame(columns=staging.columns[:-1]).to_csv(tmp_output, index=False, encoding="utf-8")
+        output = Path(args.output)
+        if output.exists() and args.backup:
+            backup_path = output.with_name(f"{output.stem}_backup{output.suffix}")
+            shutil.copyfile(output, backup_path)
+            print(f" نسخة احتياطية: {backup_path}")
+        tmp_output.replace(output)
+
+    return {
+        "kept": int(kept.sum()),
+        "near_duplicates": int((~kept).sum()),
+        "clusters": int((sizes > 1).sum()),
+        "kept_near": int(near.sum()),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument(
+        "inputs", nargs="*", type=Path,
+        default=[paths.kb_csv_path(), paths.data_dir / "technical_qa.csv"],
+        help="CSV files with question and answer columns; earlier files win inside a cluster"
+    )
+    parser.add_argument("--output", type=Path, default=paths.kb_csv_path(), help="default: CORTEX_KB_CSV, else data/knowledge_base.csv")
+    parser.add_argument("--report", type=Path, help="CSV of dropped and borderline rows (default: a temporary file)")
+    parser.add_argument("--dry-run", action="store_true", help="write the report only, leave --output untouched")
+    parser.add_argument("--no-backup", dest="backup", action="store_false", help="don't copy --output to *_backup.csv first")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD, help="cosine similarity that makes two questions duplicates")
+    parser.add_argument("--top-k", type=int, default=10, help="neighbours checked per row")
+    parser.add_argument("--nprobe", type=int, default=4, help="k-means lists searched per row")
+    parser.add_argument("--list-size", type=int, default=2000, help="target rows per k-means list")
+    parser.add_argument("--chunk-size", type=int, default=50_000, help="rows read, embedded and written per chunk")
+    parser.add_argument("--block-size", type=int, default=1024, help="query rows scored per matrix product")
+    parser.add_argument("--workers", type=int, default=1, help="number of encoder processes")
+    parser.add_argument("--batch-size", type=int, default=64, help="texts per encoder batch")
+    parser.add_argument("--backend", choices=BACKENDS, default="fp32", help="encoder implementation")
+    parser.add_argument("--no-cache", dest="cache", action="store_false", help="don't read or fill embedding_cache/")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    print(" دمج قواعد البيانات...\n")
+
+    inputs = [path for path in args.inputs if path.exists()]
+    for path in set(args.inputs) - set(inputs):
+        print(f" لم يتم العثور على {path}")
+    if not inputs:
+        return
+
+    encoder = build_encoder(DEFAULT_MODEL, args.backend)
+    store = EmbeddingStore(paths.state_dir() / "embedding_cache", encoder.name) if args.cache else None
+
+    # One set of worker processes for every chunk; started by the first parallel encode
+    pool = EncoderPool(encoder.model_name, args.workers, args.batch_size, backend=encoder.backend)
+
+    def encode(texts: List[str]) -> np.ndarray:
+        if args.workers > 1 and len(texts) > args.batch_size:
+            return pool.encode(texts)
+        return encoder.encode(texts, batch_size=args.batch_size, show_progress_bar=len(texts) > args.batch_size)
+
+    if args.report is None:
+        # Not under data/: the report is a review aid, not part of the KB
+        fd, report_path = tempfile.mkstemp(prefix="duplicates_report_", suffix=".csv")
+        os.close(fd)
+        args.report = Path(report_path)
+
+    with tempfile.TemporaryDirectory() as work_dir, pool:
+        staging = Staging(Path(work_dir), _read_columns(inputs))
+        staging.build(inputs, (lambda texts: store.get_or_encode(texts, encode)) if store else encode, args.chunk_size)
+        centres, matches = cluster_rows(staging, args)
+        summary = write_outputs(staging, centres, matches, args)
+
+    print(f"\n merge done{' (dry run)' if args.dry_run else ''}!")
+    print(f" read: {staging.read}")
+    print(f" exact duplicates: {staging.exact_duplicates}")
+    print(f" near duplicates: {summary['near_duplicates']} in {summary['clusters']} clusters (threshold {args.threshold})")
+    print(f" kept: {summary['kept']} ({summary['kept_near']} only close to a dropped row, see the report)")
+    print(f" report: {args.report}")
+
 
-print(" دمج قواعد البيانات...\n")
-
-
-base_dir = Path(__file__).resolve().parent.parent
-data_dir = base_dir / "data"
-
-
-original = pd.read_csv(data_dir / "knowledge_base.csv", encoding='utf-8')
-print(f" الملف الأصلي: {len(original)} سؤال")
-
-
-try:
-    new_data = pd.read_csv(data_dir / "technical_qa.csv", encoding='utf-8')
-    print(f" الملف الجديد: {len(new_data)} سؤال")
-    
-   
-    if 'question' not in new_data.columns or 'answer' not in new_data.columns:
-        print(" خطأ: الملف يجب أن يحتوي على عمودي question و answer")
-        exit(1)
-    
-    
-    merged = pd.concat([original, new_data], ignore_index=True)
-    
-   
-    merged = merged.dropna(subset=['question', 'answer'])
-    merged['question'] = merged['question'].str.strip()
-    merged['answer'] = merged['answer'].str.strip()
-    merged = merged.drop_duplicates(subset=['question'], keep='first')
-    
-  
-    backup_path = data_dir / "knowledge_base_backup.csv"
-    original.to_csv(backup_path, index=False, encoding='utf-8')
-    print(f" نسخة احتياطية: {backup_path}")
-    
-    
-    output_path = data_dir / "knowledge_base.csv"
-    merged.to_csv(output_path, index=False, encoding='utf-8')
-    
-    print(f"\n marge acev succse!")
-    print(f" كان: {len(original)} سؤال")
-    print(f" أضيف: {len(new_data)} سؤال")
-    print(f" أصبح: {len(merged)} سؤال")
-    
-except FileNotFoundError:
-    print(" لم يتم العثور على batch_1.cs ")
-except Exception as e:
-    print(f" خطأ: {e}")
+# Guard needed: encoder worker processes are spawned and re-import this module
+if __name__ == "__main__":
+    main()
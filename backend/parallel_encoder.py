@@ -0,0 +1,107 @@
+import multiprocessing
+import os
+from typing import List, Optional
+
+import numpy as np
+
+_worker_encoder = None
+
+
+def _init_worker(model_name: str, backend: str, torch_threads: int) -> None:
+    global _worker_encoder
+    import torch
+    from encoders import build_encoder
+
+    # Each worker gets its own slice of the cores instead of all of them
+    torch.set_num_threads(torch_threads)
+    _worker_encoder = build_encoder(model_name, backend)
+
+
+def _encode_batch(texts: List[str]) -> np.ndarray:
+    return _worker_encoder.encode(texts, batch_size=len(texts))
+
+
+class EncoderPool:
+    """
+    Encoder worker processes, each with its own model copy, reused by every
+    encode() call until close(). Open one for a whole ingest
+    (`with EncoderPool(...) as pool:`) instead of one per chunk, so each
+    worker loads the model once. Workers are started by the first encode().
+    """
+
+    def __init__(
+        self,
+        model_name: str,
+        workers: int,
+        batch_size: int = 64,
+        torch_threads: Optional[int] = None,
+        backend: str = "fp32"
+    ):
+        self.model_name = model_name
+        self.workers = workers
+        self.batch_size = batch_size
+        self.torch_threads = torch_threads or max(1, (os.cpu_count() or 1) // workers)
+        self.backend = backend
+        self._pool = None
+
+    def __enter__(self) -> "EncoderPool":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def _start(self):
+        if self._pool is None:
+            # spawn, not fork: torch's thread pools are not fork-safe
+            context = multiprocessing.get_context("spawn")
+            self._pool = context.Pool(
+                self.workers,
+                initializer=_init_worker,
+                initargs=(self.model_name, self.backend, self.torch_threads)
+            )
+        return self._pool
+
+    def encode(self, texts: List[str]) -> np.ndarray:
+        """
+        Texts are sorted by length before batching so every batch pads to a
+        similar length; results are written back in the original order.
+        """
+        if not texts:
+            return np.empty((0, 0), dtype=np.float32)
+
+        order = sorted(range(len(texts)), key=lambda i: len(texts[i]))
+        batches = [order[i:i + self.batch_size] for i in range(0, len(order), self.batch_size)]
+
+        embeddings: Optional[np.ndarray] = None
+        done = 0
+        report_every = max(1, len(batches) // 20)
+        batch_texts = ([texts[i] for i in batch] for batch in batches)
+        for n, (batch, vectors) in enumerate(zip(batches, self._start().imap(_encode_batch, batch_texts)), 1):
+            if embeddings is None:
+                embeddings = np.empty((len(texts), vectors.shape[1]), dtype=np.float32)
+            embeddings[batch] = vectors
+
+            done += len(batch)
+            if n % report_every == 0 or n == len(batches):
+                print(f" Encoded {done}/{len(texts)} texts on {self.workers} workers")
+
+        return embeddings
+
+    def close(self) -> None:
+        if self._pool is not None:
+            self._pool.close()
+            self._pool.join()
+            self._pool = None
+
+
+def encode_parallel(
+    texts: List[str],
+    model_name: str,
+    workers: int,
+    batch_size: int = 64,
+    torch_threads: Optional[int] = None,
+    backend: str = "fp32"
+) -> np.ndarray:
+    """One-off EncoderPool.encode; repeated calls should share one EncoderPool instead."""
+    with EncoderPool(model_name, workers, batch_size, torch_threads, backend) as pool:
+        return pool.encode(texts)
@@ -0,0 +1,20 @@
+"""
+Where the knowledge-base CSV and the state directory (chroma_db/,
+embedding_cache/, snapshots/, sessions/) live. The server, reload_db.py and
+merge_data.py all resolve them here, so they read and write the same files.
+"""
+import os
+from pathlib import Path
+
+base_dir = Path(__file__).resolve().parent.parent
+data_dir = base_dir / "data"
+
+
+def kb_csv_path() -> Path:
+    """CORTEX_KB_CSV, else data/knowledge_base.csv."""
+    return Path(os.environ.get("CORTEX_KB_CSV", data_dir / "knowledge_base.csv"))
+
+
+def state_dir() -> Path:
+    """CORTEX_STATE_DIR, else the repo root."""
+    return Path(os.environ.get("CORTEX_STATE_DIR", base_dir))
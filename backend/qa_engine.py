@@ -1,19 +1,54 @@
 import csv
+import time
 from pathlib import Path
 import numpy as np
 import pandas as pd
-from sklearn.metrics.pairwise import cosine_similarity
-from sentence_transformers import SentenceTransformer
+from embedding_store import EmbeddingStore
+from encoders import DEFAULT_MODEL, Encoder, build_encoder
+import metrics
+from parallel_encoder import encode_parallel
+import paths
+from snapshot import load_snapshot, save_snapshot, text_hash
+from text_normalization import normalize_question
+from vector_index import ExactIndex, blend_context
 
 
 class QAEngine:
     
-    def __init__(self, min_confidence: float = 0.75, model_name: str = "paraphrase-multilingual-MiniLM-L12-v2"):
-        self.model = SentenceTransformer(model_name)
+    # Only dense search here; service.py checks this like it does for QAEngineRag
+    search_mode = "dense"
+    batcher = None
+    
+    def __init__(
+        self,
+        min_confidence: float = 0.75,
+        model_name: str = DEFAULT_MODEL,
+        embedding_cache_dir: str | Path | None = None,
+        encode_workers: int = 1,
+        encode_batch_size: int = 64,
+        backend: str = "fp32",
+        encoder: Encoder | None = None,
+        context_weight: float = 0.3,
+    ):
+        self.startup_timings: dict[str, float] = {}
+        started = time.perf_counter()
+        self.encoder = encoder or build_encoder(model_name, backend)
+        self.startup_timings["model_load_s"] = time.perf_counter() - started
+        # Bumped on every write so answer-level caches can tell stale entries apart
+        self.generation = 0
+        self.encode_workers = encode_workers
+        self.encode_batch_size = encode_batch_size
+        self.embedding_store = EmbeddingStore(embedding_cache_dir, self.encoder.name) if embedding_cache_dir else None
         self.questions: list[str] = []
         self.answers: list[str] = []
-        self.question_embeddings: np.ndarray | None = None
+        self.index = ExactIndex()
+        # normalized question -> its rows in row order. Like QAEngineRag every
+        # duplicate is kept, and the lowest row answers (as with a snapshot)
+        self.exact_index: dict[str, list[int]] = {}
+        # Sorted normalized-question hashes and their rows, set when loaded from a snapshot
+        self._snapshot_exact: tuple[np.ndarray, np.ndarray] | None = None
         self.min_confidence = min_confidence
+        self.context_weight = context_weight
 
     
     def load_knowledge_base(self, csv_path: str | Path) -> None:
@@ -22,57 +57,199 @@ class QAEngine:
         
         self.questions = df["question"].astype(str).tolist()
         self.answers = df["answer"].astype(str).tolist()
+        self.exact_index = {}
+        self._index_exact(self.questions, 0)
+        self._snapshot_exact = None
         
         print("Computing embeddings for knowledge base...")
-        self.question_embeddings = self.model.encode(
+        self.index.reset(self._encode_corpus(self.questions))
+        print(f"Loaded {len(self.questions)} questions with embeddings")
+
+    
+    def save_snapshot(self, directory: str | Path, source: dict | None = None) -> None:
+        
+        exact_keys = [normalize_question(q) for q in self.questions]
+        save_snapshot(
+            directory,
+            self.index.vectors,
             self.questions,
-            convert_to_tensor=False,
-            show_progress_bar=True
+            self.answers,
+            exact_keys,
+            {"encoder": self.encoder.name, "source": source},
         )
-        print(f"Loaded {len(self.questions)} questions with embeddings")
+        print(f"Saved snapshot of {len(self.questions)} questions to {directory}")
 
     
-    def find_answers(self, user_question: str, top_k: int = 3, context: str = "") -> list[dict]:
-       
-        if self.question_embeddings is None:
-            raise ValueError("Knowledge base not loaded")
+    def load_snapshot(self, directory: str | Path, source: dict | None = None) -> bool:
+        """
+        Attach a snapshot written by save_snapshot. Embeddings and texts stay
+        memory-mapped, so worker processes on one host share the same pages.
+        Returns False when there is no usable snapshot for this encoder/source.
+        """
+        snapshot = load_snapshot(directory)
+        if snapshot is None:
+            return False
+        meta = snapshot["meta"]
+        if meta.get("encoder") != self.encoder.name or meta.get("source") != source:
+            return False
+        
+        self.questions = snapshot["questions"]
+        self.answers = snapshot["answers"]
+        self.index.attach(snapshot["embeddings"])
+        self.exact_index = {}
+        self._snapshot_exact = (snapshot["exact_hashes"], snapshot["exact_rows"])
+        print(f"Loaded snapshot with {len(self.questions)} questions from {directory}")
+        return True
+
+    
+    def _index_exact(self, questions: list[str], first: int) -> None:
         
-      
-        search_query = user_question
+        for i, question in enumerate(questions, start=first):
+            self.exact_index.setdefault(normalize_question(question), []).append(i)
+
+    
+    def _exact_lookup(self, user_question: str) -> int | None:
+        
+        key = normalize_question(user_question)
+        if self._snapshot_exact is not None:
+            # Snapshot rows come before any added since, so they are checked first
+            hashes, rows = self._snapshot_exact
+            key_hash = np.uint64(text_hash(key))
+            pos = int(np.searchsorted(hashes, key_hash))
+            while pos < len(hashes) and hashes[pos] == key_hash:
+                row = int(rows[pos])
+                # Guard against 64-bit hash collisions
+                if normalize_question(self.questions[row]) == key:
+                    return row
+                pos += 1
+        rows = self.exact_index.get(key)
+        return rows[0] if rows else None
+
+    
+    @property
+    def question_embeddings(self) -> np.ndarray | None:
+        # Normalized rows, a view into the index buffer
+        return self.index.vectors if len(self.index) else None
+
+    
+    def _encode_corpus(self, texts: list[str]) -> np.ndarray:
+        
+        def encode(batch: list[str]) -> np.ndarray:
+            if self.encode_workers > 1 and len(batch) > self.encode_batch_size:
+                return encode_parallel(
+                    batch,
+                    self.encoder.model_name,
+                    self.encode_workers,
+                    self.encode_batch_size,
+                    backend=self.encoder.backend,
+                )
+            # No progress bar for small API writes
+            return self.encoder.encode(
+                batch, batch_size=self.encode_batch_size, show_progress_bar=len(batch) > self.encode_batch_size
+            )
+        
+        if self.embedding_store is None:
+            return encode(texts)
+        return self.embedding_store.get_or_encode(texts, encode)
+
+    
+    def _build_search_query(self, user_question: str, context: str = "") -> str:
         if context:
-          
-            search_query = f"{user_question} [السياق: {context[-200:]}]"
+            return f"{user_question} [السياق: {context[-200:]}]"
+        return user_question
+
+    
+    def embed_question(self, question: str) -> np.ndarray:
+        with metrics.stage("encode"):
+            return self.encoder.encode([question])[0]
+
+    
+    def find_answers_batch(self, search_queries: list[str | np.ndarray], top_k: int = 3) -> list[list[dict]]:
+       
+        if not len(self.index):
+            raise ValueError("Knowledge base not loaded")
         
-        user_embedding = self.model.encode([search_query], convert_to_tensor=False)
-        similarities = cosine_similarity(user_embedding, self.question_embeddings)[0]
-        top_indices = similarities.argsort()[-top_k:][::-1]
+        # Strings are encoded in one call, vectors are searched as-is
+        texts = [q for q in search_queries if isinstance(q, str)]
+        encoded = iter(())
+        if texts:
+            with metrics.stage("encode"):
+                encoded = iter(self.encoder.encode(texts))
+        user_embeddings = np.vstack([next(encoded) if isinstance(q, str) else q for q in search_queries])
+        with metrics.stage("vector_query"):
+            top_indices, top_scores = self.index.search(user_embeddings, top_k)
         
-        results: list[dict] = []
-        for idx in top_indices:
-            confidence = float(similarities[idx])
-            results.append({
-                "question": self.questions[idx],
-                "answer": self.answers[idx],
-                "confidence": confidence,
-                "index": int(idx),
-                "source": "local" if confidence >= self.min_confidence else "local_low",
-            })
-        return results
+        all_results: list[list[dict]] = []
+        for indices, scores in zip(top_indices, top_scores):
+            results: list[dict] = []
+            for idx, score in zip(indices.tolist(), scores.tolist()):
+                results.append({
+                    "question": self.questions[idx],
+                    "answer": self.answers[idx],
+                    "confidence": score,
+                    "index": idx,
+                    "source": "local" if score >= self.min_confidence else "local_low",
+                })
+            all_results.append(results)
+        return all_results
 
     
-    def find_answer(self, user_question: str, min_confidence: float | None = None, context: str = "") -> dict:
+    def find_answers(self, user_question: str, top_k: int = 3, context: str = "") -> list[dict]:
+       
+        search_query = self._build_search_query(user_question, context)
+        return self.find_answers_batch([search_query], top_k=top_k)[0]
+
+    
+    def find_answer(
+        self,
+        user_question: str,
+        min_confidence: float | None = None,
+        context: str = "",
+        context_vector: np.ndarray | None = None,
+    ) -> dict:
     
         if min_confidence is None:
             min_confidence = self.min_confidence
         
+        idx = self._exact_lookup(user_question)
+        if idx is not None:
+            match = {
+                "question": self.questions[idx],
+                "answer": self.answers[idx],
+                "confidence": 1.0,
+                "index": idx,
+                "source": "local",
+            }
+            # The indexed row stands in for the question's own vector: same normalized text, no encode
+            return {**match, "match": "exact", "top_matches": [match], "query_vector": np.array(self.index.vectors[idx])}
+        
     
-        results = self.find_answers(user_question, top_k=5, context=context)
+        # query_vector: the question's embedding, returned so callers can fold
+        # it into the session context without encoding it again
+        if context_vector is not None:
+            query_vector = self.embed_question(user_question)
+            results, results_no_context = self.find_answers_batch(
+                [blend_context(query_vector, context_vector, self.context_weight), query_vector],
+                top_k=5,
+            )
+            results_no_context = results_no_context[:3]
+        elif context:
+            # One encode call for both the context and the no-context variant
+            with metrics.stage("encode"):
+                search_vector, query_vector = self.encoder.encode(
+                    [self._build_search_query(user_question, context), user_question]
+                )
+            results, results_no_context = self.find_answers_batch([search_vector, query_vector], top_k=5)
+            results_no_context = results_no_context[:3]
+        else:
+            query_vector = self.embed_question(user_question)
+            results = self.find_answers_batch([query_vector], top_k=5)[0]
+            results_no_context = []
         best = results[0]
         confidence = best["confidence"]
         
        
-        if context and confidence < min_confidence:
-            results_no_context = self.find_answers(user_question, top_k=3, context="")
+        if results_no_context and confidence < min_confidence:
             if results_no_context[0]["confidence"] > confidence:
                 best = results_no_context[0]
                 confidence = best["confidence"]
@@ -84,6 +261,7 @@ class QAEngine:
                 "confidence": float(confidence),
                 "source": "none",
                 "top_matches": results,
+                "query_vector": query_vector,
             }
         
         return {
@@ -92,25 +270,14 @@ class QAEngine:
             "confidence": float(confidence),
             "source": "local",
             "top_matches": results,
+            "query_vector": query_vector,
         }
 
     
     def add_to_knowledge_base(self, question: str, answer: str, csv_path: str | Path | None = None) -> None:
-        self.questions.append(question)
-        self.answers.append(answer)
-        
-        new_embedding = self.model.encode([question], convert_to_tensor=False)
-        
-        if self.question_embeddings is None:
-            self.question_embeddings = new_embedding
-        else:
-            self.question_embeddings = np.vstack([self.question_embeddings, new_embedding])
+        self.add_qa_pair(question, answer)
         
-        if csv_path is not None:
-            csv_path = Path(csv_path)
-        else:
-            base_dir = Path(__file__).resolve().parent.parent
-            csv_path = base_dir / "data" / "knowledge_base.csv"
+        csv_path = Path(csv_path) if csv_path is not None else paths.kb_csv_path()
         
         with open(csv_path, "a", encoding="utf-8", newline="") as f:
             writer = csv.writer(f)
@@ -118,13 +285,81 @@ class QAEngine:
         
         print(f"Added new Q&A. Total questions: {len(self.questions)}")
 
+    
+    def add_qa_pair(self, question: str, answer: str, metadata: dict | None = None) -> str:
+        """Same call as QAEngineRag.add_qa_pair, in memory only (nothing is appended to the CSV)."""
+        return self.add_qa_pairs([(question, answer, metadata)])[0]
 
-def build_qa_engine() -> QAEngine:
-    base_dir = Path(__file__).resolve().parent.parent
-    csv_path = base_dir / "data" / "knowledge_base.csv"
     
-    engine = QAEngine(min_confidence=0.75)
+    def add_qa_pairs(self, pairs: list[tuple[str, str, dict | None]]) -> list[str]:
+        """Batched add_qa_pair: one encode pass and one index append for all pairs."""
+        if not pairs:
+            return []
+        questions = [question for question, _, _ in pairs]
+        embeddings = self._encode_corpus(questions)
+        
+        first = len(self.questions)
+        self.questions.extend(questions)
+        self.answers.extend(answer for _, answer, _ in pairs)
+        self._index_exact(questions, first)
+        self.index.add(embeddings)
+        self.generation += 1
+        return [str(i) for i in range(first, len(self.questions))]
+
+    
+    def clear_query_cache(self) -> None:
+        # Queries aren't cached here
+        pass
+
+    
+    def after_fork(self) -> None:
+        # Nothing process-bound: the index is plain numpy (or a shared memmap)
+        pass
+
+    
+    def count(self) -> int:
+        return len(self.questions)
+
+    
+    def get_stats(self) -> dict:
+        return {
+            "total_items": len(self.questions),
+            "model_name": self.encoder.name,
+            "query_cache": None,
+            "batcher": None,
+            "embedding_store": self.embedding_store.stats() if self.embedding_store is not None else None,
+            "exact_index_size": len(self.exact_index) if self._snapshot_exact is None else len(self._snapshot_exact[0]),
+            "generation": self.generation,
+            "startup": self.startup_timings,
+        }
+
+
+def build_qa_engine(
+    backend: str = "fp32",
+    use_snapshot: bool = True,
+    csv_path: str | Path | None = None,
+    state_dir: str | Path | None = None,
+) -> QAEngine:
+    """`state_dir` holds embedding_cache/ and snapshots/ (default: paths.state_dir())."""
+    csv_path = Path(csv_path) if csv_path is not None else paths.kb_csv_path()
+    state_dir = Path(state_dir) if state_dir is not None else paths.state_dir()
+    
+    engine = QAEngine(min_confidence=0.75, embedding_cache_dir=state_dir / "embedding_cache", backend=backend)
+    
+    # The snapshot is only reused while the CSV it was built from is unchanged
+    csv_stat = csv_path.stat()
+    source = {"csv": str(csv_path), "size": csv_stat.st_size, "mtime": csv_stat.st_mtime}
+    snapshot_dir = state_dir / "snapshots" / engine.encoder.name.replace("/", "_")
+    
+    started = time.perf_counter()
+    if use_snapshot and engine.load_snapshot(snapshot_dir, source):
+        engine.startup_timings["snapshot_load_s"] = time.perf_counter() - started
+        return engine
+    
     engine.load_knowledge_base(csv_path)
+    if use_snapshot:
+        engine.save_snapshot(snapshot_dir, source)
+    engine.startup_timings["index_build_s"] = time.perf_counter() - started
     return engine
 
 
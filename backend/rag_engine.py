@@ -1,11 +1,57 @@
 import csv
 from pathlib import Path
-from typing import List, Dict, Optional
+from contextlib import contextmanager
+from typing import Iterator, List, Dict, NamedTuple, Optional, Sequence, Tuple, Union
 import pandas as pd
-from sentence_transformers import SentenceTransformer
 import chromadb
 from chromadb.config import Settings
-import uuid
+import hashlib
+import json
+import os
+import re
+import time
+import numpy as np
+from embedding_store import EmbeddingStore
+from encoders import DEFAULT_MODEL, Encoder, build_encoder
+from lexical_index import BM25Index
+from lru_cache import LRUCache, normalize_query
+import metrics
+from parallel_encoder import EncoderPool, encode_parallel
+import paths
+from request_batcher import RequestBatcher
+from text_normalization import detect_language, detect_languages, normalize_question
+from vector_index import blend_context, normalize_rows
+
+
+# Chroma rejects very large single writes, so bulk operations are chunked
+WRITE_BATCH_SIZE = 5000
+
+# Bump when the id scheme or stored metadata changes; collections written with
+# another schema or model are dropped and rebuilt instead of being reused
+SCHEMA_VERSION = 2
+
+# Metadata fields that can get their own sub-collections (see partition_by)
+PARTITION_FIELDS = ("language", "category")
+PARTITION_PREFIX = "kb-"
+
+# dense: vector search only; lexical: BM25 only, no encode; hybrid: both, merged
+SEARCH_MODES = ("dense", "hybrid", "lexical")
+
+
+def parse_partitions(value: Optional[str]) -> Optional[Tuple[str, ...]]:
+    """CORTEX_PARTITIONS / --partitions: "language,category" -> fields; unset -> None (keep the stored layout)."""
+    if value is None:
+        return None
+    return tuple(field.strip() for field in value.split(",") if field.strip())
+
+
+class ContextQuery(NamedTuple):
+    """A question searched blended with a session context vector; encoded with the rest of its batch."""
+    text: str
+    context_vector: np.ndarray
+
+
+SearchQuery = Union[str, np.ndarray, ContextQuery]
 
 
 class QAEngineRag:
@@ -14,33 +60,160 @@ class QAEngineRag:
     def __init__(
         self,
         min_confidence: float = 0.75,
-        model_name: str = "paraphrase-multilingual-MiniLM-L12-v2",
-        persist_directory: str = "./chroma_db"
+        model_name: str = DEFAULT_MODEL,
+        persist_directory: str | Path = "./chroma_db",
+        query_cache_size: int = 4096,
+        query_cache_ttl: Optional[float] = 3600.0,
+        embedding_cache_dir: Optional[str | Path] = None,
+        encode_workers: int = 1,
+        encode_batch_size: int = 64,
+        backend: str = "fp32",
+        encoder: Optional[Encoder] = None,
+        context_weight: float = 0.3,
+        partition_by: Optional[Sequence[str]] = None,
+        search_mode: str = "dense",
+        lexical_weight: float = 0.3
     ):
       
+        if search_mode not in SEARCH_MODES:
+            raise ValueError(f"Unknown search mode '{search_mode}', expected one of {SEARCH_MODES}")
+        unknown = set(partition_by or ()) - set(PARTITION_FIELDS)
+        if unknown:
+            raise ValueError(f"Can't partition by {sorted(unknown)}, expected a subset of {PARTITION_FIELDS}")
+        
         self.min_confidence = min_confidence
-        self.model = SentenceTransformer(model_name)
+        # Share of the session context vector in a context-aware query vector
+        self.context_weight = context_weight
+        self.search_mode = search_mode
+        # How far a full keyword match pulls a hybrid score towards 1.0
+        self.lexical_weight = lexical_weight
+        # Bumped on every write so answer-level caches can tell stale entries apart
+        self.generation = 0
+        self.startup_timings: Dict[str, float] = {}
+        self.encode_workers = encode_workers
+        self.encode_batch_size = encode_batch_size
+        # Set for the duration of an ingest, see encoder_pool()
+        self._encoder_pool: Optional[EncoderPool] = None
         
+        started = time.perf_counter()
+        self.encoder = encoder or build_encoder(model_name, backend)
+        self.startup_timings["model_load_s"] = time.perf_counter() - started
         
-        self.chroma_client = chromadb.Client(Settings(
-            persist_directory=persist_directory,
-            anonymized_telemetry=False
-        ))
+        self.query_cache = LRUCache(max_size=query_cache_size, ttl_seconds=query_cache_ttl)
+        self.batcher: Optional[RequestBatcher] = None
+        self.embedding_store = EmbeddingStore(embedding_cache_dir, self.encoder.name) if embedding_cache_dir else None
+        
+        
+        started = time.perf_counter()
+        self.persist_directory = str(persist_directory)
+        self.chroma_client = chromadb.PersistentClient(
+            path=self.persist_directory,
+            settings=Settings(anonymized_telemetry=False)
+        )
+        self.collection = self._open_collection()
+        self.startup_timings["index_open_s"] = time.perf_counter() - started
+        
+        # Optional sub-collection per language / category value, written
+        # alongside the main collection so filtered searches query a
+        # smaller index instead of post-filtering the whole one. None keeps
+        # the layout the store was built with, () drops its partitions
+        self.partitions: Dict[Tuple[str, str], object] = {}
+        self._sync_partition_layout(partition_by)
+        
+        # normalized question -> {id: ready-made match}, answered without touching
+        # the model; several stored questions can normalize to the same key
+        self.exact_index: Dict[str, Dict[str, Dict]] = {}
+        self._exact_keys: Dict[str, str] = {}
+        # id -> stored question vector, handed to the session on an exact hit
+        # without a Chroma read (float32, about 1.5 KB a row at 384 dims)
+        self._exact_vectors: Dict[str, np.ndarray] = {}
+        # BM25 over the stored questions, kept in step with the exact index
+        self.lexical_index = BM25Index()
+        started = time.perf_counter()
+        self.rebuild_exact_index()
+        self.startup_timings["exact_index_s"] = time.perf_counter() - started
+    
+    
+    def _collection_metadata(self) -> Dict:
+        
+        return {
+            "hnsw:space": "cosine",
+            "schema_version": SCHEMA_VERSION,
+            "model_name": self.encoder.name
+        }
+    
+    
+    def _create_collection(self):
+        
+        return self.chroma_client.create_collection(
+            name="knowledge_base",
+            metadata=self._collection_metadata()
+        )
+    
+    
+    def _open_collection(self):
         
-       
         try:
-            self.collection = self.chroma_client.get_collection(name="knowledge_base")
-            print(f" Loaded existing collection with {self.collection.count()} items")
-        except:
-            self.collection = self.chroma_client.create_collection(
-                name="knowledge_base",
-                metadata={"hnsw:space": "cosine"} 
-            )
+            collection = self.chroma_client.get_collection(name="knowledge_base")
+        except Exception:
             print(" Created new collection")
+            return self._create_collection()
+        
+        stored = collection.metadata or {}
+        if (stored.get("schema_version") != SCHEMA_VERSION
+                or stored.get("model_name") != self.encoder.name):
+            print(
+                f" Existing collection was built with schema {stored.get('schema_version')} / "
+                f"model {stored.get('model_name')}, rebuilding"
+            )
+            self.chroma_client.delete_collection(name="knowledge_base")
+            return self._create_collection()
+        
+        print(f" Loaded existing collection with {collection.count()} items")
+        return collection
+    
+    
+    def warm_up(self) -> None:
+        """Run one encode and one query so the first request doesn't pay for lazy init."""
+        started = time.perf_counter()
+        probe = self.encoder.encode(["warm up"])
+        if self.collection.count() > 0:
+            self.collection.query(query_embeddings=probe.tolist(), n_results=1)
+        self.startup_timings["warm_up_s"] = time.perf_counter() - started
+    
+    
+    def after_fork(self) -> None:
+        """
+        Call in a forked worker before serving. The model weights and the
+        exact-match index are inherited copy-on-write; Chroma's SQLite
+        connections and the batcher thread are not usable after fork() and
+        are re-created here.
+        """
+        try:
+            from chromadb.api.client import SharedSystemClient
+            
+            # Otherwise PersistentClient hands back the parent's cached system
+            SharedSystemClient.clear_system_cache()
+        except ImportError:
+            pass
+        
+        self.chroma_client = chromadb.PersistentClient(
+            path=self.persist_directory,
+            settings=Settings(anonymized_telemetry=False)
+        )
+        self.collection = self._open_collection()
+        self.partitions.clear()
+        
+        if self.batcher is not None:
+            self.enable_batching(self.batcher.window_ms, self.batcher.max_batch_size)
     
     
     def load_from_csv(self, csv_path: str | Path, clear_existing: bool = False) -> None:
-       
+        """
+        Sync the collection with the CSV: only new or changed rows are
+        embedded and upserted, and rows no longer in the file are deleted.
+        For files too large to hold in memory use stream_from_csv.
+        """
         csv_path = Path(csv_path)
         
         if not csv_path.exists():
@@ -48,142 +221,861 @@ class QAEngineRag:
         
        
         if clear_existing:
-            try:
-                self.chroma_client.delete_collection(name="knowledge_base")
-                self.collection = self.chroma_client.create_collection(
-                    name="knowledge_base",
-                    metadata={"hnsw:space": "cosine"}
-                )
-                print(" Cleared existing data")
-            except:
-                pass
+            self._clear_collection()
         
        
         df = pd.read_csv(csv_path, encoding="utf-8")
         
         print(f"📂 Loading {len(df)} Q&A pairs from CSV...")
         
-        questions = df["question"].astype(str).tolist()
-        answers = df["answer"].astype(str).tolist()
+        rows = self._rows_by_id(df)
+        if len(rows) < len(df):
+            print(f" Skipped {len(df) - len(rows)} duplicate questions (last row wins)")
+        
+        existing = self._get_existing_metadatas()
         
+        to_delete = [item_id for item_id in existing if item_id not in rows]
+        for i in range(0, len(to_delete), WRITE_BATCH_SIZE):
+            self.collection.delete(ids=to_delete[i:i + WRITE_BATCH_SIZE])
+        self._delete_from_partitions({item_id: existing[item_id] for item_id in to_delete})
+        for item_id in to_delete:
+            self._unindex_exact(item_id)
         
-        print(" Computing embeddings...")
-        embeddings = self.model.encode(
-            questions,
-            convert_to_tensor=False,
-            show_progress_bar=True
+        counts = self._sync_rows(rows, existing)
+        self.generation += 1
+        
+        print(
+            f" {counts['new']} new, {counts['changed']} changed, "
+            f"{len(to_delete)} removed, {counts['unchanged']} unchanged"
         )
+        print(f" Successfully loaded {len(rows)} Q&A pairs")
+        print(f" Total items in collection: {self.collection.count()}")
+    
+    
+    def stream_from_csv(
+        self,
+        csv_path: str | Path,
+        chunk_size: int = 10000,
+        checkpoint_path: Optional[str | Path] = None,
+        clear_existing: bool = False,
+        prune: bool = False
+    ) -> None:
+        """
+        Ingest the CSV chunk by chunk so memory stays flat regardless of file
+        size. After each chunk is written the number of committed rows is
+        saved to `checkpoint_path`, and a later call on the same, unmodified
+        file resumes from there. With `prune`, rows that are no longer in the
+        file are deleted once the whole file has been ingested.
+        """
+        csv_path = Path(csv_path)
         
-     
-        ids = [str(uuid.uuid4()) for _ in range(len(questions))]
-        metadatas = [
-            {
-                "question": q,
-                "language": self._detect_language(q),
-                "length": len(a)
-            }
-            for q, a in zip(questions, answers)
-        ]
+        if not csv_path.exists():
+            raise FileNotFoundError(f"CSV file not found: {csv_path}")
         
-       
-        print(" Saving to ChromaDB...")
-        self.collection.add(
-            embeddings=embeddings.tolist(),
-            documents=answers,
-            metadatas=metadatas,
-            ids=ids
+        if checkpoint_path is None:
+            checkpoint_path = Path(self.persist_directory) / "ingest_checkpoint.json"
+        checkpoint_path = Path(checkpoint_path)
+        
+        file_stat = csv_path.stat()
+        checkpoint = {
+            "csv_path": str(csv_path.resolve()),
+            "size": file_stat.st_size,
+            "mtime": file_stat.st_mtime,
+            "run_id": hashlib.sha1(f"{csv_path.resolve()}{time.time()}".encode("utf-8")).hexdigest()[:12],
+            "rows_committed": 0
+        }
+        
+        previous = self._read_checkpoint(checkpoint_path)
+        if previous and all(previous.get(key) == checkpoint[key] for key in ("csv_path", "size", "mtime")):
+            checkpoint.update(run_id=previous["run_id"], rows_committed=previous["rows_committed"])
+            print(f" Resuming {csv_path.name} after row {checkpoint['rows_committed']}")
+        elif clear_existing:
+            self._clear_collection()
+        
+        extra_metadata = {"ingest_run": checkpoint["run_id"]} if prune else None
+        totals = {"new": 0, "changed": 0, "unchanged": 0}
+        started = time.perf_counter()
+        
+        header = pd.read_csv(csv_path, encoding="utf-8", nrows=0).columns
+        reader = pd.read_csv(
+            csv_path,
+            encoding="utf-8",
+            usecols=[column for column in ("question", "answer", "category") if column in header],
+            chunksize=chunk_size,
+            skiprows=range(1, checkpoint["rows_committed"] + 1)
         )
+        # One set of encoder processes for all chunks, not one per chunk
+        with self.encoder_pool():
+            for chunk in reader:
+                rows = self._rows_by_id(chunk)
+                existing = self._get_metadatas_by_id(list(rows))
+                counts = self._sync_rows(rows, existing, extra_metadata=extra_metadata)
+                
+                for key in totals:
+                    totals[key] += counts[key]
+                checkpoint["rows_committed"] += len(chunk)
+                self._write_checkpoint(checkpoint_path, checkpoint)
+                
+                elapsed = time.perf_counter() - started
+                print(
+                    f" {checkpoint['rows_committed']} rows committed "
+                    f"({counts['new']} new, {counts['changed']} changed in this chunk, "
+                    f"{sum(totals.values()) / max(elapsed, 1e-9):.0f} rows/s)"
+                )
         
-        print(f" Successfully loaded {len(questions)} Q&A pairs")
+        if prune:
+            # Rows from this run carry its ingest_run tag, anything else is
+            # stale. Paged, so only one page of metadata is held at a time
+            removed = 0
+            offset = 0
+            while True:
+                page = self.collection.get(include=["metadatas"], limit=WRITE_BATCH_SIZE, offset=offset)
+                if not page["ids"]:
+                    break
+                stale = {
+                    item_id: metadata for item_id, metadata in zip(page["ids"], page["metadatas"])
+                    if (metadata or {}).get("ingest_run") != checkpoint["run_id"]
+                }
+                if stale:
+                    self.collection.delete(ids=list(stale))
+                    self._delete_from_partitions(stale)
+                    for item_id in stale:
+                        self._unindex_exact(item_id)
+                # Deleted rows drop out of the listing, the next page starts that much earlier
+                offset += len(page["ids"]) - len(stale)
+                removed += len(stale)
+            print(f" Removed {removed} rows no longer in the file")
+        
+        checkpoint_path.unlink(missing_ok=True)
+        self.generation += 1
+        print(
+            f" Finished {csv_path.name}: {totals['new']} new, {totals['changed']} changed, "
+            f"{totals['unchanged']} unchanged"
+        )
         print(f" Total items in collection: {self.collection.count()}")
     
     
-    def _detect_language(self, text: str) -> str:
+    def _clear_collection(self) -> None:
+        
+        try:
+            self.chroma_client.delete_collection(name="knowledge_base")
+        except Exception:
+            pass
+        self.collection = self._create_collection()
+        self._drop_partitions()
+        self.exact_index.clear()
+        self._exact_keys.clear()
+        self._exact_vectors.clear()
+        self.lexical_index.clear()
+        self.generation += 1
+        print(" Cleared existing data")
+    
+    
+    def rebuild_exact_index(self) -> None:
+        
+        self.exact_index.clear()
+        self._exact_keys.clear()
+        self._exact_vectors.clear()
+        self.lexical_index.clear()
+        include = ["metadatas", "documents"] if self.search_mode == "lexical" else ["metadatas", "documents", "embeddings"]
+        offset = 0
+        while True:
+            page = self.collection.get(include=include, limit=WRITE_BATCH_SIZE, offset=offset)
+            if not page["ids"]:
+                break
+            embeddings = page.get("embeddings") if "embeddings" in include else None
+            if embeddings is None:
+                embeddings = [None] * len(page["ids"])
+            for item_id, answer, metadata, embedding in zip(page["ids"], page["documents"], page["metadatas"], embeddings):
+                self._index_exact(item_id, answer, metadata, embedding)
+            offset += len(page["ids"])
     
-        if any('\u0600' <= c <= '\u06FF' for c in text):
-            return "arabic"
-        elif any('\u0041' <= c <= '\u007A' for c in text.lower()):
-            return "english"
-        else:
-            return "other"
     
+    def _index_exact(self, item_id: str, answer: str, metadata: Dict, embedding=None) -> None:
+        
+        # Without a new embedding (metadata-only update) the row keeps its vector
+        vector = self._exact_vectors.get(item_id) if embedding is None else np.asarray(embedding, dtype=np.float32)
+        self._unindex_exact(item_id)
+        if vector is not None and self.search_mode != "lexical":
+            self._exact_vectors[item_id] = vector
+        key = normalize_question(metadata.get("question", ""))
+        entry = {
+            "question": metadata.get("question", ""),
+            "answer": answer,
+            "confidence": 1.0,
+            "metadata": metadata,
+            "id": item_id,
+            "source": "local"
+        }
+        # Copy-on-write so concurrent lookups never see a dict being resized
+        self.exact_index[key] = {**self.exact_index.get(key, {}), item_id: entry}
+        self._exact_keys[item_id] = key
+        self.lexical_index.add(item_id, entry["question"], entry)
     
-    def search(
+    
+    def _unindex_exact(self, item_id: str) -> None:
+        
+        key = self._exact_keys.pop(item_id, None)
+        self._exact_vectors.pop(item_id, None)
+        if key is not None:
+            entries = {other_id: entry for other_id, entry in self.exact_index.get(key, {}).items() if other_id != item_id}
+            if entries:
+                self.exact_index[key] = entries
+            else:
+                self.exact_index.pop(key, None)
+        self.lexical_index.remove(item_id)
+    
+    
+    def _exact_match(self, question: str) -> Optional[Dict]:
+        """Stored row whose normalized question equals this one's; the smallest id wins if several do."""
+        entries = self.exact_index.get(normalize_question(question))
+        if not entries:
+            return None
+        return entries[min(entries)]
+    
+    
+    def _rows_by_id(self, df: pd.DataFrame) -> Dict[str, tuple[str, str, str, str]]:
+        """id -> (question, answer, language, category); languages are detected for the whole column at once."""
+        questions = df["question"].astype(str)
+        languages = detect_languages(questions)
+        categories = df["category"].fillna("").astype(str) if "category" in df.columns else [""] * len(df)
+        
+        rows: Dict[str, tuple[str, str, str, str]] = {}
+        for q, a, language, category in zip(questions, df["answer"].astype(str), languages, categories):
+            rows[self._make_id(q)] = (q, a, str(language), category)
+        return rows
+    
+    
+    def _sync_rows(
         self,
-        query: str,
-        top_k: int = 5,
-        context: str = "",
-        language_filter: Optional[str] = None
-    ) -> List[Dict]:
- 
-        search_query = query
-        if context:
-            search_query = f"{query} [السياق: {context[-200:]}]"
+        rows: Dict[str, tuple[str, str, str, str]],
+        existing: Dict[str, Dict],
+        extra_metadata: Optional[Dict] = None
+    ) -> Dict[str, int]:
+        """Embed and upsert the rows of `rows` that are new or differ from `existing`; the exact index follows along."""
+        to_embed: List[str] = []
+        to_reuse: List[str] = []
+        to_touch: List[str] = []
+        for item_id, (q, a, _, category) in rows.items():
+            old = existing.get(item_id)
+            if old is None:
+                to_embed.append(item_id)
+            elif old.get("content_hash") == self._content_hash(q, a, category):
+                if extra_metadata and any(old.get(k) != v for k, v in extra_metadata.items()):
+                    to_touch.append(item_id)
+            elif old.get("question") == q:
+                # Only the answer changed, the stored question embedding is still valid
+                to_reuse.append(item_id)
+            else:
+                to_embed.append(item_id)
         
-       
-        query_embedding = self.model.encode([search_query], convert_to_tensor=False)
+        embeddings: Dict[str, List[float]] = {}
+        if to_embed:
+            encoded = self._encode_corpus([rows[item_id][0] for item_id in to_embed])
+            embeddings.update(zip(to_embed, encoded.tolist()))
         
-       
-        where_clause = None
-        if language_filter:
-            where_clause = {"language": language_filter}
+        for i in range(0, len(to_reuse), WRITE_BATCH_SIZE):
+            stored = self.collection.get(ids=to_reuse[i:i + WRITE_BATCH_SIZE], include=["embeddings"])
+            embeddings.update(zip(stored["ids"], stored["embeddings"]))
         
-       
-        results = self.collection.query(
-            query_embeddings=query_embedding.tolist(),
-            n_results=top_k,
-            where=where_clause
-        )
+        changed_ids = to_embed + to_reuse
+        for i in range(0, len(changed_ids), WRITE_BATCH_SIZE):
+            batch_ids = changed_ids[i:i + WRITE_BATCH_SIZE]
+            batch_embeddings = [embeddings[item_id] for item_id in batch_ids]
+            batch_documents = [rows[item_id][1] for item_id in batch_ids]
+            batch_metadatas = [{**self._build_metadata(*rows[item_id]), **(extra_metadata or {})} for item_id in batch_ids]
+            self.collection.upsert(
+                embeddings=batch_embeddings,
+                documents=batch_documents,
+                metadatas=batch_metadatas,
+                ids=batch_ids
+            )
+            self._write_partitions(batch_ids, batch_embeddings, batch_documents, batch_metadatas, existing)
+            for item_id, document, metadata, embedding in zip(batch_ids, batch_documents, batch_metadatas, batch_embeddings):
+                self._index_exact(item_id, document, metadata, embedding)
+        
+        # Unchanged rows only need their metadata refreshed, no re-embedding.
+        # Partitions keep the old tag: it is only used to prune the main collection
+        for i in range(0, len(to_touch), WRITE_BATCH_SIZE):
+            batch_ids = to_touch[i:i + WRITE_BATCH_SIZE]
+            batch_metadatas = [{**existing[item_id], **extra_metadata} for item_id in batch_ids]
+            self.collection.update(ids=batch_ids, metadatas=batch_metadatas)
+            for item_id, metadata in zip(batch_ids, batch_metadatas):
+                self._index_exact(item_id, rows[item_id][1], metadata)
+        
+        return {
+            "new": sum(1 for item_id in to_embed if item_id not in existing),
+            "changed": sum(1 for item_id in changed_ids if item_id in existing),
+            "unchanged": len(rows) - len(changed_ids)
+        }
+    
+    
+    def _read_checkpoint(self, checkpoint_path: Path) -> Optional[Dict]:
+        
+        try:
+            return json.loads(checkpoint_path.read_text(encoding="utf-8"))
+        except (FileNotFoundError, ValueError):
+            return None
+    
+    
+    def _write_checkpoint(self, checkpoint_path: Path, checkpoint: Dict) -> None:
+        
+        # Write-then-rename so a crash never leaves a half-written checkpoint
+        checkpoint_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = checkpoint_path.with_suffix(".tmp")
+        tmp_path.write_text(json.dumps(checkpoint), encoding="utf-8")
+        os.replace(tmp_path, checkpoint_path)
+    
+    
+    @contextmanager
+    def encoder_pool(self) -> Iterator[None]:
+        """Keep one EncoderPool for everything encoded inside the block, e.g. a whole ingest."""
+        if self.encode_workers <= 1 or self._encoder_pool is not None:
+            yield
+            return
+        with EncoderPool(
+            self.encoder.model_name, self.encode_workers, self.encode_batch_size, backend=self.encoder.backend
+        ) as pool:
+            self._encoder_pool = pool
+            try:
+                yield
+            finally:
+                self._encoder_pool = None
+    
+    
+    def _encode_corpus(self, texts: List[str]) -> np.ndarray:
+        
+        def encode(batch: List[str]) -> np.ndarray:
+            if self.encode_workers > 1 and len(batch) > self.encode_batch_size:
+                if self._encoder_pool is not None:
+                    return self._encoder_pool.encode(batch)
+                return encode_parallel(
+                    batch,
+                    self.encoder.model_name,
+                    self.encode_workers,
+                    self.encode_batch_size,
+                    backend=self.encoder.backend
+                )
+            # No progress bar for small API writes
+            return self.encoder.encode(
+                batch, batch_size=self.encode_batch_size, show_progress_bar=len(batch) > self.encode_batch_size
+            )
+        
+        if self.embedding_store is None:
+            return encode(texts)
+        return self.embedding_store.get_or_encode(texts, encode)
+    
+    
+    def _get_existing_metadatas(self) -> Dict[str, Dict]:
+        
+        existing: Dict[str, Dict] = {}
+        offset = 0
+        while True:
+            page = self.collection.get(include=["metadatas"], limit=WRITE_BATCH_SIZE, offset=offset)
+            if not page["ids"]:
+                break
+            existing.update(zip(page["ids"], page["metadatas"]))
+            offset += len(page["ids"])
+        return existing
+    
+    
+    def _get_metadatas_by_id(self, ids: List[str]) -> Dict[str, Dict]:
+        
+        existing: Dict[str, Dict] = {}
+        for i in range(0, len(ids), WRITE_BATCH_SIZE):
+            page = self.collection.get(ids=ids[i:i + WRITE_BATCH_SIZE], include=["metadatas"])
+            existing.update(zip(page["ids"], page["metadatas"]))
+        return existing
+    
+    
+    @staticmethod
+    def _make_id(question: str) -> str:
+        # Deterministic, so the same question keeps its id across reloads
+        return hashlib.sha1(normalize_query(question).encode("utf-8")).hexdigest()
+    
+    
+    @staticmethod
+    def _content_hash(question: str, answer: str, category: str = "") -> str:
+        # Rows without a category keep the hash they had before categories were stored
+        text = f"{question}\x1f{answer}" + (f"\x1f{category}" if category else "")
+        return hashlib.sha1(text.encode("utf-8")).hexdigest()
+    
+    
+    def _build_metadata(
+        self,
+        question: str,
+        answer: str,
+        language: Optional[str] = None,
+        category: str = ""
+    ) -> Dict:
+        
+        metadata = {
+            "question": question,
+            "language": language or detect_language(question),
+            "length": len(answer),
+            "content_hash": self._content_hash(question, answer, category)
+        }
+        if category:
+            metadata["category"] = category
+        return metadata
+    
+    
+    def _partition_name(self, field: str, value: str) -> str:
+        # Chroma names allow [a-zA-Z0-9._-] only; the digest keeps slugs that collide apart
+        slug = re.sub(r"[^a-z0-9]+", "-", value.lower()).strip("-")[:32]
+        digest = hashlib.sha1(f"{field}={value}".encode("utf-8")).hexdigest()[:8]
+        return "-".join(part for part in (PARTITION_PREFIX + field, slug, digest) if part)
+    
+    
+    def _partition_collection(self, field: str, value: str, create: bool = True):
+        
+        key = (field, value)
+        collection = self.partitions.get(key)
+        if collection is None:
+            name = self._partition_name(field, value)
+            if create:
+                collection = self.chroma_client.get_or_create_collection(
+                    name=name,
+                    metadata={**self._collection_metadata(), "partition_field": field, "partition_value": value}
+                )
+            else:
+                try:
+                    collection = self.chroma_client.get_collection(name=name)
+                except Exception:
+                    return None
+            self.partitions[key] = collection
+        return collection
+    
+    
+    def _partition_keys(self, metadata: Dict) -> List[Tuple[str, str]]:
+        
+        return [(field, metadata[field]) for field in self.partition_by if metadata.get(field)]
+    
+    
+    def _write_partitions(
+        self,
+        ids: List[str],
+        embeddings: List,
+        documents: List[str],
+        metadatas: List[Dict],
+        previous: Dict[str, Dict]
+    ) -> None:
+        """Mirror an upsert into the partitions, moving rows whose language/category changed."""
+        if not self.partition_by:
+            return
+        
+        groups: Dict[Tuple[str, str], List[int]] = {}
+        moved: Dict[Tuple[str, str], List[str]] = {}
+        for i, (item_id, metadata) in enumerate(zip(ids, metadatas)):
+            keys = self._partition_keys(metadata)
+            for key in keys:
+                groups.setdefault(key, []).append(i)
+            for key in self._partition_keys(previous.get(item_id) or {}):
+                if key not in keys:
+                    moved.setdefault(key, []).append(item_id)
+        
+        for key, item_ids in moved.items():
+            self._partition_collection(*key).delete(ids=item_ids)
+        for key, rows in groups.items():
+            self._partition_collection(*key).upsert(
+                embeddings=[embeddings[i] for i in rows],
+                documents=[documents[i] for i in rows],
+                metadatas=[metadatas[i] for i in rows],
+                ids=[ids[i] for i in rows]
+            )
+    
+    
+    def _delete_from_partitions(self, metadatas: Dict[str, Dict]) -> None:
+        
+        if not self.partition_by:
+            return
+        
+        groups: Dict[Tuple[str, str], List[str]] = {}
+        for item_id, metadata in metadatas.items():
+            for key in self._partition_keys(metadata):
+                groups.setdefault(key, []).append(item_id)
+        for key, item_ids in groups.items():
+            for i in range(0, len(item_ids), WRITE_BATCH_SIZE):
+                self._partition_collection(*key).delete(ids=item_ids[i:i + WRITE_BATCH_SIZE])
+    
+    
+    def _drop_partitions(self) -> None:
+        
+        for collection in self.chroma_client.list_collections():
+            name = getattr(collection, "name", collection)
+            if name.startswith(PARTITION_PREFIX):
+                self.chroma_client.delete_collection(name=name)
+        self.partitions.clear()
+    
+    
+    def rebuild_partitions(self) -> None:
+        """Re-create every partition from the main collection; stored embeddings are copied, nothing is re-encoded."""
+        self._drop_partitions()
+        offset = 0
+        while True:
+            page = self.collection.get(
+                include=["embeddings", "documents", "metadatas"], limit=WRITE_BATCH_SIZE, offset=offset
+            )
+            if not page["ids"]:
+                break
+            self._write_partitions(page["ids"], page["embeddings"], page["documents"], page["metadatas"], {})
+            offset += len(page["ids"])
+        
+        print(f" Built {len(self.partitions)} partitions by {', '.join(self.partition_by)}")
+    
+    
+    def _sync_partition_layout(self, partition_by: Optional[Sequence[str]]) -> None:
+        # partitions.json records what the existing partitions were built for
+        state_path = Path(self.persist_directory) / "partitions.json"
+        try:
+            stored = json.loads(state_path.read_text(encoding="utf-8"))
+        except (FileNotFoundError, ValueError):
+            stored = None
+        if partition_by is None:
+            partition_by = (stored or {}).get("partition_by", ())
+        self.partition_by = tuple(partition_by)
+        
+        wanted = {
+            "partition_by": list(self.partition_by),
+            "schema_version": SCHEMA_VERSION,
+            "model_name": self.encoder.name
+        }
+        if stored == wanted:
+            return
+        
+        if self.partition_by:
+            self.rebuild_partitions()
+            state_path.write_text(json.dumps(wanted), encoding="utf-8")
+        else:
+            self._drop_partitions()
+            state_path.unlink(missing_ok=True)
+    
+    
+    def _encode_queries(self, texts: List[str]) -> np.ndarray:
+        
+        keys = [normalize_query(text) for text in texts]
+        embeddings: List[Optional[np.ndarray]] = [self.query_cache.get(key) for key in keys]
+        
+        # All cache misses go to the model together, in a single batch
+        missing = [i for i, embedding in enumerate(embeddings) if embedding is None]
+        if missing:
+            missing_keys = list(dict.fromkeys(keys[i] for i in missing))
+            with metrics.stage("encode"):
+                encoded = self.encoder.encode(missing_keys)
+            by_key = dict(zip(missing_keys, encoded))
+            for i in missing:
+                embeddings[i] = by_key[keys[i]]
+            for key, embedding in by_key.items():
+                self.query_cache.put(key, embedding)
+        
+        return np.vstack(embeddings)
+    
+    
+    def _encode_query(self, text: str) -> np.ndarray:
+        
+        return self._encode_queries([text])[0]
+    
+    
+    def embed_question(self, question: str) -> np.ndarray:
+        # Goes through the query cache, so it's free right after a search for the same question
+        return self._encode_query(question)
+    
+    
+    def _embed_search_queries(self, search_queries: List[SearchQuery]) -> np.ndarray:
+        # Strings and context queries are encoded (one batch for all of them), vectors are used as-is
+        texts = [q.text if isinstance(q, ContextQuery) else q for q in search_queries if not isinstance(q, np.ndarray)]
+        encoded = iter(self._encode_queries(texts)) if texts else iter(())
+        vectors = []
+        for q in search_queries:
+            if isinstance(q, ContextQuery):
+                vectors.append(blend_context(next(encoded), q.context_vector, self.context_weight))
+            else:
+                vectors.append(q if isinstance(q, np.ndarray) else next(encoded))
+        return np.vstack(vectors)
+    
+    
+    def clear_query_cache(self) -> None:
+        # Must be called whenever self.encoder is swapped, cached vectors belong to the old model
+        self.query_cache.clear()
+    
+    
+    def _build_search_query(self, query: str, context: str = "") -> str:
+        
+        if context:
+            return f"{query} [السياق: {context[-200:]}]"
+        return query
+    
+    
+    def _format_results(self, results: Dict, row: int) -> List[Dict]:
         
-      
         formatted_results = []
-        if results['ids'] and len(results['ids'][0]) > 0:
-            for i in range(len(results['ids'][0])):
-                distance = results['distances'][0][i] if 'distances' in results else 0
+        if results['ids'] and len(results['ids'][row]) > 0:
+            for i in range(len(results['ids'][row])):
+                distance = results['distances'][row][i] if 'distances' in results else 0
                 
                 similarity = 1 - distance
                 
                 formatted_results.append({
-                    "question": results['metadatas'][0][i].get('question', ''),
-                    "answer": results['documents'][0][i],
+                    "question": results['metadatas'][row][i].get('question', ''),
+                    "answer": results['documents'][row][i],
                     "confidence": float(similarity),
-                    "metadata": results['metadatas'][0][i],
-                    "id": results['ids'][0][i],
+                    "metadata": results['metadatas'][row][i],
+                    "id": results['ids'][row][i],
                     "source": "local" if similarity >= self.min_confidence else "local_low"
                 })
         
         return formatted_results
     
     
+    def _run_search_batch(
+        self,
+        search_queries: List[SearchQuery],
+        top_k: int = 5,
+        where_clause: Optional[Dict] = None,
+        collection=None
+    ) -> List[List[Dict]]:
+        
+        query_embeddings = self._embed_search_queries(search_queries)
+        
+        with metrics.stage("vector_query"):
+            results = (collection or self.collection).query(
+                query_embeddings=query_embeddings.tolist(),
+                n_results=top_k,
+                where=where_clause
+            )
+        
+        return [self._format_results(results, row) for row in range(len(search_queries))]
+    
+    
+    def _search_many(
+        self,
+        search_queries: List[SearchQuery],
+        top_k: int = 5,
+        where_clause: Optional[Dict] = None,
+        collection=None
+    ) -> List[List[Dict]]:
+        
+        # Filtered searches can't share a collection.query with other requests
+        if self.batcher is not None and where_clause is None and collection is None:
+            return self.batcher.submit(search_queries, top_k)
+        return self._run_search_batch(search_queries, top_k=top_k, where_clause=where_clause, collection=collection)
+    
+    
+    def enable_batching(self, window_ms: float = 3.0, max_batch_size: int = 32) -> None:
+        
+        self.disable_batching()
+        self.batcher = RequestBatcher(
+            self._run_search_batch,
+            window_ms=window_ms,
+            max_batch_size=max_batch_size
+        )
+    
+    
+    def disable_batching(self) -> None:
+        
+        if self.batcher is not None:
+            self.batcher.stop()
+            self.batcher = None
+    
+    
+    def search(
+        self,
+        query: str,
+        top_k: int = 5,
+        context: str = "",
+        language_filter: Optional[str] = None,
+        category_filter: Optional[str] = None,
+        mode: Optional[str] = None
+    ) -> List[Dict]:
+        """`mode` overrides the engine's search_mode for this call; lexical matching ignores `context`."""
+        mode = mode or self.search_mode
+        filters = {field: value for field, value in (("language", language_filter), ("category", category_filter)) if value}
+        
+        if mode == "lexical":
+            return self._lexical_search(query, top_k, filters)
+        lexical_filters = dict(filters)
+        
+        collection = None
+        for field in self.partition_by:
+            if field in filters:
+                # The partition holds exactly the rows matching this filter
+                collection = self._partition_collection(field, filters.pop(field), create=False)
+                if collection is None:
+                    return []
+                break
+        
+        where_clause = None
+        if len(filters) == 1:
+            where_clause = filters
+        elif filters:
+            where_clause = {"$and": [{field: value} for field, value in filters.items()]}
+        
+        search_query = self._build_search_query(query, context)
+        if mode == "hybrid":
+            query_vector = self._encode_query(search_query)
+            results = self._search_many([query_vector], top_k=top_k, where_clause=where_clause, collection=collection)[0]
+            return self._fuse(query, query_vector, results, top_k, lexical_filters)
+        return self._search_many([search_query], top_k=top_k, where_clause=where_clause, collection=collection)[0]
+    
+    
+    def _lexical_accept(self, filters: Dict[str, str]):
+        
+        if not filters:
+            return None
+        
+        def accept(item_id: str) -> bool:
+            metadata = self.lexical_index.payload(item_id)["metadata"]
+            return all(metadata.get(field) == value for field, value in filters.items())
+        
+        return accept
+    
+    
+    def _lexical_result(self, item_id: str, confidence: float) -> Optional[Dict]:
+        # None when a concurrent write removed the row after the search found it
+        payload = self.lexical_index.payload(item_id)
+        if payload is None:
+            return None
+        return {
+            **payload,
+            "confidence": confidence,
+            "source": "local" if confidence >= self.min_confidence else "local_low"
+        }
+    
+    
+    def _lexical_search(self, query: str, top_k: int = 5, filters: Optional[Dict[str, str]] = None) -> List[Dict]:
+        
+        with metrics.stage("lexical_query"):
+            matches = self.lexical_index.search(query, top_k=top_k, accept=self._lexical_accept(filters or {}))
+        results = (self._lexical_result(item_id, score) for item_id, score in matches)
+        return [result for result in results if result is not None]
+    
+    
+    def _dense_scores(self, query_vector: np.ndarray, ids: List[str]) -> Dict[str, float]:
+        # Cosine similarity against the stored embeddings, same scale as a collection.query
+        with metrics.stage("vector_query"):
+            page = self.collection.get(ids=ids, include=["embeddings"])
+        if not page["ids"]:
+            return {}
+        similarities = normalize_rows(np.asarray(page["embeddings"])) @ normalize_rows(query_vector)[0]
+        return dict(zip(page["ids"], similarities.tolist()))
+    
+    
+    def _fuse(
+        self,
+        question: str,
+        query_vector: np.ndarray,
+        dense_results: List[Dict],
+        top_k: int,
+        filters: Optional[Dict[str, str]] = None
+    ) -> List[Dict]:
+        """
+        Merge dense results with the BM25 matches for `question`. Every
+        candidate gets both scores (missing ones are computed directly) and
+        confidence = 1 - (1 - dense) * (1 - lexical_weight * lexical): keyword
+        overlap only ever raises the dense score, so thresholds keep working.
+        """
+        candidates = {result["id"]: result for result in dense_results}
+        with metrics.stage("lexical_query"):
+            lexical = dict(self.lexical_index.search(question, top_k=top_k, accept=self._lexical_accept(filters or {})))
+            lexical.update(self.lexical_index.score(question, [item_id for item_id in candidates if item_id not in lexical]))
+        
+        missing = [item_id for item_id in lexical if item_id not in candidates]
+        if missing:
+            for item_id, similarity in self._dense_scores(query_vector, missing).items():
+                result = self._lexical_result(item_id, similarity)
+                if result is not None:
+                    candidates[item_id] = result
+        
+        fused = []
+        for item_id, result in candidates.items():
+            dense, keyword = result["confidence"], lexical.get(item_id, 0.0)
+            confidence = 1 - (1 - dense) * (1 - self.lexical_weight * keyword)
+            fused.append({
+                **result,
+                "confidence": confidence,
+                "scores": {"dense": dense, "lexical": keyword},
+                "source": "local" if confidence >= self.min_confidence else "local_low"
+            })
+        fused.sort(key=lambda result: result["confidence"], reverse=True)
+        return fused[:top_k]
+    
+    
     def find_answer(
         self,
         user_question: str,
         min_confidence: Optional[float] = None,
-        context: str = ""
+        context: str = "",
+        context_vector: Optional[np.ndarray] = None
     ) -> Dict:
    
         if min_confidence is None:
             min_confidence = self.min_confidence
         
+        exact = self._exact_match(user_question)
+        if exact is not None:
+            # The stored row stands in for the question's own vector: same normalized text, no encode, no Chroma read
+            return {
+                "question": exact["question"],
+                "answer": exact["answer"],
+                "confidence": 1.0,
+                "source": "local",
+                "match": "exact",
+                "metadata": exact["metadata"],
+                "top_matches": [exact],
+                "query_vector": self._exact_vectors.get(exact["id"])
+            }
+        
         
-        results = self.search(user_question, top_k=5, context=context)
+        query_vector = None
+        if self.search_mode == "lexical":
+            # Keyword match on the question alone: no encode, no vector query
+            results = self._lexical_search(user_question, top_k=5)
+            results_no_context = []
+        elif context_vector is not None:
+            # Only the (short, cacheable) question is encoded, inside the
+            # batched search; the session context is blended in there
+            results, results_no_context = self._search_many(
+                [ContextQuery(user_question, context_vector), user_question], top_k=5
+            )
+            results_no_context = results_no_context[:3]
+            query_vector = self._encode_query(user_question)
+            if self.search_mode == "hybrid":
+                blended = blend_context(query_vector, context_vector, self.context_weight)
+                results = self._fuse(user_question, blended, results, top_k=5)
+                results_no_context = self._fuse(user_question, query_vector, results_no_context, top_k=3)
+        elif context:
+            # Both variants share one encode and one collection.query, so the
+            # no-context fallback below costs nothing extra
+            search_query = self._build_search_query(user_question, context)
+            results, results_no_context = self._search_many([search_query, user_question], top_k=5)
+            results_no_context = results_no_context[:3]
+            query_vector = self._encode_query(user_question)
+            if self.search_mode == "hybrid":
+                results = self._fuse(user_question, self._encode_query(search_query), results, top_k=5)
+                results_no_context = self._fuse(user_question, query_vector, results_no_context, top_k=3)
+        else:
+            results = self.search(user_question, top_k=5)
+            results_no_context = []
+            query_vector = self._encode_query(user_question)
         
+        # query_vector: the question's embedding, a query-cache hit after the
+        # search; callers fold it into the session context without re-encoding
         if not results:
             return {
                 "question": None,
                 "answer": None,
                 "confidence": 0.0,
                 "source": "none",
-                "top_matches": []
+                "top_matches": [],
+                "query_vector": query_vector
             }
         
         best = results[0]
         confidence = best["confidence"]
         
       
-        if context and confidence < min_confidence:
-            results_no_context = self.search(user_question, top_k=3, context="")
-            if results_no_context and results_no_context[0]["confidence"] > confidence:
+        if results_no_context and confidence < min_confidence:
+            if results_no_context[0]["confidence"] > confidence:
                 best = results_no_context[0]
                 confidence = best["confidence"]
                 results = results_no_context
@@ -194,7 +1086,8 @@ class QAEngineRag:
                 "answer": None,
                 "confidence": confidence,
                 "source": "none",
-                "top_matches": results
+                "top_matches": results,
+                "query_vector": query_vector
             }
         
         return {
@@ -203,7 +1096,8 @@ class QAEngineRag:
             "confidence": confidence,
             "source": "local",
             "metadata": best.get("metadata", {}),
-            "top_matches": results
+            "top_matches": results,
+            "query_vector": query_vector
         }
     
     
@@ -214,31 +1108,57 @@ class QAEngineRag:
         metadata: Optional[Dict] = None
     ) -> str:
       
+        item_id = self.add_qa_pairs([(question, answer, metadata)])[0]
+        print(f"Added new Q&A pair {item_id}")
+        return item_id
+    
+    
+    def add_qa_pairs(self, pairs: List[Tuple[str, str, Optional[Dict]]]) -> List[str]:
+        """
+        Upsert many (question, answer, metadata) pairs: questions are encoded
+        in batches of encode_batch_size and written in chunks of
+        WRITE_BATCH_SIZE. Returns the id of every pair; when a question
+        repeats within the batch its last pair wins.
+        """
+        ids = [self._make_id(question) for question, _, _ in pairs]
+        rows = list({item_id: i for i, item_id in enumerate(ids)}.values())
+        if not rows:
+            return ids
         
-        embedding = self.model.encode([question], convert_to_tensor=False)
-        
-       
-        item_metadata = {
-            "question": question,
-            "language": self._detect_language(question),
-            "length": len(answer)
-        }
-        if metadata:
-            item_metadata.update(metadata)
-        
-        
-        item_id = str(uuid.uuid4())
+        questions = [pairs[i][0] for i in rows]
+        embeddings = self._encode_corpus(questions)
         
+        metadatas = []
+        for i, language in zip(rows, detect_languages(pd.Series(questions))):
+            question, answer, metadata = pairs[i]
+            item_metadata = self._build_metadata(question, answer, str(language), (metadata or {}).get("category", ""))
+            if metadata:
+                item_metadata.update(metadata)
+            metadatas.append(item_metadata)
         
-        self.collection.add(
-            embeddings=embedding.tolist(),
-            documents=[answer],
-            metadatas=[item_metadata],
-            ids=[item_id]
-        )
+        row_ids = [ids[i] for i in rows]
+        documents = [pairs[i][1] for i in rows]
+        previous = self._get_metadatas_by_id(row_ids) if self.partition_by else {}
+        for start in range(0, len(rows), WRITE_BATCH_SIZE):
+            end = start + WRITE_BATCH_SIZE
+            batch_embeddings = embeddings[start:end].tolist()
+            self.collection.upsert(
+                embeddings=batch_embeddings,
+                documents=documents[start:end],
+                metadatas=metadatas[start:end],
+                ids=row_ids[start:end]
+            )
+            self._write_partitions(row_ids[start:end], batch_embeddings, documents[start:end], metadatas[start:end], previous)
         
-        print(f"Added new Q&A pair. Total: {self.collection.count()}")
-        return item_id
+        for item_id, answer, item_metadata, embedding in zip(row_ids, documents, metadatas, embeddings):
+            self._index_exact(item_id, answer, item_metadata, embedding)
+        self.generation += 1
+        return ids
+    
+    
+    def count(self) -> int:
+        """Rows stored, from the exact index kept in step with every write (no Chroma count())."""
+        return len(self._exact_keys)
     
     
     def get_stats(self) -> Dict:
@@ -246,27 +1166,80 @@ class QAEngineRag:
         return {
             "total_items": self.collection.count(),
             "collection_name": self.collection.name,
-            "metadata": self.collection.metadata
+            "metadata": self.collection.metadata,
+            "model_name": self.encoder.name,
+            "query_cache": self.query_cache.stats(),
+            "batcher": self.batcher.stats() if self.batcher is not None else None,
+            "embedding_store": self.embedding_store.stats() if self.embedding_store is not None else None,
+            "persist_directory": self.persist_directory,
+            "exact_index_size": len(self.exact_index),
+            "search_mode": self.search_mode,
+            "lexical_index": self.lexical_index.stats(),
+            "generation": self.generation,
+            "partitions": {f"{field}={value}": collection.count() for (field, value), collection in self.partitions.items()},
+            "startup": self.startup_timings
         }
     
     
     def delete_by_id(self, item_id: str) -> None:
        
+        previous = self._get_metadatas_by_id([item_id]) if self.partition_by else {}
         self.collection.delete(ids=[item_id])
+        self._delete_from_partitions(previous)
+        self._unindex_exact(item_id)
+        self.generation += 1
         print(f"🗑️ Deleted item {item_id}")
 
 
-def build_rag(csv_path: Optional[Path] = None, reload: bool = False) -> QAEngineRag:
- 
-    base_dir = Path(__file__).resolve().parent.parent
+def build_rag(
+    csv_path: Optional[Path] = None,
+    reload: bool = False,
+    full_rebuild: bool = False,
+    chunk_size: Optional[int] = None,
+    encode_workers: int = 1,
+    encode_batch_size: int = 64,
+    backend: str = "fp32",
+    partition_by: Optional[Sequence[str]] = None,
+    search_mode: str = "dense",
+    state_dir: Optional[Path] = None
+) -> QAEngineRag:
+    """
+    `reload` syncs the collection with the CSV incrementally, `full_rebuild`
+    drops the collection and re-embeds every row. With `chunk_size` the CSV
+    is streamed in resumable chunks instead of being read at once.
+    `encode_workers` > 1 fans bulk encoding out to that many processes, and
+    `backend` picks the encoder implementation (see encoders.build_encoder).
+    `partition_by` (e.g. ("language", "category")) keeps a sub-collection per
+    value so filtered searches query a smaller index; None keeps the store's
+    current layout and () drops it.
+    `search_mode` is "dense", "hybrid" (dense + BM25) or "lexical" (BM25 only).
+    `state_dir` holds chroma_db/ and embedding_cache/ (default: paths.state_dir()).
+    """
     if csv_path is None:
-        csv_path = base_dir / "data" / "knowledge_base.csv"
+        csv_path = paths.kb_csv_path()
+    state_dir = Path(state_dir) if state_dir is not None else paths.state_dir()
     
-    engine = QAEngineRag(min_confidence=0.75)
+    engine = QAEngineRag(
+        min_confidence=0.75,
+        persist_directory=state_dir / "chroma_db",
+        embedding_cache_dir=state_dir / "embedding_cache",
+        encode_workers=encode_workers,
+        encode_batch_size=encode_batch_size,
+        backend=backend,
+        partition_by=partition_by,
+        search_mode=search_mode
+    )
     
  
-    if engine.collection.count() == 0 or reload:
-        engine.load_from_csv(csv_path, clear_existing=reload)
+    if engine.collection.count() == 0 or reload or full_rebuild:
+        started = time.perf_counter()
+        if chunk_size:
+            engine.stream_from_csv(csv_path, chunk_size=chunk_size, clear_existing=full_rebuild, prune=True)
+        else:
+            engine.load_from_csv(csv_path, clear_existing=full_rebuild)
+        engine.startup_timings["index_build_s"] = time.perf_counter() - started
+    
+    engine.warm_up()
     
     return engine
 
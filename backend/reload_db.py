@@ -1,16 +1,47 @@
-from rag_engine import build_rag
-from pathlib import Path
+import argparse
+import os
+from encoders import BACKENDS
+from rag_engine import PARTITION_FIELDS, build_rag, parse_partitions
+import paths
 
-print(" إعادة تحميل ChromaDB...\n")
 
-base_dir = Path(__file__).resolve().parent.parent
-csv_path = base_dir / "data" / "knowledge_base.csv"
+def main():
+    parser = argparse.ArgumentParser(description="Sync ChromaDB with knowledge_base.csv")
+    parser.add_argument("--full", action="store_true", help="drop the collection and re-embed every row")
+    parser.add_argument("--chunk-size", type=int, default=None, help="stream the CSV in resumable chunks of this many rows")
+    parser.add_argument("--workers", type=int, default=1, help="number of encoder processes")
+    parser.add_argument("--batch-size", type=int, default=64, help="texts per encoder batch")
+    parser.add_argument("--backend", choices=BACKENDS, default="fp32", help="encoder implementation")
+    parser.add_argument(
+        "--partitions",
+        default=os.environ.get("CORTEX_PARTITIONS"),
+        help=f"comma-separated subset of {','.join(PARTITION_FIELDS)} to keep sub-collections for, "
+             "'' for none (default: CORTEX_PARTITIONS, else the store's current layout)"
+    )
+    args = parser.parse_args()
 
+    print(" إعادة تحميل ChromaDB...\n")
 
-engine = build_rag(csv_path=csv_path, reload=True)
+    # Same CSV and store as the server (CORTEX_KB_CSV / CORTEX_STATE_DIR)
+    engine = build_rag(
+        csv_path=paths.kb_csv_path(),
+        state_dir=paths.state_dir(),
+        reload=True,
+        full_rebuild=args.full,
+        chunk_size=args.chunk_size,
+        encode_workers=args.workers,
+        encode_batch_size=args.batch_size,
+        backend=args.backend,
+        partition_by=parse_partitions(args.partitions),
+    )
 
-print(f"\n dawnload !")
-stats = engine.get_stats()
-print(f" total quetion {stats['total_items']}")
-print(f" nom de groupe  {stats['collection_name']}")
-print(f" ready to use!")
+    print(f"\n dawnload !")
+    stats = engine.get_stats()
+    print(f" total quetion {stats['total_items']}")
+    print(f" nom de groupe  {stats['collection_name']}")
+    print(f" ready to use!")
+
+
+# Guard needed: encoder worker processes are spawned and re-import this module
+if __name__ == "__main__":
+    main()
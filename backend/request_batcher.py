@@ -0,0 +1,138 @@
+import queue
+import threading
+import time
+from typing import Callable, Dict, List, Optional
+
+from latency import SampleWindow
+
+
+class _PendingRequest:
+    __slots__ = ("search_queries", "top_k", "enqueued_at", "event", "result", "error")
+
+    def __init__(self, search_queries: List[str], top_k: int):
+        self.search_queries = search_queries
+        self.top_k = top_k
+        self.enqueued_at = time.monotonic()
+        self.event = threading.Event()
+        self.result: Optional[List[List[Dict]]] = None
+        self.error: Optional[BaseException] = None
+
+
+class RequestBatcher:
+    """
+    Groups search requests from concurrent threads into one handler call.
+
+    The first request of a batch opens a window of `window_ms`; everything that
+    arrives before it closes (up to `max_batch_size` queries) is sent to
+    `handler(search_queries, top_k)` together, which must return one result
+    list per query.
+    """
+
+    def __init__(
+        self,
+        handler: Callable[[List[str], int], List[List[Dict]]],
+        window_ms: float = 3.0,
+        max_batch_size: int = 32,
+        metrics_window: int = 1000
+    ):
+        self.handler = handler
+        self.window = window_ms / 1000.0
+        self.window_ms = window_ms
+        self.max_batch_size = max_batch_size
+
+        self._queue: "queue.Queue[Optional[_PendingRequest]]" = queue.Queue()
+        self._lock = threading.Lock()
+        self._batch_sizes = SampleWindow(metrics_window)
+        self._wait_times_ms = SampleWindow(metrics_window)
+        self.total_batches = 0
+        self.total_requests = 0
+        self.total_queries = 0
+        self.failed_batches = 0
+
+        self._thread = threading.Thread(target=self._run, name="request-batcher", daemon=True)
+        self._thread.start()
+
+    def submit(self, search_queries: List[str], top_k: int) -> List[List[Dict]]:
+        pending = _PendingRequest(search_queries, top_k)
+        self._queue.put(pending)
+        pending.event.wait()
+
+        if pending.error is not None:
+            raise pending.error
+        return pending.result
+
+    def stop(self) -> None:
+        self._queue.put(None)
+        self._thread.join()
+
+    def _run(self) -> None:
+        while True:
+            first = self._queue.get()
+            if first is None:
+                return
+
+            batch = [first]
+            size = len(first.search_queries)
+            deadline = first.enqueued_at + self.window
+            stopping = False
+
+            while size < self.max_batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if item is None:
+                    stopping = True
+                    break
+                batch.append(item)
+                size += len(item.search_queries)
+
+            self._process(batch)
+            if stopping:
+                return
+
+    def _process(self, batch: List[_PendingRequest]) -> None:
+        started = time.monotonic()
+        search_queries = [q for item in batch for q in item.search_queries]
+        top_k = max(item.top_k for item in batch)
+
+        try:
+            results = self.handler(search_queries, top_k)
+        except Exception as e:
+            for item in batch:
+                item.error = e
+            with self._lock:
+                self.failed_batches += 1
+        else:
+            offset = 0
+            for item in batch:
+                count = len(item.search_queries)
+                item.result = [rows[:item.top_k] for rows in results[offset:offset + count]]
+                offset += count
+
+        with self._lock:
+            self.total_batches += 1
+            self.total_requests += len(batch)
+            self.total_queries += len(search_queries)
+            self._batch_sizes.add(len(search_queries))
+            self._wait_times_ms.extend((started - item.enqueued_at) * 1000 for item in batch)
+
+        for item in batch:
+            item.event.set()
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                "window_ms": self.window_ms,
+                "max_batch_size": self.max_batch_size,
+                "total_batches": self.total_batches,
+                "total_requests": self.total_requests,
+                "total_queries": self.total_queries,
+                "failed_batches": self.failed_batches,
+                "batch_size": self._batch_sizes.summary(),
+                "wait_ms": self._wait_times_ms.summary(),
+            }
+
@@ -0,0 +1,603 @@
+"""
+Everything behind the HTTP routes: the engine, sessions, caches and web
+fallback, plus the request handling both front ends share. app.py serves
+it with Flask (threads), asgi.py with Quart (event loop).
+
+Handlers return (body, status) so each front end only has to serialize.
+"""
+from rag_engine import build_rag, parse_partitions
+from qa_engine import build_qa_engine
+from conversation_manager import ConversationManager
+from csv_log import CsvAppendLog
+from latency import SampleWindow
+from lru_cache import LRUCache, normalize_query
+import paths
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+import hashlib
+import json
+import logging
+import os
+import time
+import log_queue
+import metrics
+import numpy as np
+from text_normalization import detect_language
+from web_search import CircuitBreaker, WebSearcher, build_provider
+from datetime import datetime
+
+# Per-request lines are DEBUG; CORTEX_LOG_DEBUG_SAMPLE=0.01 keeps about 1% of them
+log_queue.configure_logging(
+    level=getattr(logging, os.environ.get("CORTEX_LOG_LEVEL", "INFO").upper()),
+    debug_sample_rate=float(os.environ.get("CORTEX_LOG_DEBUG_SAMPLE", "0")),
+)
+logger = logging.getLogger(__name__)
+
+csv_path = paths.kb_csv_path()
+# Index, embedding cache, snapshots and the session db live under here
+state_dir = paths.state_dir()
+
+VERSION = "2.0"
+ENDPOINTS = ["/ask", "/add", "/add/batch", "/stats", "/metrics", "/session/new", "/session/clear", "/session/info", "/cache/clear"]
+
+
+# "memory" serves the in-memory QAEngine (snapshot-backed, no Chroma) instead
+ENGINE_KIND = os.environ.get("CORTEX_ENGINE", "rag")
+
+if ENGINE_KIND == "memory":
+    ENGINE_NAME = "In-memory"
+    logger.info(" Initializing in-memory QA Engine...")
+    engine = build_qa_engine(
+        backend=os.environ.get("CORTEX_ENCODER_BACKEND", "fp32"),
+        csv_path=csv_path,
+        state_dir=state_dir,
+    )
+else:
+    ENGINE_NAME = "ChromaDB"
+    logger.info(" Initializing RAG Engine with ChromaDB...")
+    engine = build_rag(
+        csv_path=csv_path,
+        reload=False,
+        backend=os.environ.get("CORTEX_ENCODER_BACKEND", "fp32"),
+        # e.g. "language,category": per-value sub-collections for filtered searches;
+        # unset keeps the layout the store was built with, "" drops it
+        partition_by=parse_partitions(os.environ.get("CORTEX_PARTITIONS")),
+        # "hybrid" adds BM25 keyword scores, "lexical" skips the encoder entirely
+        search_mode=os.environ.get("CORTEX_SEARCH_MODE", "dense"),
+        state_dir=state_dir,
+    )
+logger.info(f" {ENGINE_NAME} engine loaded with {engine.get_stats()['total_items']} items")
+logger.info(" Startup: " + ", ".join(f"{name}={seconds:.2f}s" for name, seconds in engine.startup_timings.items()))
+
+if ENGINE_KIND != "memory" and os.environ.get("CORTEX_BATCHING", "1") == "1":
+    engine.enable_batching(
+        window_ms=float(os.environ.get("CORTEX_BATCH_WINDOW_MS", "3")),
+        max_batch_size=int(os.environ.get("CORTEX_BATCH_MAX_SIZE", "32")),
+    )
+    logger.info(f" Request batching enabled ({engine.batcher.window_ms} ms window, up to {engine.batcher.max_batch_size} queries)")
+
+conversation_manager = ConversationManager(
+    max_history=5,
+    session_timeout_minutes=30,
+    max_sessions=int(os.environ.get("CORTEX_MAX_SESSIONS", "10000")),
+    max_memory_bytes=int(os.environ.get("CORTEX_SESSION_MEMORY_MB", "64")) * 1024 * 1024,
+    # "sqlite" shares sessions between worker processes
+    backend=os.environ.get("CORTEX_SESSION_STORE", "memory"),
+    db_path=os.environ.get("CORTEX_SESSION_DB", str(state_dir / "sessions" / "sessions.db")),
+)
+
+response_cache = LRUCache(
+    max_size=int(os.environ.get("CORTEX_RESPONSE_CACHE_SIZE", "4096")),
+    ttl_seconds=float(os.environ.get("CORTEX_RESPONSE_CACHE_TTL", "600")),
+)
+response_hit_latency = SampleWindow()
+response_miss_latency = SampleWindow()
+
+# CORTEX_WEB_PROVIDER=stub answers locally, for offline load tests
+web_searcher = WebSearcher(
+    build_provider(os.environ.get("CORTEX_WEB_PROVIDER", "duckduckgo")),
+    max_workers=int(os.environ.get("CORTEX_WEB_WORKERS", "4")),
+    timeout=float(os.environ.get("CORTEX_WEB_TIMEOUT", "3")),
+    cache_ttl=float(os.environ.get("CORTEX_WEB_CACHE_TTL", "3600")),
+    breaker=CircuitBreaker(
+        failure_threshold=int(os.environ.get("CORTEX_WEB_FAILURE_THRESHOLD", "5")),
+        reset_timeout=float(os.environ.get("CORTEX_WEB_COOLDOWN", "30")),
+    ),
+)
+logger.info(f" Web search provider: {web_searcher.provider.name} ({web_searcher.timeout}s deadline)")
+
+# Every gunicorn worker has its own indexes, caches and Chroma client: a
+# write in one worker never reaches the others, and Chroma's persistent
+# client isn't safe with several processes writing. Multi-worker servers are
+# therefore read-only (gunicorn.conf.py sets this); writes go through a
+# single-worker instance or reload_db.py, followed by a restart
+READ_ONLY = os.environ.get("CORTEX_READ_ONLY", "0") == "1"
+if READ_ONLY:
+    logger.info(" Read-only: /add and /add/batch are disabled")
+
+# API-added pairs are appended to the KB CSV in the background, so a later
+# reload_db.py (which drops rows missing from the CSV) keeps them
+csv_log = CsvAppendLog(csv_path) if os.environ.get("CORTEX_CSV_WRITE_BEHIND", "1") == "1" and not READ_ONLY else None
+
+# Larger /add/batch uploads are encoded and written this many pairs at a time
+ADD_BATCH_CHUNK = int(os.environ.get("CORTEX_ADD_BATCH_CHUNK", "1000"))
+ADD_BATCH_MAX = int(os.environ.get("CORTEX_ADD_BATCH_MAX", "100000"))
+ADD_BATCH_MAX_BYTES = int(os.environ.get("CORTEX_ADD_BATCH_MAX_MB", "256")) * 1024 * 1024
+METADATA_TYPES = (str, int, float, bool)
+NDJSON_TYPES = ("application/x-ndjson", "application/ndjson", "application/jsonl", "application/x-jsonlines")
+
+
+def search_web(query: str):
+    logger.debug("Searching web for: %s", query)
+    return web_searcher.search(query)
+
+
+def home_info() -> Dict:
+    return {
+        "message": "Cortex RAG API with ChromaDB & Conversation Memory",
+        "version": VERSION,
+        "engine": ENGINE_NAME,
+        "endpoints": ENDPOINTS,
+    }
+
+
+def handle_new_session() -> Tuple[Dict, int]:
+    try:
+        session_id = conversation_manager.create_session()
+        logger.info(f"Created new session: {session_id}")
+
+        return {
+            "session_id": session_id,
+            "message": "تم إنشاء جلسة محادثة جديدة",
+            "created_at": datetime.now().isoformat(),
+        }, 201
+
+    except Exception as e:
+        logger.error(f"Error creating session: {e}")
+        return {"error": str(e)}, 500
+
+
+def handle_clear_session(data: Optional[Dict]) -> Tuple[Dict, int]:
+    try:
+        session_id = data.get("session_id")
+
+        if not session_id:
+            return {"error": "session_id is required"}, 400
+
+        conversation_manager.clear_session(session_id)
+        logger.info(f"Cleared session: {session_id}")
+
+        return {
+            "message": "تم مسح المحادثة",
+            "session_id": session_id,
+        }, 200
+
+    except Exception as e:
+        logger.error(f"Error clearing session: {e}")
+        return {"error": str(e)}, 500
+
+
+def handle_session_info(session_id: Optional[str]) -> Tuple[Dict, int]:
+    try:
+        if not session_id:
+            return {"error": "session_id parameter is required"}, 400
+
+        info = conversation_manager.get_session_info(session_id)
+
+        if not info:
+            return {"error": "Session not found"}, 404
+
+        return info, 200
+
+    except Exception as e:
+        logger.error(f"Error getting session info: {e}")
+        return {"error": str(e)}, 500
+
+
+def _context_fingerprint(context_vector) -> str:
+    return hashlib.sha1(context_vector.tobytes()).hexdigest() if context_vector is not None else ""
+
+
+def lookup_answer(question: str, context_vector) -> Tuple[Dict, Optional[np.ndarray]]:
+    """The CPU-bound part of a question: encode plus vector search. Also returns the question's vector for the session."""
+    result = engine.find_answer(question, context_vector=context_vector)
+    embedding = result.pop("query_vector", None)
+    if embedding is None:
+        embedding = question_embedding(question)
+    metrics.LOOKUP_CONFIDENCE.inc(bucket=metrics.confidence_bucket(float(result["confidence"])))
+    logger.debug("Lookup for %r: %s", question, result)
+    return result, embedding
+
+
+def needs_web_search(result: Dict) -> bool:
+    return float(result["confidence"]) < engine.min_confidence
+
+
+def build_answer_payload(question: str, result: Dict, web_result: Optional[Dict]) -> Dict:
+
+    best_conf = float(result["confidence"])
+
+    top_matches = result.get("top_matches", [])
+
+    if best_conf < engine.min_confidence:
+        if web_result:
+            return {
+                "question": question,
+                "answer": web_result["answer"],
+                "confidence": 1.0,
+                "source": "web",
+                "url": web_result["source"],
+                "title": web_result["title"],
+                "top_matches": top_matches,
+                "engine": f"{ENGINE_NAME} + Web"
+            }
+        else:
+            fallback_answer = "عذرًا، لم أجد إجابة مناسبة في قاعدة البيانات أو على الويب. جرب إعادة صياغة السؤال أو اسأل عن موضوع آخر."
+
+            return {
+                "question": question,
+                "answer": fallback_answer,
+                "confidence": best_conf,
+                "source": "none",
+                "top_matches": top_matches,
+            }
+
+    return {
+        "question": result.get("question") or question,
+        "answer": result.get("answer"),
+        "confidence": best_conf,
+        "source": "local",
+        "metadata": result.get("metadata", {}),
+        "top_matches": top_matches,
+        "engine": ENGINE_NAME
+    }
+
+
+def answer_question(question: str, context_vector) -> Tuple[Dict, Optional[np.ndarray]]:
+    """Engine lookup plus web fallback; the result depends only on the question and context."""
+    result, embedding = lookup_answer(question, context_vector)
+    web_result = None
+    if needs_web_search(result):
+        logger.debug("Low confidence, trying web search...")
+        with metrics.stage("web_fallback"):
+            web_result = search_web(question)
+    return build_answer_payload(question, result, web_result), embedding
+
+
+def parse_ask(data: Optional[Dict]) -> Tuple[Optional[str], Optional[str], Optional[Tuple[Dict, int]]]:
+    """Returns (question, session_id, None), or an error response as the third item."""
+    if not data or "question" not in data:
+        return None, None, ({
+            "error": "Question is required",
+            "example": {"question": "What is Python?", "session_id": "optional-uuid"},
+        }, 400)
+
+    question = data["question"].strip()
+
+    if not question:
+        return None, None, ({"error": "Question cannot be empty"}, 400)
+
+    if len(question) > 500:
+        return None, None, ({"error": "Question too long (max 500 characters)"}, 400)
+
+    return question, data.get("session_id"), None
+
+
+def start_ask(question: str, session_id: Optional[str]):
+    """
+    Session lookup plus response-cache check:
+    (session_id, context_vector, cache_key, cached payload or None, its question embedding).
+    """
+    if not session_id:
+        session_id = conversation_manager.create_session()
+        logger.debug("Auto-created session: %s", session_id)
+
+    logger.debug("[%s] Question: %s...", session_id[:8], question[:80])
+
+    with metrics.stage("context"):
+        context_vector = conversation_manager.get_context_vector(session_id)
+
+    # The generation changes on every KB write, so older entries are never served
+    cache_key = (normalize_query(question), _context_fingerprint(context_vector), engine.generation)
+    # Entries carry the question embedding, so a hit never touches the encoder
+    payload, embedding = response_cache.get(cache_key) or (None, None)
+    return session_id, context_vector, cache_key, payload, embedding
+
+
+def question_embedding(question: str):
+    # Only a fallback, lookups return the vector they used. Lexical mode never
+    # loads the question into the encoder, sessions then carry no context vector
+    if engine.search_mode == "lexical":
+        return None
+    return engine.embed_question(question)
+
+
+def finish_ask(
+    session_id: str,
+    question: str,
+    context_vector,
+    cache_key: tuple,
+    payload: Dict,
+    cached: bool,
+    started: float,
+    embedding
+) -> Dict:
+
+    # Failed lookups aren't cached so a recovered web search gets retried
+    if not cached and payload["source"] != "none":
+        response_cache.put(cache_key, (payload, embedding))
+
+    elapsed_ms = (time.perf_counter() - started) * 1000
+    (response_hit_latency if cached else response_miss_latency).add(elapsed_ms)
+
+    metrics.ANSWERS.inc(source=payload["source"], cached=str(cached).lower())
+    logger.debug("[%s] Confidence: %.2f%s", session_id[:8], payload["confidence"], " (cached)" if cached else "")
+
+    # The question embedding came with the lookup or the cached entry; it's
+    # folded into the session context vector once. Also drops expired sessions
+    conversation_manager.add_message(session_id, question, payload["answer"], payload["confidence"], embedding=embedding)
+
+    response = {"session_id": session_id, **payload, "has_context": context_vector is not None, "cached": cached}
+    if payload["source"] != "local":
+        response["question"] = question
+    return response
+
+
+def ask_error(e: Exception) -> Tuple[Dict, int]:
+    logger.error(f"Error processing question: {str(e)}")
+    return {
+        "error": "Internal server error",
+        "message": str(e),
+    }, 500
+
+
+def handle_ask(data: Optional[Dict]) -> Tuple[Dict, int]:
+    try:
+        question, session_id, error = parse_ask(data)
+        if error:
+            return error
+
+        started = time.perf_counter()
+        session_id, context_vector, cache_key, payload, embedding = start_ask(question, session_id)
+        cached = payload is not None
+
+        if payload is None:
+            payload, embedding = answer_question(question, context_vector)
+
+        return finish_ask(
+            session_id, question, context_vector, cache_key, payload, cached, started, embedding
+        ), 200
+
+    except Exception as e:
+        return ask_error(e)
+
+
+def validate_pair(item) -> Tuple[Optional[Tuple[str, str, Dict]], Optional[str]]:
+    """(question, answer, metadata) stripped and checked, or an error message."""
+    if not isinstance(item, dict) or "question" not in item or "answer" not in item:
+        return None, "Both 'question' and 'answer' are required"
+    if not isinstance(item["question"], str) or not isinstance(item["answer"], str):
+        return None, "Question and answer must be strings"
+
+    question = item["question"].strip()
+    answer = item["answer"].strip()
+    metadata = item.get("metadata") or {}
+
+    if not question or not answer:
+        return None, "Question and answer cannot be empty"
+    if not isinstance(metadata, dict):
+        return None, "Metadata must be an object"
+    # Chroma only stores scalars and rejects the whole write otherwise
+    for key, value in metadata.items():
+        if not isinstance(value, METADATA_TYPES):
+            return None, f"Metadata value for '{key}' must be a string, number or boolean"
+    return (question, answer, metadata), None
+
+
+def _log_pairs(pairs: List[Tuple[str, str, Dict]]) -> None:
+    if csv_log is not None:
+        csv_log.append([
+            {"question": q, "answer": a, "language": detect_language(q), "category": m.get("category", "")}
+            for q, a, m in pairs
+        ])
+
+
+def read_only_error() -> Tuple[Dict, int]:
+    return {
+        "error": "The knowledge base is read-only on this server",
+        "message": "Multi-worker servers don't accept writes; add pairs through a single-worker "
+                   "instance (CORTEX_WORKERS=1) or reload_db.py, then restart",
+    }, 503
+
+
+def handle_add(data: Optional[Dict]) -> Tuple[Dict, int]:
+    if READ_ONLY:
+        return read_only_error()
+    try:
+        pair, error = validate_pair(data)
+        if error:
+            body = {"error": error}
+            if not data or "question" not in data or "answer" not in data:
+                body["example"] = {"question": "What is X?", "answer": "X is..."}
+            return body, 400
+
+        question, answer, metadata = pair
+        item_id = engine.add_qa_pair(question, answer, metadata)
+        _log_pairs([pair])
+
+        logger.info(f"Added new Q&A: {question[:50]}...")
+
+        return {
+            "message": "Q&A pair added successfully",
+            "id": item_id,
+            "total_items": engine.count()
+        }, 201
+
+    except Exception as e:
+        logger.error(f"Error adding Q&A: {e}")
+        return {"error": str(e)}, 500
+
+
+def is_ndjson(content_type: Optional[str]) -> bool:
+    return (content_type or "").split(";")[0].strip().lower() in NDJSON_TYPES
+
+
+def split_lines(chunks: Iterable[bytes], max_bytes: int = ADD_BATCH_MAX_BYTES) -> Iterator:
+    """Lines of a body read in arbitrary chunks; past `max_bytes` a ValueError item ends it."""
+    pending = b""
+    received = 0
+    for chunk in chunks:
+        received += len(chunk)
+        if received > max_bytes:
+            yield ValueError(f"Request body exceeds {max_bytes} bytes, rest ignored")
+            return
+        lines = (pending + chunk).split(b"\n")
+        pending = lines.pop()
+        yield from lines
+    if pending:
+        yield pending
+
+
+def iter_ndjson(lines: Iterable) -> Iterator:
+    """One item per non-empty line; a line that isn't JSON becomes a ValueError item, reported per item."""
+    for number, line in enumerate(lines, start=1):
+        if isinstance(line, ValueError):
+            yield line
+            continue
+        if isinstance(line, bytes):
+            line = line.decode("utf-8", errors="replace")
+        if not line.strip():
+            continue
+        try:
+            yield json.loads(line)
+        except ValueError as e:
+            yield ValueError(f"Line {number} is not valid JSON: {e}")
+
+
+def parse_json_array(body: bytes) -> Tuple[Optional[list], Optional[Tuple[Dict, int]]]:
+    try:
+        items = json.loads(body)
+    except ValueError as e:
+        return None, ({"error": f"Body is not valid JSON: {e}"}, 400)
+    if not isinstance(items, list):
+        return None, ({
+            "error": "Expected a JSON array of Q&A pairs, or NDJSON with Content-Type application/x-ndjson",
+            "example": [{"question": "What is X?", "answer": "X is...", "metadata": {"category": "general"}}],
+        }, 400)
+    return items, None
+
+
+def _add_chunk(chunk: List[Tuple[int, Tuple[str, str, Dict]]], results: List[Dict]) -> None:
+    try:
+        ids = engine.add_qa_pairs([pair for _, pair in chunk])
+    except Exception as e:
+        logger.error(f"Error adding {len(chunk)} Q&A pairs: {e}")
+        results.extend({"index": index, "status": "error", "error": str(e)} for index, _ in chunk)
+        return
+    _log_pairs([pair for _, pair in chunk])
+    results.extend({"index": index, "status": "added", "id": item_id} for (index, _), item_id in zip(chunk, ids))
+
+
+def handle_add_batch(items: Iterable) -> Tuple[Dict, int]:
+    """
+    Validate every item, then add the valid ones ADD_BATCH_CHUNK at a time.
+    Items can be a list or a lazy iterator (NDJSON read from the request
+    stream), so a large upload is never held in memory whole.
+    """
+    if READ_ONLY:
+        return read_only_error()
+    started = time.perf_counter()
+    results: List[Dict] = []
+    chunk: List[Tuple[int, Tuple[str, str, Dict]]] = []
+
+    for index, item in enumerate(items):
+        if index >= ADD_BATCH_MAX:
+            results.append({"index": index, "status": "error", "error": f"Batch limit of {ADD_BATCH_MAX} items reached, rest ignored"})
+            break
+        if isinstance(item, ValueError):
+            results.append({"index": index, "status": "error", "error": str(item)})
+            continue
+        pair, error = validate_pair(item)
+        if error:
+            results.append({"index": index, "status": "error", "error": error})
+            continue
+        chunk.append((index, pair))
+        if len(chunk) >= ADD_BATCH_CHUNK:
+            _add_chunk(chunk, results)
+            chunk = []
+    if chunk:
+        _add_chunk(chunk, results)
+
+    results.sort(key=lambda result: result["index"])
+    added = sum(1 for result in results if result["status"] == "added")
+    failed = len(results) - added
+    logger.info(f"Batch add: {added} added, {failed} failed in {time.perf_counter() - started:.2f}s")
+
+    if not results:
+        return {"error": "No Q&A pairs in the request body"}, 400
+    return {
+        "added": added,
+        "failed": failed,
+        "results": results,
+        "total_items": engine.count(),
+    }, 201 if not failed else (207 if added else 400)
+
+
+def handle_clear_cache() -> Tuple[Dict, int]:
+    try:
+        engine.clear_query_cache()
+        response_cache.clear()
+        logger.info("Cleared query embedding and response caches")
+
+        return {
+            "message": "Query embedding and response caches cleared",
+            "query_cache": engine.get_stats()["query_cache"],
+            "response_cache": response_cache.stats(),
+        }, 200
+
+    except Exception as e:
+        logger.error(f"Error clearing cache: {e}")
+        return {"error": str(e)}, 500
+
+
+def collect_stats() -> Dict:
+
+    db_stats = engine.get_stats()
+    session_stats = conversation_manager.stats()
+
+    return {
+        "total_questions": db_stats["total_items"],
+        "active_sessions": session_stats["active_sessions"],
+        "sessions": session_stats,
+        "database": db_stats,
+        "query_cache": db_stats["query_cache"],
+        "response_cache": {
+            **response_cache.stats(),
+            "generation": engine.generation,
+            "hit_latency_ms": response_hit_latency.summary(),
+            "miss_latency_ms": response_miss_latency.summary(),
+        },
+        "batcher": db_stats["batcher"],
+        "web_search": web_searcher.stats(),
+        "csv_log": csv_log.stats() if csv_log is not None else None,
+        "read_only": READ_ONLY,
+        "startup": db_stats["startup"],
+        "languages": ["Arabic", "English", "German", "Multilingual"],
+        "version": VERSION,
+        "engine": ENGINE_NAME,
+        "status": "running",
+        "features": [
+            "conversation_memory",
+            "web_search",
+            "multilingual",
+            "vector_database",
+            "persistent_storage"
+        ],
+    }
+
+
+def after_fork() -> None:
+    """Re-create per-process resources in a worker forked from a preloaded master (see gunicorn.conf.py)."""
+    log_queue.after_fork()
+    engine.after_fork()
+    web_searcher.after_fork()
+    # The session store re-creates its writer thread and connections on its own
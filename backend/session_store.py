@@ -0,0 +1,560 @@
+import atexit
+import logging
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from collections import OrderedDict, deque
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from vector_index import normalize_rows
+
+logger = logging.getLogger(__name__)
+
+
+class Message:
+    __slots__ = ("question", "answer", "confidence", "timestamp", "key")
+
+    def __init__(self, question: str, answer: str, confidence: float, timestamp: float, key: Optional[str] = None):
+        self.question = question
+        self.answer = answer
+        self.confidence = confidence
+        self.timestamp = timestamp
+        self.key = key
+
+    def size(self) -> int:
+        return len(self.question.encode("utf-8")) + len(self.answer.encode("utf-8"))
+
+
+class Session:
+    __slots__ = ("history", "created_at", "last_activity", "size", "context_vector")
+
+    def __init__(self, max_history: int, now: float):
+        self.history: deque = deque(maxlen=max_history)
+        self.created_at = now
+        self.last_activity = now
+        self.size = 0
+        self.context_vector: Optional[np.ndarray] = None
+
+
+def fold_context(previous: Optional[np.ndarray], embedding: np.ndarray, decay: float) -> np.ndarray:
+    """
+    Add one turn to a session context vector. The result is a decayed sum of
+    the unit-length turn embeddings, so its direction is their decayed mean.
+    """
+    embedding = normalize_rows(embedding)[0]
+    if previous is None:
+        return embedding
+    return (decay * previous + embedding).astype(np.float32)
+
+
+class MemorySessionStore:
+    """
+    Per-process store. Sessions are kept in an OrderedDict ordered by last
+    activity (touched sessions move to the end), so expired sessions are
+    always at the front and expiry only looks at the ones it removes. Past
+    `max_sessions` or `max_memory_bytes` of message text the least recently
+    active sessions are evicted.
+    """
+
+    name = "memory"
+
+    def __init__(
+        self,
+        max_history: int,
+        session_timeout: float,
+        max_sessions: int = 10000,
+        max_memory_bytes: int = 64 * 1024 * 1024,
+        context_decay: float = 0.5
+    ):
+        self.max_history = max_history
+        self.session_timeout = session_timeout
+        self.max_sessions = max_sessions
+        self.max_memory_bytes = max_memory_bytes
+        self.context_decay = context_decay
+
+        self.sessions: "OrderedDict[str, Session]" = OrderedDict()
+        self.memory_bytes = 0
+        self.created = 0
+        self.expired = 0
+        self.evicted = 0
+        self._lock = threading.Lock()
+
+    def _is_expired(self, session: Session, now: float) -> bool:
+        return now - session.last_activity > self.session_timeout
+
+    def _remove(self, session_id: str) -> None:
+        session = self.sessions.pop(session_id)
+        self.memory_bytes -= session.size
+
+    def _expire(self, now: float) -> int:
+        removed = 0
+        while self.sessions:
+            session_id, session = next(iter(self.sessions.items()))
+            if not self._is_expired(session, now):
+                break
+            self._remove(session_id)
+            removed += 1
+        self.expired += removed
+        return removed
+
+    def _enforce_limits(self, keep: str) -> None:
+        while len(self.sessions) > self.max_sessions or self.memory_bytes > self.max_memory_bytes:
+            session_id = next(iter(self.sessions))
+            if session_id == keep:
+                break
+            self._remove(session_id)
+            self.evicted += 1
+
+    def _get(self, session_id: str, now: float) -> Optional[Session]:
+        session = self.sessions.get(session_id)
+        if session is not None and self._is_expired(session, now):
+            self._remove(session_id)
+            self.expired += 1
+            return None
+        return session
+
+    def _new_session(self, session_id: str, now: float) -> Session:
+        session = Session(self.max_history, now)
+        self.sessions[session_id] = session
+        self.created += 1
+        self._enforce_limits(keep=session_id)
+        return session
+
+    def create(self, session_id: str, now: float) -> None:
+        with self._lock:
+            self._expire(now)
+            self._new_session(session_id, now)
+
+    def append(self, session_id: str, message: Message, embedding: Optional[np.ndarray] = None) -> None:
+        now = message.timestamp
+        with self._lock:
+            self._expire(now)
+            session = self._get(session_id, now)
+            if session is None:
+                session = self._new_session(session_id, now)
+
+            if len(session.history) == session.history.maxlen:
+                dropped = session.history[0].size()
+                session.size -= dropped
+                self.memory_bytes -= dropped
+
+            session.history.append(message)
+            added = message.size()
+            session.size += added
+            self.memory_bytes += added
+
+            if embedding is not None:
+                if session.context_vector is None:
+                    session.size += embedding.size * 4
+                    self.memory_bytes += embedding.size * 4
+                session.context_vector = fold_context(session.context_vector, embedding, self.context_decay)
+
+            session.last_activity = now
+            self.sessions.move_to_end(session_id)
+            self._enforce_limits(keep=session_id)
+
+    def history(self, session_id: str, now: float) -> Optional[List[Message]]:
+        with self._lock:
+            session = self._get(session_id, now)
+            return None if session is None else list(session.history)
+
+    def context_vector(self, session_id: str, now: float) -> Optional[np.ndarray]:
+        with self._lock:
+            session = self._get(session_id, now)
+            return None if session is None else session.context_vector
+
+    def info(self, session_id: str) -> Optional[Tuple[float, float, int]]:
+        with self._lock:
+            session = self.sessions.get(session_id)
+            if session is None:
+                return None
+            return session.created_at, session.last_activity, len(session.history)
+
+    def delete(self, session_id: str) -> None:
+        with self._lock:
+            if session_id in self.sessions:
+                self._remove(session_id)
+
+    def expire(self, now: float) -> int:
+        with self._lock:
+            return self._expire(now)
+
+    def count(self) -> int:
+        return len(self.sessions)
+
+    def close(self) -> None:
+        pass
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                "backend": self.name,
+                "active_sessions": len(self.sessions),
+                "max_sessions": self.max_sessions,
+                "memory_bytes": self.memory_bytes,
+                "max_memory_bytes": self.max_memory_bytes,
+                "created": self.created,
+                "expired": self.expired,
+                "evicted": self.evicted,
+            }
+
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS sessions (
+    id TEXT PRIMARY KEY,
+    created_at REAL NOT NULL,
+    last_activity REAL NOT NULL,
+    context_vector BLOB,
+    context_key TEXT
+);
+CREATE INDEX IF NOT EXISTS sessions_last_activity ON sessions(last_activity);
+CREATE TABLE IF NOT EXISTS messages (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    session_id TEXT NOT NULL REFERENCES sessions(id) ON DELETE CASCADE,
+    key TEXT NOT NULL UNIQUE,
+    question TEXT NOT NULL,
+    answer TEXT NOT NULL,
+    confidence REAL NOT NULL,
+    timestamp REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS messages_session ON messages(session_id, id);
+"""
+
+# Same measure as MemorySessionStore: UTF-8 bytes of the message text plus the context vectors
+_STORED_BYTES = (
+    "SELECT COALESCE((SELECT SUM(LENGTH(CAST(question AS BLOB)) + LENGTH(CAST(answer AS BLOB))) FROM messages), 0)"
+    " + COALESCE((SELECT SUM(LENGTH(context_vector)) FROM sessions), 0)"
+)
+
+
+class SQLiteSessionStore:
+    """
+    Session store shared by every process on the host through one SQLite
+    database in WAL mode.
+
+    Writes are queued and committed by a background thread every
+    `flush_interval` seconds in one transaction; reads merge in this
+    process's unflushed writes, so a worker always sees its own messages.
+    The same thread deletes expired sessions every `expire_interval`
+    seconds, then evicts the least recently active ones past `max_sessions`
+    or `max_memory_bytes` of stored message text and context vectors (so
+    either limit can be overshot by one interval's writes). Threads and
+    connections are (re)created lazily per process, so the store can be
+    built before a pre-forking server forks.
+    """
+
+    name = "sqlite"
+
+    def __init__(
+        self,
+        path: str | Path,
+        max_history: int,
+        session_timeout: float,
+        max_sessions: int = 100000,
+        max_memory_bytes: int = 64 * 1024 * 1024,
+        context_decay: float = 0.5,
+        flush_interval: float = 0.05,
+        expire_interval: float = 30.0
+    ):
+        self.path = str(path)
+        self.max_history = max_history
+        self.session_timeout = session_timeout
+        self.max_sessions = max_sessions
+        self.max_memory_bytes = max_memory_bytes
+        self.context_decay = context_decay
+        self.flush_interval = flush_interval
+        self.expire_interval = expire_interval
+
+        self.flushed_batches = 0
+        self.flushed_messages = 0
+        self.failed_flushes = 0
+        self.expired = 0
+        self.evicted = 0
+        # Measured by the last expiry sweep
+        self.memory_bytes = 0
+
+        Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+        conn = self._connect()
+        conn.executescript(_SCHEMA)
+        columns = {row[1] for row in conn.execute("PRAGMA table_info(sessions)")}
+        for column, kind in (("context_vector", "BLOB"), ("context_key", "TEXT")):
+            if column not in columns:
+                conn.execute(f"ALTER TABLE sessions ADD COLUMN {column} {kind}")
+        conn.close()
+
+        self._pid = None
+        self._ensure_started()
+        atexit.register(self.close)
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, timeout=30.0, isolation_level=None, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("PRAGMA foreign_keys=ON")
+        return conn
+
+    def _ensure_started(self) -> None:
+        # A forked child inherits neither the writer thread nor usable
+        # connections, and the parent flushes its own queue
+        if self._pid == os.getpid():
+            return
+        self._pid = os.getpid()
+        self._local = threading.local()
+        self._pending: List[tuple] = []
+        self._inflight: List[tuple] = []
+        self._pending_lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="session-writer", daemon=True)
+        self._thread.start()
+
+    def _conn(self) -> sqlite3.Connection:
+        self._ensure_started()
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._connect()
+            self._local.conn = conn
+        return conn
+
+    def _enqueue(self, op: tuple) -> None:
+        self._ensure_started()
+        with self._pending_lock:
+            self._pending.append(op)
+
+    def _run(self) -> None:
+        next_expire = time.monotonic() + self.expire_interval
+        while not self._stop.wait(self.flush_interval):
+            self.flush()
+            if time.monotonic() >= next_expire:
+                try:
+                    self.expire(time.time())
+                except sqlite3.Error as e:
+                    logger.error(f"Session expiry failed: {e}")
+                next_expire = time.monotonic() + self.expire_interval
+
+    def flush(self) -> None:
+        with self._flush_lock:
+            with self._pending_lock:
+                ops, self._pending = self._pending, []
+                self._inflight = ops
+            if not ops:
+                return
+
+            conn = self._conn()
+            try:
+                conn.execute("BEGIN IMMEDIATE")
+                touched = set()
+                for op in ops:
+                    if op[0] == "create":
+                        _, session_id, now = op
+                        conn.execute(
+                            "INSERT OR IGNORE INTO sessions (id, created_at, last_activity) VALUES (?, ?, ?)",
+                            (session_id, now, now)
+                        )
+                    else:
+                        _, session_id, message, embedding = op
+                        # A message for an expired session starts a fresh one
+                        conn.execute(
+                            "DELETE FROM sessions WHERE id = ? AND last_activity < ?",
+                            (session_id, message.timestamp - self.session_timeout)
+                        )
+                        conn.execute(
+                            "INSERT INTO sessions (id, created_at, last_activity) VALUES (?, ?, ?) "
+                            "ON CONFLICT(id) DO UPDATE SET last_activity = MAX(last_activity, excluded.last_activity)",
+                            (session_id, message.timestamp, message.timestamp)
+                        )
+                        conn.execute(
+                            "INSERT OR IGNORE INTO messages (session_id, key, question, answer, confidence, timestamp) "
+                            "VALUES (?, ?, ?, ?, ?, ?)",
+                            (session_id, message.key, message.question, message.answer, message.confidence, message.timestamp)
+                        )
+                        if embedding is not None:
+                            self._fold_into_session(conn, session_id, message.key, embedding)
+                        touched.add(session_id)
+
+                for session_id in touched:
+                    conn.execute(
+                        "DELETE FROM messages WHERE session_id = ? AND id NOT IN "
+                        "(SELECT id FROM messages WHERE session_id = ? ORDER BY id DESC LIMIT ?)",
+                        (session_id, session_id, self.max_history)
+                    )
+                conn.execute("COMMIT")
+            except sqlite3.Error as e:
+                if conn.in_transaction:
+                    conn.execute("ROLLBACK")
+                self.failed_flushes += 1
+                logger.error(f"Session flush failed, will retry: {e}")
+                with self._pending_lock:
+                    self._pending = ops + self._pending
+                    self._inflight = []
+                return
+
+            with self._pending_lock:
+                self._inflight = []
+            self.flushed_batches += 1
+            self.flushed_messages += sum(1 for op in ops if op[0] == "message")
+
+    def _fold_into_session(self, conn: sqlite3.Connection, session_id: str, key: str, embedding: np.ndarray) -> None:
+        row = conn.execute("SELECT context_vector FROM sessions WHERE id = ?", (session_id,)).fetchone()
+        previous = np.frombuffer(row[0], dtype=np.float32) if row and row[0] is not None else None
+        vector = fold_context(previous, embedding, self.context_decay)
+        # context_key records the last turn folded in, so readers know which
+        # of their unflushed turns the stored vector already contains
+        conn.execute(
+            "UPDATE sessions SET context_vector = ?, context_key = ? WHERE id = ?",
+            (vector.tobytes(), key, session_id)
+        )
+
+    def create(self, session_id: str, now: float) -> None:
+        self._enqueue(("create", session_id, now))
+
+    def append(self, session_id: str, message: Message, embedding: Optional[np.ndarray] = None) -> None:
+        message.key = uuid.uuid4().hex
+        if embedding is not None:
+            embedding = np.asarray(embedding, dtype=np.float32)
+        self._enqueue(("message", session_id, message, embedding))
+
+    def history(self, session_id: str, now: float) -> Optional[List[Message]]:
+        conn = self._conn()
+        # Snapshot unflushed writes before reading the database: anything
+        # committed in between then shows up twice and is deduplicated by key
+        with self._pending_lock:
+            pending = [op for op in self._inflight + self._pending if op[1] == session_id]
+
+        row = conn.execute("SELECT last_activity FROM sessions WHERE id = ?", (session_id,)).fetchone()
+        messages: List[Message] = []
+        if row is not None and now - row[0] <= self.session_timeout:
+            rows = conn.execute(
+                "SELECT question, answer, confidence, timestamp, key FROM messages "
+                "WHERE session_id = ? ORDER BY id DESC LIMIT ?",
+                (session_id, self.max_history)
+            ).fetchall()
+            messages = [Message(*r) for r in reversed(rows)]
+        elif not pending:
+            return None
+
+        seen = {message.key for message in messages}
+        for op in pending:
+            if op[0] == "message" and op[2].key not in seen:
+                messages.append(op[2])
+        return messages[-self.max_history:]
+
+    def context_vector(self, session_id: str, now: float) -> Optional[np.ndarray]:
+        conn = self._conn()
+        with self._pending_lock:
+            pending = [op for op in self._inflight + self._pending if op[0] == "message" and op[1] == session_id]
+
+        row = conn.execute(
+            "SELECT last_activity, context_vector, context_key FROM sessions WHERE id = ?", (session_id,)
+        ).fetchone()
+        vector = None
+        if row is not None and now - row[0] <= self.session_timeout and row[1] is not None:
+            vector = np.frombuffer(row[1], dtype=np.float32)
+            keys = [op[2].key for op in pending]
+            if row[2] in keys:
+                pending = pending[keys.index(row[2]) + 1:]
+
+        for op in pending:
+            if op[3] is not None:
+                vector = fold_context(vector, op[3], self.context_decay)
+        return vector
+
+    def info(self, session_id: str) -> Optional[Tuple[float, float, int]]:
+        self.flush()
+        conn = self._conn()
+        row = conn.execute(
+            "SELECT s.created_at, s.last_activity, "
+            "(SELECT COUNT(*) FROM messages m WHERE m.session_id = s.id) "
+            "FROM sessions s WHERE s.id = ?",
+            (session_id,)
+        ).fetchone()
+        return tuple(row) if row else None
+
+    def delete(self, session_id: str) -> None:
+        self.flush()
+        self._conn().execute("DELETE FROM sessions WHERE id = ?", (session_id,))
+
+    def expire(self, now: float) -> int:
+        conn = self._conn()
+        expired = conn.execute(
+            "DELETE FROM sessions WHERE last_activity < ?", (now - self.session_timeout,)
+        ).rowcount
+        evicted = conn.execute(
+            "DELETE FROM sessions WHERE id IN (SELECT id FROM sessions ORDER BY last_activity "
+            "LIMIT MAX(0, (SELECT COUNT(*) FROM sessions) - ?))",
+            (self.max_sessions,)
+        ).rowcount
+        evicted += self._enforce_memory(conn)
+        self.expired += expired
+        self.evicted += evicted
+        return expired
+
+    def _enforce_memory(self, conn: sqlite3.Connection) -> int:
+        self.memory_bytes = conn.execute(_STORED_BYTES).fetchone()[0]
+        if self.memory_bytes <= self.max_memory_bytes:
+            return 0
+        # Keep the most recently active sessions that fit, evict the rest
+        evicted = conn.execute(
+            "DELETE FROM sessions WHERE id IN (SELECT id FROM ("
+            "    SELECT id, SUM(size) OVER (ORDER BY last_activity DESC, id) AS running FROM ("
+            "        SELECT s.id, s.last_activity, COALESCE(LENGTH(s.context_vector), 0) + COALESCE(("
+            "            SELECT SUM(LENGTH(CAST(m.question AS BLOB)) + LENGTH(CAST(m.answer AS BLOB))) FROM messages m"
+            "            WHERE m.session_id = s.id), 0) AS size FROM sessions s)"
+            ") WHERE running > ?)",
+            (self.max_memory_bytes,)
+        ).rowcount
+        self.memory_bytes = conn.execute(_STORED_BYTES).fetchone()[0]
+        return evicted
+
+    def count(self) -> int:
+        return self._conn().execute(
+            "SELECT COUNT(*) FROM sessions WHERE last_activity >= ?", (time.time() - self.session_timeout,)
+        ).fetchone()[0]
+
+    def close(self) -> None:
+        if self._pid != os.getpid():
+            return
+        self._stop.set()
+        self._thread.join()
+        self.flush()
+
+    def stats(self) -> Dict:
+        with self._pending_lock:
+            pending = len(self._pending)
+        return {
+            "backend": self.name,
+            "path": self.path,
+            "active_sessions": self.count(),
+            "max_sessions": self.max_sessions,
+            "memory_bytes": self.memory_bytes,
+            "max_memory_bytes": self.max_memory_bytes,
+            "pending_writes": pending,
+            "flushed_batches": self.flushed_batches,
+            "flushed_messages": self.flushed_messages,
+            "failed_flushes": self.failed_flushes,
+            "expired": self.expired,
+            "evicted": self.evicted,
+        }
+
+
+def build_session_store(
+    backend: str,
+    max_history: int,
+    session_timeout: float,
+    max_sessions: int,
+    max_memory_bytes: int,
+    db_path: Optional[str | Path] = None,
+    context_decay: float = 0.5
+):
+    if backend == "memory":
+        return MemorySessionStore(max_history, session_timeout, max_sessions, max_memory_bytes, context_decay)
+    if backend == "sqlite":
+        if db_path is None:
+            raise ValueError("db_path is required for the sqlite session store")
+        return SQLiteSessionStore(db_path, max_history, session_timeout, max_sessions, max_memory_bytes, context_decay)
+    raise ValueError(f"Unknown session store '{backend}'")
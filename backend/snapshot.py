@@ -0,0 +1,133 @@
+import hashlib
+import json
+import os
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional
+
+import numpy as np
+
+SNAPSHOT_VERSION = 1
+
+
+def _load_array(path: Path) -> np.ndarray:
+    # Memory-mapped so every process opening the snapshot shares the same
+    # page-cache pages; numpy can't map zero-length arrays, those load normally
+    try:
+        return np.load(path, mmap_mode="r")
+    except ValueError:
+        return np.load(path)
+
+
+def _save_array(path: Path, array: np.ndarray) -> None:
+    tmp_path = path.with_name(path.name + ".tmp")
+    with open(tmp_path, "wb") as f:
+        np.save(f, array)
+    os.replace(tmp_path, path)
+
+
+def text_hash(text: str) -> int:
+    return int.from_bytes(hashlib.blake2b(text.encode("utf-8"), digest_size=8).digest(), "little")
+
+
+class TextColumn:
+    """
+    Sequence of strings stored as one UTF-8 blob plus an offsets array, both
+    memory-mapped. Strings are decoded on access; appended strings are kept
+    in memory on top of the mapped part.
+    """
+
+    def __init__(self, blob: np.ndarray, offsets: np.ndarray):
+        self._blob = blob
+        self._offsets = offsets
+        self._base = len(offsets) - 1
+        self._extra: List[str] = []
+
+    @classmethod
+    def load(cls, prefix: Path) -> "TextColumn":
+        return cls(
+            _load_array(prefix.with_name(prefix.name + ".blob.npy")),
+            _load_array(prefix.with_name(prefix.name + ".offsets.npy"))
+        )
+
+    @staticmethod
+    def save(texts: List[str], prefix: Path) -> None:
+        encoded = [text.encode("utf-8") for text in texts]
+        offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        np.cumsum([len(b) for b in encoded], out=offsets[1:])
+        _save_array(prefix.with_name(prefix.name + ".blob.npy"), np.frombuffer(b"".join(encoded), dtype=np.uint8))
+        _save_array(prefix.with_name(prefix.name + ".offsets.npy"), offsets)
+
+    def __len__(self) -> int:
+        return self._base + len(self._extra)
+
+    def __getitem__(self, i: int) -> str:
+        if i < 0:
+            i += len(self)
+        if i >= self._base:
+            return self._extra[i - self._base]
+        return self._blob[self._offsets[i]:self._offsets[i + 1]].tobytes().decode("utf-8")
+
+    def __iter__(self) -> Iterator[str]:
+        for i in range(len(self)):
+            yield self[i]
+
+    def append(self, text: str) -> None:
+        self._extra.append(text)
+
+    def extend(self, texts: Iterable[str]) -> None:
+        self._extra.extend(texts)
+
+
+def save_snapshot(
+    directory: str | Path,
+    embeddings: np.ndarray,
+    questions: List[str],
+    answers: List[str],
+    exact_keys: List[str],
+    meta: Dict
+) -> None:
+    """
+    Write a QAEngine snapshot. meta.json is written last, so a snapshot
+    interrupted half-way is never picked up by load_snapshot.
+    """
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+    meta_path = directory / "meta.json"
+    meta_path.unlink(missing_ok=True)
+
+    _save_array(directory / "embeddings.npy", np.ascontiguousarray(embeddings, dtype=np.float32))
+    TextColumn.save(list(questions), directory / "questions")
+    TextColumn.save(list(answers), directory / "answers")
+
+    # Exact-match lookup: sorted hashes of the normalized questions + their rows
+    hashes = np.fromiter((text_hash(key) for key in exact_keys), dtype=np.uint64, count=len(exact_keys))
+    order = np.argsort(hashes, kind="stable")
+    _save_array(directory / "exact_hashes.npy", hashes[order])
+    _save_array(directory / "exact_rows.npy", order.astype(np.int64))
+
+    meta_path.write_text(
+        json.dumps({**meta, "version": SNAPSHOT_VERSION, "rows": len(questions)}),
+        encoding="utf-8"
+    )
+
+
+def load_snapshot(directory: str | Path) -> Optional[Dict]:
+    directory = Path(directory)
+    try:
+        meta = json.loads((directory / "meta.json").read_text(encoding="utf-8"))
+    except (FileNotFoundError, ValueError):
+        return None
+    if meta.get("version") != SNAPSHOT_VERSION:
+        return None
+
+    snapshot = {
+        "meta": meta,
+        "embeddings": _load_array(directory / "embeddings.npy"),
+        "questions": TextColumn.load(directory / "questions"),
+        "answers": TextColumn.load(directory / "answers"),
+        "exact_hashes": _load_array(directory / "exact_hashes.npy"),
+        "exact_rows": _load_array(directory / "exact_rows.npy"),
+    }
+    if len(snapshot["embeddings"]) != meta["rows"] or len(snapshot["questions"]) != meta["rows"]:
+        return None
+    return snapshot
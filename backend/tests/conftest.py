@@ -0,0 +1,66 @@
+import hashlib
+import sys
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pytest
+
+# The backend modules import each other as top-level modules (app.py is run from backend/)
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+
+@pytest.fixture(scope="session")
+def encoder_class():
+    """Deterministic bag-of-words encoder that records its calls, so engine tests don't download a model."""
+    pytest.importorskip("sentence_transformers")
+    from encoders import Encoder
+    from lexical_index import tokenize
+
+    class WordEncoder(Encoder):
+        backend = "fp32"
+
+        def __init__(self):
+            super().__init__("test-word-encoder")
+            self.calls = []
+
+        def encode(self, texts, batch_size=32, show_progress_bar=False):
+            self.calls.append(list(texts))
+            vectors = np.full((len(texts), 32), 0.01, dtype=np.float32)
+            for row, text in enumerate(texts):
+                for token in tokenize(text):
+                    vectors[row, int(hashlib.md5(token.encode("utf-8")).hexdigest(), 16) % 32] += 1.0
+            return vectors
+
+    return WordEncoder
+
+
+@pytest.fixture
+def encoder(encoder_class):
+    return encoder_class()
+
+
+@pytest.fixture(scope="session")
+def service(encoder_class, tmp_path_factory):
+    """service.py builds everything at import: here the in-memory engine over a small CSV, offline."""
+    state_dir = tmp_path_factory.mktemp("state")
+    csv_path = state_dir / "kb.csv"
+    pd.DataFrame({
+        "question": ["What is Python?", "What is Rust?"],
+        "answer": ["A programming language.", "A systems language."],
+    }).to_csv(csv_path, index=False)
+
+    with pytest.MonkeyPatch.context() as mp:
+        for name, value in {
+            "CORTEX_ENGINE": "memory",
+            "CORTEX_KB_CSV": str(csv_path),
+            "CORTEX_STATE_DIR": str(state_dir),
+            "CORTEX_CSV_WRITE_BEHIND": "0",
+            "CORTEX_WEB_PROVIDER": "stub",
+            "CORTEX_READ_ONLY": "0",
+        }.items():
+            mp.setenv(name, value)
+        import qa_engine
+        mp.setattr(qa_engine, "build_encoder", lambda model_name, backend: encoder_class())
+        import service
+        yield service
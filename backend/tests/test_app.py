@@ -0,0 +1,43 @@
+import pytest
+
+pytest.importorskip("sentence_transformers")
+pytest.importorskip("flask")
+
+
+@pytest.fixture
+def client(service):
+    import app
+    return app.app.test_client()
+
+
+def test_metrics_endpoint_counts_answers_and_stages(client):
+    client.post("/ask", json={"question": "What is Python?"})
+
+    response = client.get("/metrics")
+    text = response.get_data(as_text=True)
+
+    assert response.status_code == 200
+    assert response.content_type.startswith("text/plain; version=0.0.4")
+    assert 'cortex_answers_total{source="local",cached="false"}' in text
+    assert 'cortex_stage_seconds_count{stage="serialize"}' in text
+    assert 'cortex_lookup_confidence_total{bucket="0.90-1.00"}' in text
+
+
+def test_ask_validation_errors(client):
+    assert client.post("/ask", json={}).status_code == 400
+    assert client.post("/ask", json={"question": "   "}).status_code == 400
+    assert client.post("/ask", json={"question": "x" * 501}).status_code == 400
+
+
+def test_batch_endpoint_accepts_json_and_ndjson(client):
+    response = client.post("/add/batch", json=[{"question": "What is Elm?", "answer": "A functional language."}])
+    assert response.status_code == 201
+    assert response.get_json()["added"] == 1
+
+    response = client.post(
+        "/add/batch",
+        data=b'{"question": "What is Nim?", "answer": "A compiled language."}\n{"question": "x"}\n',
+        content_type="application/x-ndjson",
+    )
+    assert response.status_code == 207
+    assert [result["status"] for result in response.get_json()["results"]] == ["added", "error"]
@@ -0,0 +1,83 @@
+import asyncio
+import threading
+
+import pytest
+
+pytest.importorskip("sentence_transformers")
+pytest.importorskip("quart")
+
+
+@pytest.fixture
+def asgi(service):
+    import asgi
+    return asgi
+
+
+def _record_threads(monkeypatch, module, names):
+    threads = {}
+    for name in names:
+        original = getattr(module, name)
+
+        def wrapper(*args, _name=name, _original=original):
+            threads[_name] = threading.current_thread()
+            return _original(*args)
+
+        monkeypatch.setattr(module, name, wrapper)
+    return threads
+
+
+def test_ask_keeps_blocking_work_off_the_event_loop(asgi, service, monkeypatch):
+    threads = _record_threads(monkeypatch, service, ["start_ask", "lookup_answer", "finish_ask"])
+
+    async def ask():
+        response = await asgi.app.test_client().post("/ask", json={"question": "What is Rust?"})
+        return threading.current_thread(), response.status_code, await response.get_json()
+
+    loop_thread, status, body = asyncio.run(ask())
+
+    assert status == 200
+    assert body["answer"] == "A systems language."
+    assert set(threads) == {"start_ask", "lookup_answer", "finish_ask"}
+    assert all(thread is not loop_thread for thread in threads.values())
+    assert threads["lookup_answer"].name.startswith("encode")
+
+
+def test_cache_clear_runs_off_the_event_loop(asgi, service, monkeypatch):
+    threads = _record_threads(monkeypatch, service, ["handle_clear_cache"])
+
+    async def clear():
+        response = await asgi.app.test_client().post("/cache/clear")
+        return threading.current_thread(), response.status_code
+
+    loop_thread, status = asyncio.run(clear())
+
+    assert status == 200
+    assert threads["handle_clear_cache"] is not loop_thread
+
+
+def test_low_confidence_answers_await_the_web_fallback(asgi):
+    async def ask():
+        response = await asgi.app.test_client().post("/ask", json={"question": "zzz unknown topic"})
+        return await response.get_json()
+
+    body = asyncio.run(ask())
+
+    assert body["source"] == "web"
+    assert body["answer"] == "Stub web answer for: zzz unknown topic"
+
+
+
+def test_batch_upload_is_streamed_as_ndjson(asgi, service):
+    lines = b'{"question": "What is Zig?", "answer": "A systems language."}\nnot json\n'
+
+    async def upload():
+        response = await asgi.app.test_client().post(
+            "/add/batch", data=lines, headers={"Content-Type": "application/x-ndjson"}
+        )
+        return response.status_code, await response.get_json()
+
+    status, body = asyncio.run(upload())
+
+    assert status == 207
+    assert [result["status"] for result in body["results"]] == ["added", "error"]
+    assert service.engine.find_answer("what is zig")["answer"] == "A systems language."
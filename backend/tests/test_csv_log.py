@@ -0,0 +1,56 @@
+import pandas as pd
+import pytest
+
+from csv_log import CsvAppendLog
+
+
+@pytest.fixture
+def open_log():
+    logs = []
+
+    def open_log(path):
+        # Flushed explicitly by the tests
+        log = CsvAppendLog(path, flush_interval=3600)
+        logs.append(log)
+        return log
+
+    yield open_log
+    for log in logs:
+        log.close()
+
+
+def test_rows_follow_the_existing_header(tmp_path, open_log):
+    path = tmp_path / "kb.csv"
+    path.write_text("question,category,answer\nq0,c0,a0", encoding="utf-8")
+    log = open_log(path)
+
+    log.append([{"question": "q1, with comma", "answer": "a1", "language": "english", "category": "c1"}])
+    assert log.stats()["pending"] == 1
+    log.flush()
+
+    df = pd.read_csv(path, keep_default_na=False)
+    assert df.values.tolist() == [["q0", "c0", "a0"], ["q1, with comma", "c1", "a1"]]
+    assert log.stats()["rows_written"] == 1
+
+
+def test_new_file_gets_a_header(tmp_path, open_log):
+    path = tmp_path / "kb.csv"
+    log = open_log(path)
+    log.append([{"question": "q", "answer": "a", "category": "ignored"}])
+    log.close()
+
+    assert path.read_text(encoding="utf-8") == "question,answer\nq,a\n"
+
+
+def test_failed_writes_are_kept_for_the_next_flush(tmp_path, open_log):
+    log = open_log(tmp_path / "missing-dir" / "kb.csv")
+    log.append([{"question": "q", "answer": "a"}])
+    log.flush()
+
+    assert log.stats()["write_errors"] == 1
+    assert log.stats()["pending"] == 1
+
+    log.path.parent.mkdir()
+    log.flush()
+    assert log.stats()["pending"] == 0
+    assert log.path.read_text(encoding="utf-8") == "question,answer\nq,a\n"
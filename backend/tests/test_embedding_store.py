@@ -0,0 +1,109 @@
+import multiprocessing
+
+import numpy as np
+import pytest
+
+import embedding_store
+from embedding_store import EmbeddingStore
+
+
+def _encoder(calls):
+    def encode(texts):
+        calls.append(list(texts))
+        return np.array([[len(text), ord(text[0]), 1.0] for text in texts], dtype=np.float32)
+    return encode
+
+
+def test_encodes_only_misses(tmp_path):
+    calls = []
+    store = EmbeddingStore(tmp_path, "test/model")
+
+    first = store.get_or_encode(["alpha", "beta", "alpha"], _encoder(calls))
+    second = store.get_or_encode(["beta", "gamma"], _encoder(calls))
+
+    assert calls == [["alpha", "beta"], ["gamma"]]
+    np.testing.assert_array_equal(first[0], first[2])
+    np.testing.assert_array_equal(second[0], first[1])
+    assert (store.hits, store.misses) == (2, 3)
+    assert len(store) == 3
+
+
+def test_reopened_store_reads_vectors_from_disk(tmp_path):
+    calls = []
+    expected = EmbeddingStore(tmp_path, "m").get_or_encode(["alpha", "beta"], _encoder(calls))
+
+    reopened = EmbeddingStore(tmp_path, "m")
+    np.testing.assert_array_equal(reopened.get_or_encode(["beta", "alpha"], _encoder(calls)), expected[::-1])
+    assert len(calls) == 1
+
+
+def test_stores_sharing_a_directory_see_each_others_rows(tmp_path):
+    calls = []
+    a = EmbeddingStore(tmp_path, "m")
+    b = EmbeddingStore(tmp_path, "m")
+
+    a.get_or_encode(["alpha"], _encoder(calls))
+    b.get_or_encode(["beta"], _encoder(calls))
+    rows = a.get_or_encode(["alpha", "beta"], _encoder(calls))
+
+    assert calls == [["alpha"], ["beta"]]
+    np.testing.assert_array_equal(rows, _encoder([])(["alpha", "beta"]))
+    # Rows were appended after each other's, not over them
+    assert (tmp_path / "m" / "vectors.f32").stat().st_size == 2 * 3 * 4
+
+
+def _append_words(directory, words):
+    store = EmbeddingStore(directory, "m")
+    for word in words:
+        store.get_or_encode([word], _encoder([]))
+
+
+@pytest.mark.skipif(embedding_store.fcntl is None, reason="needs fcntl file locks")
+def test_concurrent_processes_append_without_losing_rows(tmp_path):
+    words = [f"w{i:03d}" for i in range(60)]
+    # Overlapping halves, so both processes try to append some of the same texts
+    context = multiprocessing.get_context("fork")
+    workers = [
+        context.Process(target=_append_words, args=(tmp_path, words[:40])),
+        context.Process(target=_append_words, args=(tmp_path, words[20:])),
+    ]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    assert [worker.exitcode for worker in workers] == [0, 0]
+
+    calls = []
+    store = EmbeddingStore(tmp_path, "m")
+    np.testing.assert_array_equal(store.get_or_encode(words, _encoder(calls)), _encoder([])(words))
+    assert calls == []
+    assert len(store) == len(words)
+    assert store.vectors_path.stat().st_size == len(words) * 3 * 4
+
+
+def test_interrupted_append_is_truncated(tmp_path):
+    calls = []
+    store = EmbeddingStore(tmp_path, "m")
+    store.get_or_encode(["alpha"], _encoder(calls))
+
+    # A crash between writing vectors and their index lines leaves unindexed bytes behind
+    with open(store.vectors_path, "ab") as f:
+        f.write(b"\x00" * 12 * 5)
+    with open(store.index_path, "ab") as f:
+        f.write(b"partial")
+
+    reopened = EmbeddingStore(tmp_path, "m")
+    assert len(reopened) == 1
+    rows = reopened.get_or_encode(["beta", "alpha"], _encoder(calls))
+
+    np.testing.assert_array_equal(rows, _encoder([])(["beta", "alpha"]))
+    assert store.vectors_path.stat().st_size == 2 * 3 * 4
+    assert store.index_path.read_bytes().count(b"\n") == 2
+
+
+def test_dimension_mismatch_is_rejected(tmp_path):
+    store = EmbeddingStore(tmp_path, "m")
+    store.get_or_encode(["alpha"], lambda texts: np.ones((len(texts), 3), dtype=np.float32))
+
+    with pytest.raises(ValueError):
+        store.get_or_encode(["beta"], lambda texts: np.ones((len(texts), 4), dtype=np.float32))
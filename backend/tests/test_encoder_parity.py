@@ -0,0 +1,50 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+pytest.importorskip("sentence_transformers")
+
+import encoder_parity
+from encoder_parity import _leave_one_out_top_k
+from vector_index import normalize_rows
+
+
+def _brute_force_top_k(embeddings, k):
+    scores = embeddings @ embeddings.T
+    np.fill_diagonal(scores, -np.inf)
+    top = np.argsort(-scores, axis=1, kind="stable")[:, :k]
+    return top, np.take_along_axis(scores, top, axis=1)
+
+
+def test_leave_one_out_matches_brute_force():
+    embeddings = normalize_rows(np.random.default_rng(0).normal(size=(50, 16)))
+
+    top, scores = _leave_one_out_top_k(embeddings, 5)
+    expected_top, expected_scores = _brute_force_top_k(embeddings, 5)
+
+    np.testing.assert_array_equal(top, expected_top)
+    np.testing.assert_allclose(scores, expected_scores, rtol=1e-5)
+
+
+def test_identical_questions_never_list_themselves():
+    embeddings = normalize_rows(np.array([[1.0, 0.0], [1.0, 0.0], [0.0, 1.0], [0.6, 0.8]]))
+
+    top, scores = _leave_one_out_top_k(embeddings, 2)
+
+    assert all(i not in row for i, row in enumerate(top.tolist()))
+    assert top.shape == scores.shape == (4, 2)
+    assert top[0, 0] == 1 and top[1, 0] == 0
+
+
+def test_fp32_against_itself_is_encoded_once(encoder, tmp_path, monkeypatch):
+    built = []
+    monkeypatch.setattr(encoder_parity, "build_encoder", lambda model_name, backend: built.append(backend) or encoder)
+    csv_path = tmp_path / "kb.csv"
+    pd.DataFrame({"question": [f"question {i} about topic {i % 3}" for i in range(12)], "answer": "a"}).to_csv(csv_path, index=False)
+
+    results = encoder_parity.compare(csv_path, "fp32", k=3)
+
+    assert built == ["fp32"]
+    assert results["top1_agreement"] == 1.0
+    assert results["top_k_overlap"] == 1.0
+    assert results["confidence_drift_max"] == 0.0
@@ -0,0 +1,20 @@
+from latency import SampleWindow, summarize
+
+
+def test_summarize_percentiles():
+    summary = summarize(float(v) for v in range(100, 0, -1))
+
+    assert summary == {"count": 100, "mean": 50.5, "p50": 51.0, "p95": 96.0, "p99": 100.0, "max": 100.0}
+
+
+def test_summarize_empty():
+    assert summarize([])["count"] == 0
+
+
+def test_sample_window_keeps_the_latest_samples():
+    window = SampleWindow(size=3)
+    window.extend([100.0, 1.0, 2.0])
+    window.add(3.0)
+
+    assert window.summary()["max"] == 3.0
+    assert window.summary()["count"] == 3
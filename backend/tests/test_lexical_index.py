@@ -0,0 +1,108 @@
+import threading
+
+from lexical_index import BM25Index, tokenize
+
+
+def _index(docs):
+    index = BM25Index()
+    for item_id, text in docs.items():
+        index.add(item_id, text, {"text": text})
+    return index
+
+
+def test_tokenize_keeps_technical_symbols():
+    assert tokenize("What is C++ vs C#? And __init__!") == ["what", "is", "c++", "vs", "c#", "and", "__init__"]
+
+
+def test_tokenize_drops_the_arabic_article():
+    assert tokenize("البرمجة") == tokenize("برمجة") == ["برمجة"]
+    # With a leading conjunction or preposition
+    assert tokenize("والبرمجة بالحاسوب") == ["برمجة", "حاسوب"]
+    # Too short to carry an article
+    assert tokenize("الم") == ["الم"]
+
+
+def test_rarer_matching_terms_rank_higher():
+    index = _index({
+        "python": "what is python",
+        "rust": "what is rust",
+        "java": "what is java used for",
+        "snake": "python the snake",
+    })
+
+    ranked = [item_id for item_id, _ in index.search("what is python", top_k=4)]
+
+    # "rust" and "java" only share "what is", which is in most documents
+    assert ranked == ["python", "snake"]
+
+
+def test_document_of_exactly_the_query_terms_scores_one():
+    index = _index({"a": "what is python", "b": "python tutorial for beginners", "c": "what is rust"})
+
+    scores = dict(index.search("What is Python?", top_k=3))
+
+    assert scores["a"] == 1.0
+    assert all(0.0 < score < 1.0 for item_id, score in scores.items() if item_id != "a")
+
+
+def test_common_terms_only_contribute_to_the_score():
+    index = _index({str(i): f"what is topic{i}" for i in range(10)})
+
+    # "what" and "is" are in every document; a query of nothing else still gets matches
+    assert len(index.search("what is", top_k=5)) == 5
+    assert [item_id for item_id, _ in index.search("what is topic3", top_k=5)] == ["3"]
+
+
+def test_remove_and_replace_update_the_statistics():
+    index = _index({"a": "what is python", "b": "what is rust"})
+    index.add("a", "a completely different question")
+    index.remove("b")
+    index.remove("missing")
+
+    assert index.search("rust") == []
+    assert [item_id for item_id, _ in index.search("different")] == ["a"]
+    assert index.payload("b") is None
+    assert index.stats() == {"documents": 1, "terms": 4, "avg_length": 4.0}
+
+
+def test_accept_filters_candidates_before_ranking():
+    index = _index({"a": "python basics", "b": "python advanced", "c": "python tips"})
+
+    matches = index.search("python", top_k=5, accept=lambda item_id: index.payload(item_id)["text"].endswith("advanced"))
+
+    assert [item_id for item_id, _ in matches] == ["b"]
+
+
+def test_score_rates_specific_documents():
+    index = _index({"a": "what is python", "b": "what is rust"})
+
+    assert index.score("what is python", ["a", "b", "gone"]).keys() == {"a", "b"}
+
+
+def test_concurrent_updates_and_searches():
+    index = BM25Index()
+    errors = []
+
+    def write(start):
+        for i in range(start, start + 200):
+            index.add(str(i), f"question {i} about python")
+            if i % 3 == 0:
+                index.remove(str(i))
+
+    def read():
+        try:
+            for _ in range(200):
+                for item_id, score in index.search("python question", top_k=3):
+                    assert 0.0 <= score <= 1.0
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=write, args=(n * 200,)) for n in range(2)] + [threading.Thread(target=read) for _ in range(2)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert errors == []
+    assert len(index) == 400 - len([i for i in range(400) if i % 3 == 0])
+    assert index.stats()["avg_length"] == 4.0
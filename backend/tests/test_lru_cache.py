@@ -0,0 +1,49 @@
+import lru_cache
+from lru_cache import LRUCache, normalize_query
+
+
+def test_normalize_query_folds_unicode_form_and_whitespace():
+    assert normalize_query("  what\tis\n ＰＹＴＨＯＮ ") == "what is PYTHON"
+
+
+def test_evicts_least_recently_used():
+    cache = LRUCache(max_size=2)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    assert cache.get("a") == 1  # "b" is now the least recently used
+    cache.put("c", 3)
+
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+    assert cache.get("c") == 3
+    assert cache.evictions == 1
+
+
+def test_ttl_expires_entries(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(lru_cache.time, "monotonic", lambda: now[0])
+    cache = LRUCache(max_size=4, ttl_seconds=10.0)
+    cache.put("a", 1)
+
+    now[0] += 9.0
+    assert cache.get("a") == 1
+    now[0] += 2.0
+    assert cache.get("a") is None
+    assert cache.expirations == 1
+    assert len(cache) == 0
+
+
+def test_zero_size_disables_cache():
+    cache = LRUCache(max_size=0)
+    cache.put("a", 1)
+    assert cache.get("a") is None
+
+
+def test_stats_count_hits_and_misses():
+    cache = LRUCache(max_size=4)
+    cache.put("a", 1)
+    cache.get("a")
+    cache.get("b")
+
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["hit_rate"]) == (1, 1, 0.5)
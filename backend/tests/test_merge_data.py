@@ -0,0 +1,162 @@
+import argparse
+import csv
+
+import numpy as np
+import pandas as pd
+import pytest
+
+pytest.importorskip("sentence_transformers")
+
+import merge_data
+from merge_data import Staging, cluster_rows, find_duplicate_pairs, write_outputs
+
+
+def _angle(degrees):
+    radians = np.deg2rad(degrees)
+    return np.array([np.cos(radians), np.sin(radians), 0.0], dtype=np.float32)
+
+
+# cos(20°) ≈ 0.94 and cos(40°) ≈ 0.77 against a 0.92 threshold
+VECTORS = {
+    "How do I sort a list?": _angle(0),
+    "How to sort a list": _angle(20),
+    "Sorting lists in place": _angle(40),
+    "What is a closure?": _angle(90),
+    "كيف أرتب قائمة؟": _angle(0),
+}
+
+
+def _encode(texts):
+    return np.stack([VECTORS[text] for text in texts])
+
+
+def _args(tmp_path, **overrides):
+    values = dict(
+        threshold=0.92, top_k=10, nprobe=4, list_size=2000, block_size=2, seed=0, chunk_size=2,
+        output=tmp_path / "merged.csv", report=tmp_path / "report.csv", dry_run=False, backup=False
+    )
+    values.update(overrides)
+    return argparse.Namespace(**values)
+
+
+def _write(path, rows):
+    pd.DataFrame(rows).to_csv(path, index=False, encoding="utf-8")
+    return path
+
+
+def _stage(tmp_path, args):
+    kb = _write(tmp_path / "kb.csv", [
+        {"question": "How do I sort a list?", "answer": "sorted(items)"},
+        {"question": "What is a closure?", "answer": "None"},
+    ])
+    new = _write(tmp_path / "new.csv", [
+        {"question": "how do I sort a list", "answer": "exact duplicate", "tag": "x"},
+        {"question": "How to sort a list", "answer": "list.sort()", "tag": "x"},
+        {"question": "Sorting lists in place", "answer": "NA", "tag": "y"},
+        {"question": "كيف أرتب قائمة؟", "answer": "sorted()", "tag": "z"},
+        {"question": "Empty answer", "answer": "", "tag": "z"},
+    ])
+    inputs = [kb, new]
+    staging = Staging(tmp_path, merge_data._read_columns(inputs))
+    staging.build(inputs, _encode, args.chunk_size)
+    return staging
+
+
+def test_null_like_answers_stay_text_and_columns_are_filled(tmp_path):
+    path = _write(tmp_path / "a.csv", [
+        {"question": "q1", "answer": "None"},
+        {"question": "q2", "answer": "null"},
+        {"question": " q3 ", "answer": " NA "},
+        {"question": "q4", "answer": ""},
+    ])
+
+    chunk = pd.concat(merge_data._iter_chunks([path], ["question", "answer", "tag"], chunk_size=3))
+
+    assert chunk["answer"].tolist() == ["None", "null", "NA"]
+    assert chunk["question"].tolist() == ["q1", "q2", "q3"]
+    assert chunk["tag"].tolist() == ["", "", ""]
+    assert set(chunk["source"]) == {"a.csv"}
+
+
+def test_inputs_without_question_and_answer_are_rejected(tmp_path):
+    path = _write(tmp_path / "bad.csv", [{"prompt": "q", "answer": "a"}])
+
+    with pytest.raises(ValueError, match="must have 'question' and 'answer' columns"):
+        merge_data._read_columns([path])
+
+
+def test_staging_drops_exact_duplicates_across_files(tmp_path):
+    staging = _stage(tmp_path, _args(tmp_path))
+
+    assert (staging.read, staging.exact_duplicates, staging.size) == (6, 1, 5)
+    assert staging.languages.tolist() == ["english"] * 4 + ["arabic"]
+    assert np.allclose(np.linalg.norm(staging.vectors(), axis=1), 1)
+    rows = pd.concat(chunk for _, chunk in staging.iter_rows(2))
+    assert rows["question"].tolist()[:2] == ["How do I sort a list?", "What is a closure?"]
+    assert rows["answer"].tolist()[3] == "NA"
+
+
+def test_rows_dropped_only_for_kept_earlier_rows(tmp_path):
+    args = _args(tmp_path)
+    staging = _stage(tmp_path, args)
+
+    centres, matches = cluster_rows(staging, args)
+
+    # Staged order: sort?, closure?, sort a list, in place, arabic
+    # "in place" is only close to "sort a list", which was itself dropped
+    assert centres.tolist() == [0, 1, 0, 3, 4]
+    assert matches.tolist() == [-1, -1, 0, 2, -1]
+
+
+def test_outputs_keep_centres_and_report_dropped_rows(tmp_path):
+    args = _args(tmp_path)
+    staging = _stage(tmp_path, args)
+    centres, matches = cluster_rows(staging, args)
+
+    summary = write_outputs(staging, centres, matches, args)
+
+    assert summary == {"kept": 4, "near_duplicates": 1, "clusters": 1, "kept_near": 1}
+    merged = pd.read_csv(args.output, dtype=str, keep_default_na=False)
+    assert merged.columns.tolist() == ["question", "answer", "tag"]
+    assert merged["question"].tolist() == ["How do I sort a list?", "What is a closure?", "Sorting lists in place", "كيف أرتب قائمة؟"]
+    assert merged["answer"].tolist() == ["sorted(items)", "None", "NA", "sorted()"]
+    assert not args.output.with_suffix(".merging.csv").exists()
+
+    with open(args.report, encoding="utf-8", newline="") as f:
+        report = list(csv.DictReader(f))
+    assert [(row["row"], row["kept"], row["matched_row"]) for row in report] == [
+        ("0", "True", "0"), ("2", "False", "0"), ("3", "True", "2")
+    ]
+    assert report[1]["matched_question"] == "How do I sort a list?"
+    assert report[2]["matched_question"] == "How to sort a list"
+    assert float(report[1]["similarity"]) == pytest.approx(np.cos(np.deg2rad(20)), abs=1e-4)
+
+
+def test_dry_run_leaves_the_output_alone(tmp_path):
+    args = _args(tmp_path, dry_run=True)
+    args.output.write_text("untouched", encoding="utf-8")
+    staging = _stage(tmp_path, args)
+
+    write_outputs(staging, *cluster_rows(staging, args), args)
+
+    assert args.output.read_text(encoding="utf-8") == "untouched"
+    assert args.report.exists()
+
+
+def test_inverted_lists_find_the_same_pairs_as_brute_force():
+    rng = np.random.default_rng(0)
+    centres = rng.normal(size=(20, 16))
+    vectors = np.repeat(centres, 10, axis=0) + rng.normal(scale=0.05, size=(200, 16))
+    vectors = (vectors / np.linalg.norm(vectors, axis=1, keepdims=True)).astype(np.float32)
+    rows = np.arange(len(vectors))
+    threshold = 0.97
+
+    scores = vectors @ vectors.T
+    expected = {(i, j) for i, j in zip(*np.nonzero(scores >= threshold)) if i != j}
+    found = set()
+    # nprobe == number of lists: every row is searched against every list
+    for left, right, pair_scores in find_duplicate_pairs(vectors, rows, threshold, top_k=20, nprobe=10, list_size=20, block=16):
+        assert (pair_scores >= threshold).all()
+        found.update(zip(left.tolist(), right.tolist()))
+
+    assert found == expected
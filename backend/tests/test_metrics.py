@@ -0,0 +1,67 @@
+import pytest
+
+from metrics import CONTENT_TYPE, Counter, Histogram, Registry, confidence_bucket
+
+
+def test_counter_renders_one_line_per_label_set():
+    counter = Counter("answers_total", "Answers.", ["source"])
+    counter.inc(source="web")
+    counter.inc(2, source="local")
+    counter.inc(source='odd"\nname')
+
+    assert counter.render() == [
+        "# HELP answers_total Answers.",
+        "# TYPE answers_total counter",
+        'answers_total{source="local"} 2',
+        'answers_total{source="odd\\"\\nname"} 1',
+        'answers_total{source="web"} 1',
+    ]
+
+
+def test_histogram_buckets_are_cumulative():
+    histogram = Histogram("stage_seconds", "Stages.", ["stage"], buckets=(0.1, 1.0))
+    for value in (0.05, 0.1, 0.5, 3.0):
+        histogram.observe(value, stage="encode")
+
+    assert histogram.render()[2:] == [
+        'stage_seconds_bucket{stage="encode",le="0.1"} 2',
+        'stage_seconds_bucket{stage="encode",le="1"} 3',
+        'stage_seconds_bucket{stage="encode",le="+Inf"} 4',
+        'stage_seconds_sum{stage="encode"} 3.65',
+        'stage_seconds_count{stage="encode"} 4',
+    ]
+
+
+def test_histogram_time_records_even_on_error():
+    histogram = Histogram("stage_seconds", "Stages.", ["stage"])
+    with pytest.raises(RuntimeError):
+        with histogram.time(stage="web_fallback"):
+            raise RuntimeError
+
+    assert histogram.render()[-1] == 'stage_seconds_count{stage="web_fallback"} 1'
+
+
+def test_registry_renders_every_metric():
+    registry = Registry()
+    registry.register(Counter("a_total", "A.")).inc()
+    registry.register(Histogram("b_seconds", "B.", buckets=(1.0,))).observe(0.5)
+
+    text = registry.render()
+
+    assert "a_total 1\n" in text
+    assert 'b_seconds_bucket{le="1"} 1\n' in text
+    assert text.endswith("\n")
+    assert CONTENT_TYPE.startswith("text/plain; version=0.0.4")
+
+
+@pytest.mark.parametrize("confidence, bucket", [
+    (0.0, "0.00-0.50"),
+    (0.5, "0.50-0.75"),
+    (0.74, "0.50-0.75"),
+    (0.75, "0.75-0.90"),
+    (0.95, "0.90-1.00"),
+    (1.0, "0.90-1.00"),
+    (1.2, "0.90-1.00"),
+])
+def test_confidence_buckets(confidence, bucket):
+    assert confidence_bucket(confidence) == bucket
@@ -0,0 +1,46 @@
+import numpy as np
+
+import parallel_encoder
+from parallel_encoder import EncoderPool
+
+
+class _InlinePool:
+    """Runs the worker function in this process, in the order imap would return results."""
+
+    def __init__(self):
+        self.batches = []
+
+    def imap(self, func, iterable):
+        for texts in iterable:
+            self.batches.append(texts)
+            yield func(texts)
+
+
+class _LengthEncoder:
+    def encode(self, texts, batch_size=32):
+        return np.array([[len(text), float(text.startswith("x"))] for text in texts], dtype=np.float32)
+
+
+def test_results_come_back_in_input_order(monkeypatch):
+    monkeypatch.setattr(parallel_encoder, "_worker_encoder", _LengthEncoder())
+    pool = EncoderPool("unused", workers=2, batch_size=2)
+    inline = _InlinePool()
+    monkeypatch.setattr(pool, "_start", lambda: inline)
+    texts = ["xxxxx", "a", "xxx", "bb", "cccc", "x"]
+
+    embeddings = pool.encode(texts)
+
+    np.testing.assert_array_equal(embeddings, _LengthEncoder().encode(texts))
+    # Batches hold texts of similar length, so padding is minimal
+    assert inline.batches == [["a", "x"], ["bb", "xxx"], ["cccc", "xxxxx"]]
+
+
+def test_empty_input_starts_no_workers(monkeypatch):
+    def start():
+        raise AssertionError("workers started")
+
+    pool = EncoderPool("unused", workers=2)
+    monkeypatch.setattr(pool, "_start", start)
+
+    assert pool.encode([]).shape == (0, 0)
+    pool.close()
@@ -0,0 +1,20 @@
+from pathlib import Path
+
+import paths
+
+
+def test_defaults_are_under_the_repo_root(monkeypatch):
+    monkeypatch.delenv("CORTEX_KB_CSV", raising=False)
+    monkeypatch.delenv("CORTEX_STATE_DIR", raising=False)
+
+    assert paths.kb_csv_path() == paths.base_dir / "data" / "knowledge_base.csv"
+    assert paths.state_dir() == paths.base_dir
+    assert (paths.base_dir / "backend" / "paths.py").exists()
+
+
+def test_environment_overrides(monkeypatch, tmp_path):
+    monkeypatch.setenv("CORTEX_KB_CSV", str(tmp_path / "kb.csv"))
+    monkeypatch.setenv("CORTEX_STATE_DIR", str(tmp_path / "state"))
+
+    assert paths.kb_csv_path() == tmp_path / "kb.csv"
+    assert paths.state_dir() == Path(tmp_path / "state")
@@ -0,0 +1,118 @@
+import logging
+import multiprocessing
+import os
+import queue
+import runpy
+from logging.handlers import QueueHandler, QueueListener
+from pathlib import Path
+
+import pytest
+
+import log_queue
+from web_search import WebSearcher
+
+GUNICORN_CONF = Path(__file__).resolve().parent.parent / "gunicorn.conf.py"
+
+
+def _run_in_fork(target, *args, timeout=30):
+    """Run `target(*args)` in a forked child; returns what it returned, or fails the test if it hung."""
+    context = multiprocessing.get_context("fork")
+    results = context.Queue()
+    child = context.Process(target=lambda: results.put(target(*args)))
+    child.start()
+    child.join(timeout)
+    if child.is_alive():
+        child.kill()
+        pytest.fail(f"{target.__name__} hung in the forked child")
+    assert child.exitcode == 0
+    return results.get(timeout=1)
+
+
+def _load_conf(monkeypatch, **env):
+    monkeypatch.setattr(os, "environ", {**env})
+    return runpy.run_path(str(GUNICORN_CONF)), os.environ
+
+
+def test_multi_worker_servers_are_read_only(monkeypatch):
+    conf, env = _load_conf(monkeypatch, CORTEX_WORKERS="4")
+
+    assert conf["workers"] == 4 and conf["preload_app"] is True
+    assert env["CORTEX_READ_ONLY"] == "1"
+    assert env["CORTEX_SESSION_STORE"] == "sqlite"
+    assert conf["torch_threads"] == max(1, (os.cpu_count() or 1) // 4)
+
+
+def test_single_worker_server_accepts_writes(monkeypatch):
+    _, env = _load_conf(monkeypatch, CORTEX_WORKERS="1")
+
+    assert "CORTEX_READ_ONLY" not in env
+
+
+def test_debug_records_are_sampled():
+    record = logging.LogRecord("x", logging.DEBUG, __file__, 1, "msg", None, None)
+    warning = logging.LogRecord("x", logging.WARNING, __file__, 1, "msg", None, None)
+
+    assert not log_queue.DebugSampler(logging.INFO, 0.0).filter(record)
+    assert log_queue.DebugSampler(logging.INFO, 1.0).filter(record)
+    assert log_queue.DebugSampler(logging.INFO, 0.0).filter(warning)
+
+
+def _log_after_fork(path):
+    log_queue.after_fork()
+    logging.getLogger("prefork-test").warning("from the child")
+    log_queue.stop()
+    return Path(path).read_text(encoding="utf-8")
+
+
+def test_logging_works_in_a_forked_worker(tmp_path, monkeypatch):
+    # The parent's listener is never started: only the child's, from after_fork, can write the file
+    handler = QueueHandler(queue.SimpleQueue())
+    monkeypatch.setattr(log_queue, "_handler", handler)
+    monkeypatch.setattr(log_queue, "_listener", QueueListener(handler.queue, logging.FileHandler(tmp_path / "log.txt")))
+    logger = logging.getLogger("prefork-test")
+    monkeypatch.setattr(logger, "handlers", [handler])
+    monkeypatch.setattr(logger, "propagate", False)
+
+    assert "from the child" in _run_in_fork(_log_after_fork, tmp_path / "log.txt")
+
+
+class _Provider:
+    name = "test"
+
+    def search(self, query):
+        return {"answer": f"answer for {query}", "source": "s", "title": "t"}
+
+
+def _web_search_after_fork(searcher):
+    searcher.after_fork()
+    return searcher.search("forked")
+
+
+def test_web_searcher_gets_a_new_pool_after_fork():
+    searcher = WebSearcher(_Provider(), timeout=5.0)
+    searcher.search("warm the parent pool")
+
+    try:
+        assert _run_in_fork(_web_search_after_fork, searcher)["answer"] == "answer for forked"
+    finally:
+        searcher.shutdown()
+
+
+def _search_after_fork(engine):
+    engine.after_fork()
+    return [match["question"] for match in engine.search("what is python", top_k=1)]
+
+
+def test_rag_engine_serves_batched_searches_after_fork(encoder, tmp_path):
+    pytest.importorskip("chromadb")
+    from rag_engine import QAEngineRag
+
+    engine = QAEngineRag(persist_directory=tmp_path / "chroma_db", encoder=encoder)
+    engine.add_qa_pairs([("What is Python?", "A programming language.", None)])
+    engine.enable_batching(window_ms=1.0)
+    engine.search("warm the parent batcher")
+
+    try:
+        assert _run_in_fork(_search_after_fork, engine) == ["What is Python?"]
+    finally:
+        engine.disable_batching()
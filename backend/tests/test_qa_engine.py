@@ -0,0 +1,132 @@
+import pandas as pd
+import pytest
+
+pytest.importorskip("sentence_transformers")
+
+import qa_engine
+from qa_engine import QAEngine, build_qa_engine
+
+
+@pytest.fixture
+def engine(encoder):
+    engine = QAEngine(encoder=encoder)
+    engine.add_qa_pairs([
+        ("What is Python?", "A programming language.", None),
+        ("ما هي البرمجة؟", "كتابة التعليمات للحاسوب.", None),
+    ])
+    return engine
+
+
+def test_exact_match_skips_the_encoder(engine, encoder):
+    encoder.calls.clear()
+
+    result = engine.find_answer("  what IS python ")
+    arabic = engine.find_answer("مَا هِيَ البرمجة")
+
+    assert encoder.calls == []
+    assert (result["match"], result["answer"], result["confidence"]) == ("exact", "A programming language.", 1.0)
+    assert arabic["answer"] == "كتابة التعليمات للحاسوب."
+    # The stored row's vector stands in for the question's own
+    assert result["query_vector"].shape == (32,)
+
+
+def test_other_questions_go_through_the_encoder(engine, encoder):
+    encoder.calls.clear()
+
+    result = engine.find_answer("python programming language")
+
+    assert encoder.calls == [["python programming language"]]
+    assert "match" not in result
+
+
+def test_index_grows_with_added_pairs(encoder):
+    engine = QAEngine(encoder=encoder)
+    engine.index.initial_capacity = 2
+    for i in range(5):
+        engine.add_qa_pairs([(f"question number {i}", f"answer {i}", None)])
+
+    assert len(engine.index) == engine.count() == 5
+    assert engine.index.capacity == 8
+    assert engine.find_answers("question number 3", top_k=1)[0]["answer"] == "answer 3"
+
+
+def test_duplicate_questions_keep_every_row_and_the_first_answers(engine):
+    ids = engine.add_qa_pairs([
+        ("what is python", "Second answer.", None),
+        ("WHAT IS PYTHON!", "Third answer.", None),
+    ])
+
+    assert ids == ["2", "3"]
+    assert engine.count() == 4
+    assert engine.exact_index["what is python"] == [0, 2, 3]
+    assert engine.find_answer("What is Python")["answer"] == "A programming language."
+
+
+def test_snapshot_roundtrip_answers_without_reencoding(engine, encoder, tmp_path):
+    engine.save_snapshot(tmp_path, {"csv": "kb.csv", "size": 1})
+    encoder.calls.clear()
+
+    restored = QAEngine(encoder=encoder)
+    assert restored.load_snapshot(tmp_path, {"csv": "kb.csv", "size": 1})
+
+    assert encoder.calls == []
+    assert restored.count() == 2
+    assert restored.find_answer("what is python")["answer"] == "A programming language."
+    # Rows added after loading are searched and matched alongside the mapped ones
+    restored.add_qa_pairs([("what is rust", "A systems language.", None), ("what is python", "Later answer.", None)])
+    assert restored.find_answer("What is Rust?")["answer"] == "A systems language."
+    assert restored.find_answer("what is python")["answer"] == "A programming language."
+    assert restored.find_answers("what is rust", top_k=1)[0]["index"] == 2
+
+
+def test_snapshot_for_another_encoder_or_source_is_not_used(engine, encoder, tmp_path):
+    engine.save_snapshot(tmp_path, {"csv": "kb.csv", "size": 1})
+
+    assert not QAEngine(encoder=encoder).load_snapshot(tmp_path, {"csv": "kb.csv", "size": 2})
+    encoder.model_name = "another-encoder"
+    assert not QAEngine(encoder=encoder).load_snapshot(tmp_path, {"csv": "kb.csv", "size": 1})
+
+
+def test_build_reuses_the_snapshot_until_the_csv_changes(encoder, tmp_path, monkeypatch):
+    monkeypatch.setattr(qa_engine, "build_encoder", lambda model_name, backend: encoder)
+    csv_path = tmp_path / "kb.csv"
+    pd.DataFrame({"question": ["what is python", "what is rust"], "answer": ["a1", "a2"]}).to_csv(csv_path, index=False)
+
+    build_qa_engine(csv_path=csv_path, state_dir=tmp_path)
+    encoder.calls.clear()
+    reused = build_qa_engine(csv_path=csv_path, state_dir=tmp_path)
+    assert "snapshot_load_s" in reused.startup_timings
+    assert encoder.calls == []
+
+    pd.DataFrame({"question": ["what is go"], "answer": ["a3"]}).to_csv(csv_path, mode="a", header=False, index=False)
+    rebuilt = build_qa_engine(csv_path=csv_path, state_dir=tmp_path)
+    assert "snapshot_load_s" not in rebuilt.startup_timings
+    assert rebuilt.count() == 3
+    # Only the new question is encoded, the others come from the embedding cache
+    assert encoder.calls == [["what is go"]]
+
+
+def test_every_write_bumps_the_generation(engine):
+    generation = engine.generation
+    engine.add_qa_pair("What is Go?", "A compiled language.")
+
+    assert engine.generation > generation
+
+
+def test_context_and_plain_variants_share_one_encode(engine, encoder):
+    encoder.calls.clear()
+
+    result = engine.find_answer("is python fast", context="weather tomorrow rain")
+
+    assert encoder.calls == [["is python fast [السياق: weather tomorrow rain]", "is python fast"]]
+    assert result["query_vector"].shape == (32,)
+
+
+def test_context_vector_lookup_encodes_only_the_question(engine, encoder):
+    context = engine.embed_question("What is Python?")
+    encoder.calls.clear()
+
+    result = engine.find_answer("is it fast", context_vector=context)
+
+    assert encoder.calls == [["is it fast"]]
+    assert result["query_vector"].shape == (32,)
@@ -0,0 +1,270 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+pytest.importorskip("chromadb")
+pytest.importorskip("sentence_transformers")
+
+import rag_engine
+from rag_engine import QAEngineRag, parse_partitions
+
+
+def _write_csv(path, rows):
+    pd.DataFrame(rows, columns=["question", "answer"]).to_csv(path, index=False, encoding="utf-8")
+    return path
+
+
+def _exact_state(engine):
+    return (
+        {key: sorted(entries) for key, entries in engine.exact_index.items()},
+        dict(engine._exact_keys),
+        sorted(engine._exact_vectors),
+        engine.lexical_index.stats(),
+    )
+
+
+def _assert_matches_full_rebuild(engine):
+    incremental = _exact_state(engine)
+    engine.rebuild_exact_index()
+    assert incremental == _exact_state(engine)
+
+
+@pytest.fixture
+def engine(encoder, tmp_path):
+    engine = QAEngineRag(persist_directory=tmp_path / "chroma_db", encoder=encoder)
+    engine.add_qa_pairs([
+        ("What is Python?", "A programming language.", None),
+        ("ما هي البرمجة؟", "كتابة التعليمات للحاسوب.", None),
+    ])
+    return engine
+
+
+def test_exact_match_skips_the_encoder_and_chroma(engine, encoder, monkeypatch):
+    encoder.calls.clear()
+    monkeypatch.setattr(engine, "collection", None)
+
+    result = engine.find_answer("  what IS python ")
+    arabic = engine.find_answer("مَا هِيَ البرمجة")
+
+    assert encoder.calls == []
+    assert (result["match"], result["answer"], result["confidence"]) == ("exact", "A programming language.", 1.0)
+    assert arabic["answer"] == "كتابة التعليمات للحاسوب."
+    assert result["query_vector"].shape == (32,)
+
+
+def test_exact_index_is_rebuilt_from_the_store(engine, encoder, tmp_path):
+    reopened = QAEngineRag(persist_directory=tmp_path / "chroma_db", encoder=encoder)
+    encoder.calls.clear()
+
+    assert reopened.find_answer("what is python")["match"] == "exact"
+    assert reopened.count() == 2
+    assert encoder.calls == []
+
+
+def test_reload_embeds_only_new_and_changed_questions(encoder, tmp_path):
+    csv_path = _write_csv(tmp_path / "kb.csv", [(f"question {i}", f"answer {i}") for i in range(5)])
+    engine = QAEngineRag(persist_directory=tmp_path / "chroma_db", encoder=encoder)
+    engine.load_from_csv(csv_path)
+    assert sum(len(call) for call in encoder.calls) == 5
+
+    encoder.calls.clear()
+    engine.load_from_csv(csv_path)
+    assert encoder.calls == []
+
+    # New answer for question 0 reuses its vector, question 1 is reworded, question 4 is gone
+    _write_csv(csv_path, [
+        ("question 0", "new answer 0"),
+        ("question one", "answer 1"),
+        ("question 2", "answer 2"),
+        ("question 3", "answer 3"),
+    ])
+    generation = engine.generation
+    engine.load_from_csv(csv_path)
+
+    assert encoder.calls == [["question one"]]
+    assert engine.generation > generation
+    assert engine.count() == engine.collection.count() == 4
+    assert engine.find_answer("question 0")["answer"] == "new answer 0"
+    assert engine.find_answer("question 4")["question"] != "question 4"
+    _assert_matches_full_rebuild(engine)
+
+
+def test_store_built_with_another_encoder_is_rebuilt(engine, encoder, tmp_path):
+    encoder.model_name = "another-encoder"
+    reopened = QAEngineRag(persist_directory=tmp_path / "chroma_db", encoder=encoder)
+
+    assert reopened.collection.count() == 0
+    assert reopened.count() == 0
+    assert reopened.collection.metadata["model_name"] == "another-encoder"
+
+
+def test_stream_with_prune_keeps_the_indexes_in_step(encoder, tmp_path, monkeypatch):
+    # Pages smaller than the store, so pruning has to walk several of them
+    monkeypatch.setattr(rag_engine, "WRITE_BATCH_SIZE", 7)
+    csv_path = _write_csv(tmp_path / "kb.csv", [(f"question {i}", f"answer {i}") for i in range(40)])
+    engine = QAEngineRag(persist_directory=tmp_path / "chroma_db", encoder=encoder)
+    engine.stream_from_csv(csv_path, chunk_size=6)
+    assert engine.count() == 40
+
+    # Every other row dropped, a few answers changed
+    _write_csv(csv_path, [(f"question {i}", f"answer {i}" if i % 4 else f"new answer {i}") for i in range(0, 40, 2)])
+    encoder.calls.clear()
+    engine.stream_from_csv(csv_path, chunk_size=6, prune=True)
+
+    assert encoder.calls == []
+    assert engine.count() == engine.collection.count() == 20
+    assert sorted(m["question"] for m in engine.collection.get(include=["metadatas"])["metadatas"]) == \
+        sorted(f"question {i}" for i in range(0, 40, 2))
+    assert engine.find_answer("question 4")["answer"] == "new answer 4"
+    assert engine.find_answer("question 3")["question"] != "question 3"
+    _assert_matches_full_rebuild(engine)
+
+
+def test_stream_resumes_from_checkpoint(encoder, tmp_path):
+    csv_path = _write_csv(tmp_path / "kb.csv", [(f"question {i}", f"answer {i}") for i in range(10)])
+    checkpoint_path = tmp_path / "checkpoint.json"
+    engine = QAEngineRag(persist_directory=tmp_path / "chroma_db", encoder=encoder)
+
+    # A run that stopped after its first chunk of 4 rows
+    stat = csv_path.stat()
+    engine._write_checkpoint(checkpoint_path, {
+        "csv_path": str(csv_path.resolve()), "size": stat.st_size, "mtime": stat.st_mtime,
+        "run_id": "interrupted", "rows_committed": 4,
+    })
+    engine.stream_from_csv(csv_path, chunk_size=4, checkpoint_path=checkpoint_path)
+
+    assert sorted(q for call in encoder.calls for q in call) == sorted(f"question {i}" for i in range(4, 10))
+    assert not checkpoint_path.exists()
+
+
+def test_every_write_bumps_the_generation(engine):
+    generations = [engine.generation]
+    [item_id] = engine.add_qa_pairs([("What is Go?", "A compiled language.", None)])
+    generations.append(engine.generation)
+    engine.delete_by_id(item_id)
+    generations.append(engine.generation)
+    engine._clear_collection()
+    generations.append(engine.generation)
+
+    assert generations == sorted(set(generations))
+    assert engine.find_answer("what is go")["question"] is None
+
+
+def test_context_vector_lookup_encodes_only_the_question(engine, encoder):
+    context = engine.embed_question("What is Python?")
+    encoder.calls.clear()
+
+    result = engine.find_answer("is it fast", context_vector=context)
+
+    assert [text for call in encoder.calls for text in call] == ["is it fast"]
+    assert result["query_vector"].shape == (32,)
+
+
+def test_context_and_plain_variants_share_one_encode_and_query(engine, encoder, monkeypatch):
+    batches = []
+    run_search_batch = engine._run_search_batch
+    monkeypatch.setattr(engine, "_run_search_batch", lambda queries, **kwargs: batches.append(list(queries)) or run_search_batch(queries, **kwargs))
+    encoder.calls.clear()
+
+    # The context drags the first variant down; the plain question's results win
+    result = engine.find_answer("python what is it", min_confidence=0.99, context="weather tomorrow rain")
+
+    assert len(batches) == 1 and len(batches[0]) == 2
+    assert len(encoder.calls) == 1 and len(encoder.calls[0]) == 2
+    with_context = engine.search("python what is it", top_k=1, context="weather tomorrow rain")[0]["confidence"]
+    assert result["top_matches"][0]["question"] == "What is Python?"
+    assert result["confidence"] > with_context
+
+
+def test_exact_hit_returns_the_stored_vector(engine, encoder):
+    stored = engine.collection.get(ids=[engine._make_id("What is Python?")], include=["embeddings"])["embeddings"][0]
+
+    result = engine.find_answer("what is python")
+
+    np.testing.assert_allclose(result["query_vector"], stored, rtol=1e-6)
+
+
+def test_parse_partitions():
+    assert parse_partitions(None) is None
+    assert parse_partitions("") == ()
+    assert parse_partitions(" language, category ,") == ("language", "category")
+
+
+def test_unknown_partition_field_is_rejected(encoder, tmp_path):
+    with pytest.raises(ValueError):
+        QAEngineRag(persist_directory=tmp_path / "chroma_db", encoder=encoder, partition_by=("author",))
+
+
+def _partition_ids(engine, field, value):
+    collection = engine._partition_collection(field, value, create=False)
+    return sorted(collection.get()["ids"]) if collection is not None else None
+
+
+def test_filtered_searches_use_the_partition(encoder, tmp_path):
+    engine = QAEngineRag(persist_directory=tmp_path / "chroma_db", encoder=encoder, partition_by=("language", "category"))
+    ids = engine.add_qa_pairs([
+        ("What is Python?", "A programming language.", {"category": "code"}),
+        ("ما هي البرمجة؟", "كتابة التعليمات للحاسوب.", {"category": "code"}),
+        ("What is a noun?", "A word for a thing.", {"category": "grammar"}),
+    ])
+
+    assert _partition_ids(engine, "language", "arabic") == [ids[1]]
+    assert [m["question"] for m in engine.search("what is", language_filter="english", category_filter="grammar")] == \
+        ["What is a noun?"]
+    assert all(m["metadata"]["language"] == "arabic" for m in engine.search("what is python", language_filter="arabic"))
+    assert engine.search("anything", category_filter="missing") == []
+
+    # A changed category moves the row to the new partition
+    engine.add_qa_pairs([("What is Python?", "A programming language.", {"category": "grammar"})])
+    assert _partition_ids(engine, "category", "code") == [ids[1]]
+    assert _partition_ids(engine, "category", "grammar") == sorted([ids[0], ids[2]])
+
+    engine.delete_by_id(ids[2])
+    assert _partition_ids(engine, "category", "grammar") == [ids[0]]
+
+
+def test_partition_layout_is_kept_on_reopen_unless_changed(encoder, tmp_path):
+    engine = QAEngineRag(persist_directory=tmp_path / "chroma_db", encoder=encoder, partition_by=("language",))
+    [item_id] = engine.add_qa_pairs([("What is Python?", "A programming language.", None)])
+
+    kept = QAEngineRag(persist_directory=tmp_path / "chroma_db", encoder=encoder)
+    assert kept.partition_by == ("language",)
+    assert _partition_ids(kept, "language", "english") == [item_id]
+
+    dropped = QAEngineRag(persist_directory=tmp_path / "chroma_db", encoder=encoder, partition_by=())
+    assert dropped.partition_by == ()
+    assert _partition_ids(dropped, "language", "english") is None
+    assert not (tmp_path / "chroma_db" / "partitions.json").exists()
+
+
+def test_lexical_mode_never_uses_the_encoder(encoder, tmp_path):
+    engine = QAEngineRag(persist_directory=tmp_path / "chroma_db", encoder=encoder, search_mode="lexical")
+    engine.add_qa_pairs([("What is Python?", "A programming language.", None), ("What is Rust?", "A systems language.", None)])
+    encoder.calls.clear()
+
+    # Same words in another order: not an exact match, a full keyword match
+    result = engine.find_answer("python, what is")
+
+    assert encoder.calls == []
+    assert result["question"] == "What is Python?"
+    assert result["query_vector"] is None
+    assert engine._exact_vectors == {}
+
+
+def test_hybrid_scores_only_raise_the_dense_confidence(encoder, tmp_path):
+    engine = QAEngineRag(persist_directory=tmp_path / "chroma_db", encoder=encoder, search_mode="hybrid")
+    engine.add_qa_pairs([
+        ("How do I install numpy?", "pip install numpy", None),
+        ("How do I install a kettle?", "Call a plumber.", None),
+        ("numpy array slicing", "Use a[start:stop].", None),
+    ])
+
+    dense = {m["question"]: m["confidence"] for m in engine.search("install numpy on linux", mode="dense")}
+    hybrid = engine.search("install numpy on linux")
+
+    assert hybrid[0]["question"] == "How do I install numpy?"
+    for match in hybrid:
+        dense_score, lexical_score = match["scores"]["dense"], match["scores"]["lexical"]
+        assert dense_score == pytest.approx(dense[match["question"]], abs=1e-5)
+        assert match["confidence"] == pytest.approx(1 - (1 - dense_score) * (1 - engine.lexical_weight * lexical_score))
+        assert match["confidence"] >= dense_score
@@ -0,0 +1,78 @@
+import threading
+
+from request_batcher import RequestBatcher
+
+
+def _submit_concurrently(batcher, requests):
+    results = [None] * len(requests)
+    errors = [None] * len(requests)
+
+    def run(i, queries, top_k):
+        try:
+            results[i] = batcher.submit(queries, top_k)
+        except Exception as e:
+            errors[i] = e
+
+    threads = [threading.Thread(target=run, args=(i, *request)) for i, request in enumerate(requests)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results, errors
+
+
+def test_concurrent_requests_share_one_handler_call():
+    calls = []
+
+    def handler(queries, top_k):
+        calls.append((list(queries), top_k))
+        return [[{"query": q, "rank": r} for r in range(top_k)] for q in queries]
+
+    # A window far longer than it takes to start the threads: every request
+    # lands in the batch the first one opened
+    batcher = RequestBatcher(handler, window_ms=500.0, max_batch_size=32)
+    requests = [([f"q{i}", f"q{i}-ctx"], 1 + i % 3) for i in range(6)]
+    results, errors = _submit_concurrently(batcher, requests)
+    batcher.stop()
+
+    assert errors == [None] * len(requests)
+    assert len(calls) == 1
+    assert sorted(calls[0][0]) == sorted(q for queries, _ in requests for q in queries)
+    assert calls[0][1] == 3
+    for (queries, top_k), result in zip(requests, results):
+        assert [rows[0]["query"] for rows in result] == queries
+        assert all(len(rows) == top_k for rows in result)
+
+
+def test_batch_is_closed_at_max_batch_size():
+    sizes = []
+    batcher = RequestBatcher(lambda queries, top_k: sizes.append(len(queries)) or [[] for _ in queries],
+                             window_ms=200.0, max_batch_size=4)
+
+    _submit_concurrently(batcher, [(["a", "b"], 1)] * 4)
+    batcher.stop()
+
+    assert sum(sizes) == 8
+    assert max(sizes) <= 4
+
+
+def test_handler_error_reaches_every_request_in_the_batch():
+    def handler(queries, top_k):
+        raise RuntimeError("encoder failed")
+
+    batcher = RequestBatcher(handler, window_ms=50.0)
+    results, errors = _submit_concurrently(batcher, [(["a"], 1), (["b"], 1)])
+    batcher.stop()
+
+    assert results == [None, None]
+    assert all(isinstance(e, RuntimeError) for e in errors)
+    assert batcher.stats()["failed_batches"] >= 1
+
+
+def test_stats_track_requests_and_queries():
+    batcher = RequestBatcher(lambda queries, top_k: [[] for _ in queries], window_ms=0.0)
+    batcher.submit(["a", "b"], 1)
+    batcher.stop()
+
+    stats = batcher.stats()
+    assert (stats["total_requests"], stats["total_queries"], stats["total_batches"]) == (1, 2, 1)
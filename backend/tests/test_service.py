@@ -0,0 +1,134 @@
+import pytest
+
+pytest.importorskip("sentence_transformers")
+
+
+def test_repeated_question_is_served_from_the_response_cache(service):
+    first, _ = service.handle_ask({"question": "What is Python?"})
+    encoder_calls = len(service.engine.encoder.calls)
+    # A fresh session: the first one now has a context vector, which is part of the key
+    second, _ = service.handle_ask({"question": "  What is   Python? "})
+
+    assert first["answer"] == second["answer"] == "A programming language."
+    assert (first["cached"], second["cached"]) == (False, True)
+    assert len(service.engine.encoder.calls) == encoder_calls
+
+
+def test_writes_invalidate_cached_answers(service):
+    web, _ = service.handle_ask({"question": "Haskell monads explained"})
+    assert web["source"] == "web"
+    assert service.handle_ask({"question": "Haskell monads explained"})[0]["cached"]
+
+    _, status = service.handle_add({"question": "Haskell monads explained", "answer": "Wrappers with bind and return."})
+    local, _ = service.handle_ask({"question": "Haskell monads explained"})
+
+    assert status == 201
+    assert local["cached"] is False
+    assert (local["source"], local["answer"]) == ("local", "Wrappers with bind and return.")
+
+
+def test_unanswered_questions_are_not_cached(service, monkeypatch):
+    monkeypatch.setattr(service.web_searcher, "search", lambda query: None)
+
+    service.handle_ask({"question": "zzz qqq"})
+    again, _ = service.handle_ask({"question": "zzz qqq"})
+
+    assert again["source"] == "none"
+    assert again["cached"] is False
+
+
+def test_session_context_is_part_of_the_key(service):
+    first, _ = service.handle_ask({"question": "What is Rust?"})
+    followup, _ = service.handle_ask({"question": "What is Rust?", "session_id": first["session_id"]})
+
+    assert followup["has_context"] is True
+    assert followup["cached"] is False
+
+
+def test_follow_up_questions_do_not_reencode_the_history(service):
+    first, _ = service.handle_ask({"question": "What is Python?"})
+    service.engine.encoder.calls.clear()
+
+    service.handle_ask({"question": "and who made it", "session_id": first["session_id"]})
+
+    assert service.engine.encoder.calls == [["and who made it"]]
+
+
+@pytest.mark.parametrize("item, error", [
+    ({"question": "q"}, "Both 'question' and 'answer' are required"),
+    ({"question": 1, "answer": "a"}, "Question and answer must be strings"),
+    ({"question": " ", "answer": "a"}, "Question and answer cannot be empty"),
+    ({"question": "q", "answer": "a", "metadata": ["x"]}, "Metadata must be an object"),
+    ({"question": "q", "answer": "a", "metadata": {"tags": ["x"]}}, "Metadata value for 'tags' must be a string, number or boolean"),
+])
+def test_invalid_pairs_are_rejected(service, item, error):
+    assert service.validate_pair(item) == (None, error)
+
+
+def test_valid_pairs_are_stripped(service):
+    pair, error = service.validate_pair({"question": " q ", "answer": " a ", "metadata": {"n": 1, "ok": True}})
+
+    assert error is None
+    assert pair == ("q", "a", {"n": 1, "ok": True})
+
+
+def test_batch_adds_valid_items_in_chunks(service, monkeypatch):
+    calls = []
+    add_qa_pairs = service.engine.add_qa_pairs
+    monkeypatch.setattr(service.engine, "add_qa_pairs", lambda pairs: calls.append(len(pairs)) or add_qa_pairs(pairs))
+    monkeypatch.setattr(service, "ADD_BATCH_CHUNK", 2)
+    items = [{"question": f"Batch question {i}?", "answer": f"Batch answer {i}."} for i in range(5)]
+    items.insert(2, {"question": "no answer"})
+    items.insert(4, ValueError("Line 5 is not valid JSON"))
+
+    body, status = service.handle_add_batch(items)
+
+    assert status == 207
+    assert (body["added"], body["failed"]) == (5, 2)
+    assert [result["status"] for result in body["results"]] == ["added", "added", "error", "added", "error", "added", "added"]
+    assert body["results"][4]["error"] == "Line 5 is not valid JSON"
+    assert calls == [2, 2, 1]
+    assert body["total_items"] == service.engine.count()
+    assert service.handle_ask({"question": "batch question 3"})[0]["answer"] == "Batch answer 3."
+
+
+def test_batch_limits(service, monkeypatch):
+    monkeypatch.setattr(service, "ADD_BATCH_MAX", 2)
+    body, status = service.handle_add_batch({"question": f"Limit question {i}?", "answer": "a"} for i in range(5))
+
+    assert status == 207
+    assert body["added"] == 2
+    assert body["results"][-1]["error"] == "Batch limit of 2 items reached, rest ignored"
+    assert service.handle_add_batch([]) == ({"error": "No Q&A pairs in the request body"}, 400)
+
+
+def test_writes_are_refused_on_a_read_only_server(service, monkeypatch):
+    monkeypatch.setattr(service, "READ_ONLY", True)
+
+    assert service.handle_add({"question": "q", "answer": "a"})[1] == 503
+    assert service.handle_add_batch([{"question": "q", "answer": "a"}])[1] == 503
+
+
+def test_ndjson_lines_split_across_chunks(service):
+    chunks = [b'{"question": "a", "ans', b'wer": "b"}\n\n{bad', b'}\n{"question": "c", "answer": "d"}']
+
+    items = list(service.iter_ndjson(service.split_lines(chunks)))
+
+    assert items[0] == {"question": "a", "answer": "b"}
+    assert isinstance(items[1], ValueError) and str(items[1]).startswith("Line 3 is not valid JSON")
+    assert items[2] == {"question": "c", "answer": "d"}
+
+
+def test_body_size_limit_ends_the_stream(service):
+    items = list(service.split_lines([b"line one\nline", b" two\n", b"x" * 10], max_bytes=20))
+
+    assert items[:2] == [b"line one", b"line two"]
+    assert isinstance(items[-1], ValueError)
+
+
+def test_json_array_body(service):
+    assert service.parse_json_array(b'[{"question": "q", "answer": "a"}]') == ([{"question": "q", "answer": "a"}], None)
+    assert service.parse_json_array(b'{"question": "q"}')[1][1] == 400
+    assert service.parse_json_array(b"[")[1][1] == 400
+    assert service.is_ndjson("application/x-ndjson; charset=utf-8")
+    assert not service.is_ndjson("application/json")
@@ -0,0 +1,209 @@
+import multiprocessing
+
+import numpy as np
+import pytest
+
+from conversation_manager import ConversationManager
+from session_store import MemorySessionStore, Message, SQLiteSessionStore, fold_context
+
+
+def _message(now, text="question", answer="answer"):
+    return Message(text, answer, 0.9, now)
+
+
+def test_expiry_removes_only_idle_sessions():
+    store = MemorySessionStore(max_history=5, session_timeout=60)
+    store.create("a", 0)
+    store.create("b", 1)
+    store.create("c", 2)
+    # Activity moves "a" behind the others
+    store.append("a", _message(50))
+
+    assert store.expire(63) == 2
+    assert list(store.sessions) == ["a"]
+    assert store.history("a", 100)[0].timestamp == 50
+    assert store.history("a", 111) is None
+    assert store.stats()["expired"] == 3
+
+
+def test_message_for_an_expired_session_starts_a_fresh_one():
+    store = MemorySessionStore(max_history=5, session_timeout=60)
+    store.append("a", _message(0, "old"))
+    store.append("a", _message(100, "new"))
+
+    assert [m.question for m in store.history("a", 100)] == ["new"]
+    assert store.info("a")[0] == 100
+
+
+def test_history_is_bounded_and_memory_follows_it():
+    store = MemorySessionStore(max_history=2, session_timeout=60)
+    for i, text in enumerate(["one", "two", "three"]):
+        store.append("a", _message(i, text, "é"))
+
+    assert [m.question for m in store.history("a", 3)] == ["two", "three"]
+    assert store.memory_bytes == len("two") + len("three") + 2 * len("é".encode("utf-8"))
+
+    store.delete("a")
+    assert store.memory_bytes == 0
+    assert store.count() == 0
+
+
+def test_least_recently_active_sessions_are_evicted_past_max_sessions():
+    store = MemorySessionStore(max_history=5, session_timeout=60, max_sessions=2)
+    store.create("a", 0)
+    store.create("b", 1)
+    store.append("a", _message(2))
+    store.create("c", 3)
+
+    assert list(store.sessions) == ["a", "c"]
+    assert store.evicted == 1
+
+
+def test_memory_cap_evicts_others_but_keeps_the_active_session():
+    store = MemorySessionStore(max_history=5, session_timeout=60, max_memory_bytes=100)
+    store.append("a", _message(0, "q" * 40, "a" * 40))
+    store.append("b", _message(1, "q" * 20))
+    store.append("c", _message(2, "q" * 200))
+
+    assert list(store.sessions) == ["c"]
+    assert store.memory_bytes == 200 + len("answer")
+    assert store.evicted == 2
+
+
+def test_context_vector_is_a_decayed_sum_of_unit_turns():
+    store = MemorySessionStore(max_history=1, session_timeout=60, context_decay=0.5)
+    store.append("a", _message(0), np.array([3.0, 0.0]))
+    store.append("a", _message(1), np.array([0.0, 2.0]))
+
+    np.testing.assert_allclose(store.context_vector("a", 2), [0.5, 1.0])
+    # The context outlives the bounded text history
+    assert len(store.history("a", 2)) == 1
+    assert store.memory_bytes == len("question") + len("answer") + 2 * 4
+
+
+def test_fold_context_normalizes_each_turn():
+    first = fold_context(None, np.array([0.0, 4.0]), 0.5)
+    np.testing.assert_allclose(first, [0.0, 1.0])
+    np.testing.assert_allclose(fold_context(first, np.array([2.0, 0.0]), 0.25), [1.0, 0.25])
+
+
+def test_manager_reports_sessions():
+    manager = ConversationManager(max_history=3, session_timeout_minutes=1)
+    session_id = manager.create_session()
+    for i in range(4):
+        manager.add_message(session_id, f"q{i}", f"a{i}", 0.9)
+
+    assert manager.get_last_n_questions(session_id, 2) == ["q2", "q3"]
+    assert manager.get_session_info(session_id)["message_count"] == 3
+    assert manager.get_context_vector(session_id) is None
+    manager.clear_session(session_id)
+    assert manager.get_session_info(session_id) is None
+    assert manager.session_count() == 0
+
+
+@pytest.fixture
+def sqlite_store(tmp_path):
+    stores = []
+
+    def open_store(**kwargs):
+        # Long intervals: the tests flush and expire explicitly
+        kwargs = {"max_history": 3, "session_timeout": 60, "flush_interval": 3600, "expire_interval": 3600, **kwargs}
+        store = SQLiteSessionStore(tmp_path / "sessions.db", **kwargs)
+        stores.append(store)
+        return store
+
+    yield open_store
+    for store in stores:
+        store.close()
+
+
+def test_sqlite_reads_include_unflushed_writes(sqlite_store):
+    store = sqlite_store()
+    store.create("a", 0)
+    store.append("a", _message(1, "q1"))
+    store.append("a", _message(2, "q2"))
+
+    assert [m.question for m in store.history("a", 3)] == ["q1", "q2"]
+    store.flush()
+    store.append("a", _message(3, "q3"))
+    assert [m.question for m in store.history("a", 4)] == ["q1", "q2", "q3"]
+    assert store.stats()["pending_writes"] == 1
+
+
+def test_sqlite_sessions_are_shared_through_the_database(sqlite_store):
+    writer = sqlite_store()
+    reader = sqlite_store()
+    for i in range(5):
+        writer.append("a", _message(i, f"q{i}"))
+    assert reader.history("a", 5) is None
+
+    writer.flush()
+
+    assert [m.question for m in reader.history("a", 5)] == ["q2", "q3", "q4"]
+    assert reader.info("a")[2] == 3
+
+
+def _append_in_child(path, session_id):
+    store = SQLiteSessionStore(path, 3, 60, flush_interval=3600, expire_interval=3600)
+    store.append(session_id, _message(1, "from child"))
+    store.close()
+
+
+def test_sqlite_store_survives_fork(sqlite_store, tmp_path):
+    store = sqlite_store()
+    store.append("parent", _message(0))
+    context = multiprocessing.get_context("fork")
+    child = context.Process(target=_append_in_child, args=(tmp_path / "sessions.db", "child"))
+    child.start()
+    child.join()
+
+    assert child.exitcode == 0
+    assert [m.question for m in store.history("child", 2)] == ["from child"]
+    assert store.history("parent", 2) is not None
+
+
+def test_sqlite_context_vector_folds_each_turn_once(sqlite_store):
+    store = sqlite_store()
+    memory = MemorySessionStore(max_history=3, session_timeout=60)
+    turns = [np.array([1.0, 0.0]), np.array([0.0, 1.0]), np.array([1.0, 1.0])]
+    for i, embedding in enumerate(turns):
+        store.append("a", _message(i), embedding)
+        memory.append("a", _message(i), embedding)
+        if i == 1:
+            store.flush()
+
+    np.testing.assert_allclose(store.context_vector("a", 3), memory.context_vector("a", 3), rtol=1e-6)
+    store.flush()
+    np.testing.assert_allclose(store.context_vector("a", 3), memory.context_vector("a", 3), rtol=1e-6)
+
+
+def test_sqlite_expiry_and_max_sessions(sqlite_store):
+    store = sqlite_store(max_sessions=2)
+    for i, session_id in enumerate(["a", "b", "c", "d"]):
+        store.append(session_id, _message(i * 10))
+    store.flush()
+
+    assert store.expire(65) == 1
+    assert store.history("a", 65) is None
+    assert store.history("b", 65) is None
+    assert store.history("d", 65) is not None
+    assert store.stats()["evicted"] == 1
+
+
+def test_sqlite_memory_cap_keeps_the_most_recent_sessions(sqlite_store):
+    store = sqlite_store(max_memory_bytes=250)
+    for i in range(5):
+        store.append(f"s{i}", _message(i, "q" * 94))
+    store.flush()
+
+    store.expire(5)
+
+    # 100 bytes a session: the two most recent fit
+    assert [i for i in range(5) if store.history(f"s{i}", 5) is not None] == [3, 4]
+    stats = store.stats()
+    assert (stats["evicted"], stats["memory_bytes"]) == (3, 200)
+
+
+def test_unknown_backend_is_rejected():
+    with pytest.raises(ValueError):
+        ConversationManager(backend="redis")
@@ -0,0 +1,77 @@
+import json
+
+import numpy as np
+
+from snapshot import TextColumn, load_snapshot, save_snapshot, text_hash
+
+
+def _save(directory, questions=("q1", "سؤال", ""), meta=None):
+    questions = list(questions)
+    embeddings = np.arange(len(questions) * 4, dtype=np.float32).reshape(len(questions), 4)
+    save_snapshot(directory, embeddings, questions, [f"answer to {q}" for q in questions], questions, meta or {"encoder": "m"})
+    return embeddings
+
+
+def test_roundtrip_is_memory_mapped(tmp_path):
+    embeddings = _save(tmp_path)
+
+    snapshot = load_snapshot(tmp_path)
+
+    assert isinstance(snapshot["embeddings"], np.memmap)
+    np.testing.assert_array_equal(snapshot["embeddings"], embeddings)
+    assert list(snapshot["questions"]) == ["q1", "سؤال", ""]
+    assert snapshot["answers"][-1] == "answer to "
+    assert snapshot["meta"]["encoder"] == "m"
+    assert snapshot["meta"]["rows"] == 3
+
+
+def test_exact_hashes_are_sorted_with_their_rows(tmp_path):
+    questions = ["b", "a", "c", "a"]
+    _save(tmp_path, questions)
+
+    snapshot = load_snapshot(tmp_path)
+    hashes, rows = snapshot["exact_hashes"], snapshot["exact_rows"]
+
+    assert np.all(hashes[:-1] <= hashes[1:])
+    assert [int(h) for h in hashes] == [text_hash(questions[row]) for row in rows]
+    # Duplicates stay in row order, so a lookup finds the first one
+    duplicates = [int(row) for row in rows if questions[row] == "a"]
+    assert duplicates == [1, 3]
+
+
+def test_empty_snapshot_loads(tmp_path):
+    save_snapshot(tmp_path, np.empty((0, 4), dtype=np.float32), [], [], [], {})
+
+    snapshot = load_snapshot(tmp_path)
+
+    assert len(snapshot["questions"]) == 0
+    assert snapshot["embeddings"].shape == (0, 4)
+
+
+def test_incomplete_or_old_snapshots_are_ignored(tmp_path):
+    assert load_snapshot(tmp_path) is None
+
+    _save(tmp_path)
+    meta_path = tmp_path / "meta.json"
+    meta = json.loads(meta_path.read_text(encoding="utf-8"))
+    meta_path.write_text(json.dumps({**meta, "version": 0}), encoding="utf-8")
+    assert load_snapshot(tmp_path) is None
+
+    meta_path.write_text(json.dumps({**meta, "rows": 5}), encoding="utf-8")
+    assert load_snapshot(tmp_path) is None
+
+    meta_path.write_text("{", encoding="utf-8")
+    assert load_snapshot(tmp_path) is None
+
+
+def test_text_column_appends_on_top_of_the_mapped_part(tmp_path):
+    TextColumn.save(["one", "two"], tmp_path / "texts")
+    column = TextColumn.load(tmp_path / "texts")
+
+    column.append("three")
+    column.extend(["four", "five"])
+
+    assert len(column) == 5
+    assert list(column) == ["one", "two", "three", "four", "five"]
+    assert column[-1] == "five"
+    assert column[1] == "two"
@@ -0,0 +1,45 @@
+import csv
+import random
+from collections import Counter
+
+from benchmarks.synthetic_kb import generate_rows, reword_question, write_kb
+from text_normalization import detect_language, normalize_question
+
+
+def test_rows_are_deterministic_per_seed():
+    assert list(generate_rows(50, seed=1)) == list(generate_rows(50, seed=1))
+    assert list(generate_rows(50, seed=1)) != list(generate_rows(50, seed=2))
+
+
+def test_questions_stay_unique_past_the_template_space():
+    # Enough rows to wrap the German templates more than once
+    questions = [row[0] for row in generate_rows(60000)]
+
+    assert len(set(questions)) == len(questions)
+    assert any(question.endswith("(1)") for question in questions)
+
+
+def test_language_mix_and_labels():
+    rows = list(generate_rows(2000))
+    shares = Counter(row[2] for row in rows)
+
+    assert abs(shares["arabic"] / len(rows) - 0.45) < 0.05
+    assert all(detect_language(question) == ("arabic" if language == "arabic" else "english")
+               for question, _, language, _ in rows)
+
+
+def test_write_kb(tmp_path):
+    path = write_kb(tmp_path / "nested" / "kb.csv", 25, chunk_size=10)
+
+    with open(path, encoding="utf-8", newline="") as f:
+        rows = list(csv.reader(f))
+    assert rows[0] == ["question", "answer", "language", "category"]
+    assert rows[1:] == list(generate_rows(25))
+
+
+def test_reworded_questions_miss_the_exact_index():
+    rng = random.Random(0)
+    for question, _, _, _ in generate_rows(200):
+        reworded = reword_question(question, rng)
+        assert normalize_question(reworded) != normalize_question(question)
+        assert reworded == reworded.lower()
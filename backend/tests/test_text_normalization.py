@@ -0,0 +1,41 @@
+import pandas as pd
+import pytest
+
+from text_normalization import detect_language, detect_languages, normalize_question
+
+
+@pytest.mark.parametrize("a, b", [
+    ("What is Python?", "what is python"),
+    ("  WHAT   is\tpython !! ", "what is python"),
+    ("Ｐｙｔｈｏｎ", "python"),
+    ("STRASSE", "strasse"),
+    # Harakat and tatweel
+    ("مَا هِيَ البرمـــجة؟", "ما هي البرمجة"),
+    # Hamza/madda alef variants and alef maqsura
+    ("أين إسم آخر", "اين اسم اخر"),
+    ("متى", "متي"),
+    ("«ما هي البرمجة»،", "ما هي البرمجة"),
+])
+def test_equivalent_questions_share_a_key(a, b):
+    assert normalize_question(a) == normalize_question(b)
+
+
+@pytest.mark.parametrize("a, b", [
+    ("what is c++", "what is c"),
+    ("what is c#", "what is c"),
+    ("what does __init__ do", "what does init do"),
+])
+def test_technical_symbols_are_kept(a, b):
+    assert normalize_question(a) != normalize_question(b)
+
+
+def test_output_is_already_normalized():
+    key = normalize_question("  Qu'est-ce que «Python» ? ")
+    assert normalize_question(key) == key
+
+
+def test_detect_languages_matches_detect_language():
+    texts = ["What is Python?", "ما هي البرمجة؟", "Python هي لغة", "123 + 456", "", "Straße", "日本語"]
+
+    assert detect_languages(pd.Series(texts)).tolist() == [detect_language(text) for text in texts]
+    assert detect_languages(pd.Series(texts)).tolist() == ["english", "arabic", "arabic", "other", "other", "english", "other"]
@@ -0,0 +1,83 @@
+import numpy as np
+
+from vector_index import ExactIndex, blend_context, normalize_rows
+
+
+def _brute_force(vectors, queries, k):
+    scores = normalize_rows(queries) @ normalize_rows(vectors).T
+    top = np.argsort(-scores, axis=1, kind="stable")[:, :k]
+    return top, np.take_along_axis(scores, top, axis=1)
+
+
+def test_capacity_doubles_and_keeps_rows():
+    rng = np.random.default_rng(0)
+    index = ExactIndex(initial_capacity=4)
+    added = []
+    capacities = []
+    for size in (3, 2, 4, 1, 9):
+        batch = rng.normal(size=(size, 8)).astype(np.float32)
+        index.add(batch)
+        added.append(batch)
+        capacities.append(index.capacity)
+
+    assert capacities == [4, 8, 16, 16, 32]
+    assert len(index) == 19
+    np.testing.assert_allclose(index.vectors, normalize_rows(np.vstack(added)), rtol=1e-6)
+
+
+def test_search_matches_brute_force():
+    rng = np.random.default_rng(1)
+    vectors = rng.normal(size=(300, 16))
+    queries = rng.normal(size=(40, 16))
+    # Several query blocks and a partial last one
+    index = ExactIndex(initial_capacity=8, query_block=16)
+    index.add(vectors[:100])
+    index.add(vectors[100:])
+
+    top, scores = index.search(queries, 5)
+    expected_top, expected_scores = _brute_force(vectors, queries, 5)
+
+    np.testing.assert_array_equal(top, expected_top)
+    np.testing.assert_allclose(scores, expected_scores, rtol=1e-5)
+
+
+def test_top_k_is_capped_at_index_size():
+    index = ExactIndex()
+    assert index.search(np.ones((2, 3)), 5)[0].shape == (2, 0)
+
+    index.add(np.eye(3))
+    top, scores = index.search(np.array([[0.0, 1.0, 0.1]]), 10)
+    assert top.tolist() == [[1, 2, 0]]
+    assert scores.shape == (1, 3)
+
+
+def test_attached_rows_are_copied_on_first_add():
+    attached = normalize_rows(np.eye(4))
+    attached.setflags(write=False)  # like a read-only memmap
+    index = ExactIndex(initial_capacity=2)
+    index.attach(attached)
+    assert np.shares_memory(index.vectors, attached)
+
+    index.add(np.ones((1, 4)))
+
+    assert len(index) == 5
+    assert index.capacity == 8
+    assert not np.shares_memory(index.vectors, attached)
+    np.testing.assert_array_equal(index.vectors[:4], attached)
+    assert index.search(np.ones((1, 4)), 1)[0].tolist() == [[4]]
+
+
+def test_reset_replaces_rows():
+    index = ExactIndex(initial_capacity=2)
+    index.add(np.ones((5, 3)))
+    index.reset(np.eye(3))
+
+    assert len(index) == 3
+    np.testing.assert_array_equal(index.vectors, np.eye(3, dtype=np.float32))
+
+
+def test_blend_context_is_unit_length():
+    blended = blend_context(np.array([3.0, 0.0]), np.array([0.0, 5.0]), 0.3)
+
+    assert np.isclose(np.linalg.norm(blended), 1.0)
+    assert blended[0] > blended[1] > 0
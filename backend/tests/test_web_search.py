@@ -0,0 +1,143 @@
+import asyncio
+import threading
+
+import pytest
+
+import web_search
+from web_search import CircuitBreaker, StubProvider, WebSearcher, build_provider
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(web_search.time, "monotonic", lambda: now[0])
+    return now
+
+
+class _Provider:
+    name = "test"
+
+    def __init__(self, result=None, error=None, block=None):
+        self.result = result or {"answer": "an answer", "source": "https://example.invalid", "title": "t"}
+        self.error = error
+        self.block = block
+        self.calls = 0
+
+    def search(self, query):
+        self.calls += 1
+        if self.block is not None:
+            self.block.wait()
+        if self.error is not None:
+            raise self.error
+        return self.result
+
+
+def test_breaker_opens_after_consecutive_failures(clock):
+    breaker = CircuitBreaker(failure_threshold=3, reset_timeout=10.0)
+    breaker.record_failure()
+    breaker.record_failure()
+    breaker.record_success()
+    breaker.record_failure()
+    breaker.record_failure()
+    assert breaker.state == "closed"
+
+    breaker.record_failure()
+    assert breaker.state == "open"
+    assert not breaker.allow()
+    assert breaker.times_opened == 1
+
+
+def test_half_open_breaker_lets_one_trial_through(clock):
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=10.0)
+    breaker.record_failure()
+    clock[0] += 10.0
+
+    assert breaker.state == "half_open"
+    assert breaker.allow()
+    assert not breaker.allow()
+
+    # A failed trial re-opens it for another full timeout
+    breaker.record_failure()
+    assert breaker.state == "open"
+    assert breaker.times_opened == 2
+
+    clock[0] += 10.0
+    assert breaker.allow()
+    breaker.record_success()
+    assert breaker.state == "closed"
+    assert breaker.allow() and breaker.allow()
+
+
+def test_answers_are_cached_by_normalized_query():
+    provider = _Provider()
+    searcher = WebSearcher(provider)
+
+    first = searcher.search("What is  Python?")
+    second = searcher.search("what is python?")
+    searcher.shutdown()
+
+    assert first == second == provider.result
+    assert provider.calls == 1
+
+
+def test_slow_provider_hits_the_deadline():
+    block = threading.Event()
+    searcher = WebSearcher(_Provider(block=block), timeout=0.05, breaker=CircuitBreaker(failure_threshold=1))
+
+    assert searcher.search("slow") is None
+    block.set()
+    searcher.shutdown()
+
+    assert searcher.timeouts == 1
+    assert searcher.breaker.state == "open"
+
+
+def test_open_circuit_skips_the_provider():
+    provider = _Provider(error=RuntimeError("down"))
+    searcher = WebSearcher(provider, breaker=CircuitBreaker(failure_threshold=2, reset_timeout=60.0))
+
+    results = [searcher.search(f"query {i}") for i in range(5)]
+    searcher.shutdown()
+
+    assert results == [None] * 5
+    assert provider.calls == 2
+    assert (searcher.errors, searcher.skipped_open_circuit) == (2, 3)
+
+
+def test_searches_are_rejected_when_every_slot_is_busy():
+    block = threading.Event()
+    provider = _Provider(block=block)
+    searcher = WebSearcher(provider, max_workers=1, max_pending=1, timeout=0.01, breaker=CircuitBreaker(failure_threshold=100))
+
+    for i in range(3):
+        searcher.search(f"query {i}")
+    block.set()
+    searcher.shutdown()
+
+    assert provider.calls <= 2
+    assert searcher.rejected == 1
+
+
+def test_search_async_uses_the_same_cache_and_deadline():
+    provider = _Provider()
+    searcher = WebSearcher(provider, timeout=1.0)
+
+    async def ask_twice():
+        return await searcher.search_async("q"), await searcher.search_async("Q")
+
+    first, second = asyncio.run(ask_twice())
+    searcher.shutdown()
+
+    assert first == second == provider.result
+    assert provider.calls == 1
+
+
+def test_stub_provider_fails_at_its_configured_rate():
+    assert StubProvider(latency_ms=0, failure_rate=0.0).search("q")["answer"] == "Stub web answer for: q"
+    with pytest.raises(RuntimeError):
+        StubProvider(latency_ms=0, failure_rate=1.0).search("q")
+
+
+def test_unknown_provider_is_rejected():
+    with pytest.raises(ValueError):
+        build_provider("bing")
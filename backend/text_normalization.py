@@ -0,0 +1,51 @@
+import re
+import unicodedata
+
+import numpy as np
+import pandas as pd
+
+# Harakat, Quranic marks and tatweel carry no meaning for matching questions
+_ARABIC_DIACRITICS = re.compile(r"[\u0610-\u061A\u064B-\u065F\u0670\u06D6-\u06DC\u06DF-\u06E8\u06EA-\u06ED\u0640]")
+
+# Alef with hamza/madda/wasla -> bare alef, alef maqsura -> yaa
+_ARABIC_LETTER_VARIANTS = str.maketrans({
+    "\u0623": "\u0627",
+    "\u0625": "\u0627",
+    "\u0622": "\u0627",
+    "\u0671": "\u0627",
+    "\u0649": "\u064A",
+})
+
+# Sentence punctuation only: symbols such as + # _ are meaningful in
+# technical questions ("C++", "C#", "__init__") and are kept
+_PUNCTUATION = re.compile(r"[.,!?;:\"'`()\[\]{}\u00AB\u00BB\u060C\u061B\u061F\u2026]")
+
+
+def normalize_question(text: str) -> str:
+    """Canonical form used for exact-match lookups, across case, punctuation and Arabic spelling variants."""
+    text = unicodedata.normalize("NFKC", text).casefold()
+    text = _ARABIC_DIACRITICS.sub("", text)
+    text = text.translate(_ARABIC_LETTER_VARIANTS)
+    text = _PUNCTUATION.sub(" ", text)
+    return " ".join(text.split())
+
+
+_ARABIC_SCRIPT = re.compile(r"[\u0600-\u06FF]")
+_LATIN_LETTER = re.compile(r"[A-Za-z]")
+
+
+def detect_language(text: str) -> str:
+    """"arabic" if the text has any Arabic-script character, else "english" if it has a Latin letter, else "other"."""
+    if _ARABIC_SCRIPT.search(text):
+        return "arabic"
+    if _LATIN_LETTER.search(text):
+        return "english"
+    return "other"
+
+
+def detect_languages(texts: pd.Series) -> np.ndarray:
+    """detect_language over a whole column: one regex pass per script instead of a Python loop per character."""
+    texts = texts.astype(str)
+    arabic = texts.str.contains(_ARABIC_SCRIPT.pattern, regex=True).to_numpy()
+    latin = texts.str.contains(_LATIN_LETTER.pattern, regex=True).to_numpy()
+    return np.select([arabic, latin], ["arabic", "english"], default="other")
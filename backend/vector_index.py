@@ -0,0 +1,114 @@
+from typing import Optional, Tuple
+
+import numpy as np
+
+
+def normalize_rows(embeddings: np.ndarray) -> np.ndarray:
+    embeddings = np.asarray(embeddings, dtype=np.float32)
+    if embeddings.ndim == 1:
+        embeddings = embeddings.reshape(1, -1)
+    norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+    return embeddings / np.maximum(norms, 1e-12)
+
+
+def blend_context(query: np.ndarray, context: np.ndarray, weight: float) -> np.ndarray:
+    """Unit-length mix of a query vector and a session context vector, `weight` going to the context."""
+    mixed = (1.0 - weight) * normalize_rows(query)[0] + weight * normalize_rows(context)[0]
+    return normalize_rows(mixed)[0]
+
+
+class ExactIndex:
+    """
+    Exact cosine-similarity index kept in memory.
+
+    Rows are normalized once on insert and stored in one contiguous float32
+    buffer, so a search is a single matrix product. The buffer doubles its
+    capacity when full, which keeps appends amortized O(1) instead of copying
+    the whole matrix on every insert.
+    """
+
+    def __init__(self, initial_capacity: int = 1024, query_block: int = 256):
+        self.initial_capacity = initial_capacity
+        # Queries are scored in blocks so a big batch against a big index
+        # doesn't allocate one huge score matrix
+        self.query_block = query_block
+        self._buffer: Optional[np.ndarray] = None
+        self._size = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    @property
+    def dimension(self) -> Optional[int]:
+        return None if self._buffer is None else self._buffer.shape[1]
+
+    @property
+    def capacity(self) -> int:
+        return 0 if self._buffer is None else self._buffer.shape[0]
+
+    @property
+    def vectors(self) -> np.ndarray:
+        if self._buffer is None:
+            return np.empty((0, 0), dtype=np.float32)
+        return self._buffer[:self._size]
+
+    def reset(self, embeddings: np.ndarray) -> None:
+        """Replace the whole index with `embeddings` in one allocation."""
+        embeddings = normalize_rows(embeddings)
+        capacity = max(len(embeddings), self.initial_capacity)
+        self._buffer = np.empty((capacity, embeddings.shape[1]), dtype=np.float32)
+        self._buffer[:len(embeddings)] = embeddings
+        self._size = len(embeddings)
+
+    def attach(self, normalized: np.ndarray) -> None:
+        """
+        Use already-normalized rows as the index without copying them, e.g. a
+        read-only memmap. The first add() moves them into a private buffer.
+        """
+        self._buffer = normalized
+        self._size = len(normalized)
+
+    def add(self, embeddings: np.ndarray) -> None:
+        embeddings = normalize_rows(embeddings)
+        if self._buffer is None:
+            self._buffer = np.empty((self.initial_capacity, embeddings.shape[1]), dtype=np.float32)
+
+        needed = self._size + len(embeddings)
+        if needed > self.capacity:
+            capacity = max(self.capacity, self.initial_capacity)
+            while capacity < needed:
+                capacity *= 2
+            grown = np.empty((capacity, self._buffer.shape[1]), dtype=np.float32)
+            grown[:self._size] = self._buffer[:self._size]
+            self._buffer = grown
+
+        self._buffer[self._size:needed] = embeddings
+        self._size = needed
+
+    def search(self, queries: np.ndarray, top_k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Return (indices, scores), each of shape (len(queries), k), best first,
+        with k = min(top_k, len(self)).
+        """
+        queries = normalize_rows(queries)
+        k = min(top_k, self._size)
+        indices = np.empty((len(queries), k), dtype=np.int64)
+        scores = np.empty((len(queries), k), dtype=np.float32)
+        if k == 0:
+            return indices, scores
+
+        vectors = self.vectors
+        for start in range(0, len(queries), self.query_block):
+            block = queries[start:start + self.query_block] @ vectors.T
+
+            if k < self._size:
+                top = np.argpartition(-block, k - 1, axis=1)[:, :k]
+            else:
+                top = np.broadcast_to(np.arange(self._size), block.shape).copy()
+            top_scores = np.take_along_axis(block, top, axis=1)
+            order = np.argsort(-top_scores, axis=1)
+
+            indices[start:start + len(block)] = np.take_along_axis(top, order, axis=1)
+            scores[start:start + len(block)] = np.take_along_axis(top_scores, order, axis=1)
+
+        return indices, scores
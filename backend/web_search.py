@@ -0,0 +1,254 @@
+import asyncio
+import logging
+import random
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from typing import Dict, Optional, Tuple
+
+from lru_cache import LRUCache, normalize_query
+
+logger = logging.getLogger(__name__)
+
+
+class DuckDuckGoProvider:
+    """DuckDuckGo text search, one reused DDGS client per executor thread."""
+
+    name = "duckduckgo"
+
+    def __init__(self, request_timeout: float = 5.0):
+        self.request_timeout = request_timeout
+        self._local = threading.local()
+
+    def _client(self):
+        client = getattr(self._local, "client", None)
+        if client is None:
+            from duckduckgo_search import DDGS
+
+            client = DDGS(timeout=self.request_timeout)
+            self._local.client = client
+        return client
+
+    def search(self, query: str) -> Optional[Dict]:
+        try:
+            results = self._client().text(query, max_results=1)
+        except Exception:
+            # Don't keep reusing a client whose session may be broken
+            self._local.client = None
+            raise
+        if not results:
+            return None
+        return {
+            "answer": results[0]["body"],
+            "source": results[0]["href"],
+            "title": results[0]["title"],
+        }
+
+
+class StubProvider:
+    """Offline stand-in for load tests: configurable latency and failure rate, no network."""
+
+    name = "stub"
+
+    def __init__(self, latency_ms: float = 50.0, failure_rate: float = 0.0, seed: Optional[int] = None):
+        self.latency_ms = latency_ms
+        self.failure_rate = failure_rate
+        self._random = random.Random(seed)
+
+    def search(self, query: str) -> Optional[Dict]:
+        time.sleep(self.latency_ms / 1000.0)
+        if self._random.random() < self.failure_rate:
+            raise RuntimeError("stub provider failure")
+        return {
+            "answer": f"Stub web answer for: {query}",
+            "source": "https://example.invalid/stub",
+            "title": "Stub result",
+        }
+
+
+class CircuitBreaker:
+    """
+    Opens after `failure_threshold` consecutive failures and rejects calls
+    for `reset_timeout` seconds; after that one trial call is let through
+    and its outcome closes or re-opens the breaker.
+    """
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._lock = threading.Lock()
+        self._failures = 0
+        self._opened_at: Optional[float] = None
+        self._trial_in_flight = False
+        self.times_opened = 0
+
+    @property
+    def state(self) -> str:
+        if self._opened_at is None:
+            return "closed"
+        if time.monotonic() - self._opened_at >= self.reset_timeout:
+            return "half_open"
+        return "open"
+
+    def allow(self) -> bool:
+        with self._lock:
+            state = self.state
+            if state == "closed":
+                return True
+            if state == "half_open" and not self._trial_in_flight:
+                self._trial_in_flight = True
+                return True
+            return False
+
+    def record_success(self) -> None:
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._trial_in_flight = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._failures += 1
+            if self._trial_in_flight or self._failures >= self.failure_threshold:
+                if self._opened_at is None or self._trial_in_flight:
+                    self.times_opened += 1
+                self._opened_at = time.monotonic()
+                self._trial_in_flight = False
+
+
+class WebSearcher:
+    """
+    Web fallback with a hard deadline per call.
+
+    Calls run on a bounded thread pool: a request waits at most `timeout`
+    seconds, and when every slot is busy (e.g. upstream is hanging) new
+    searches are rejected immediately instead of queueing behind them.
+    Answers are cached by normalized query, and a circuit breaker skips the
+    web step entirely while recent calls keep failing.
+
+    `search_async` is the same call for an event loop: the provider still
+    runs on the pool, the loop only awaits it.
+    """
+
+    def __init__(
+        self,
+        provider,
+        max_workers: int = 4,
+        max_pending: int = 8,
+        timeout: float = 3.0,
+        cache_size: int = 1024,
+        cache_ttl: float = 3600.0,
+        breaker: Optional[CircuitBreaker] = None
+    ):
+        self.provider = provider
+        self.timeout = timeout
+        self.cache = LRUCache(max_size=cache_size, ttl_seconds=cache_ttl)
+        self.breaker = breaker or CircuitBreaker()
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self._start_pool()
+        self.calls = 0
+        self.timeouts = 0
+        self.errors = 0
+        self.rejected = 0
+        self.skipped_open_circuit = 0
+
+    def _start_pool(self) -> None:
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="web-search")
+        self._slots = threading.BoundedSemaphore(self.max_workers + self.max_pending)
+        self._lock = threading.Lock()
+
+    def after_fork(self) -> None:
+        # Pool threads don't survive fork(), a forked worker needs its own pool
+        self._start_pool()
+
+    def _count(self, counter: str) -> None:
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def _start(self, query: str) -> Tuple[str, Optional[Dict], Optional[Future]]:
+        key = normalize_query(query).casefold()
+        cached = self.cache.get(key)
+        if cached is not None:
+            return key, cached, None
+
+        if not self.breaker.allow():
+            self._count("skipped_open_circuit")
+            return key, None, None
+
+        if not self._slots.acquire(blocking=False):
+            self._count("rejected")
+            # Every slot busy means upstream is hanging - counts as a failure
+            self.breaker.record_failure()
+            return key, None, None
+
+        self._count("calls")
+        future = self._executor.submit(self.provider.search, query)
+        future.add_done_callback(lambda _: self._slots.release())
+        return key, None, future
+
+    def _failed(self, counter: str, message: str) -> None:
+        self._count(counter)
+        self.breaker.record_failure()
+        if counter == "timeouts":
+            logger.warning(message)
+        else:
+            logger.error(message)
+        return None
+
+    def _succeeded(self, key: str, result: Optional[Dict]) -> Optional[Dict]:
+        self.breaker.record_success()
+        if result:
+            self.cache.put(key, result)
+        return result
+
+    def search(self, query: str) -> Optional[Dict]:
+        key, cached, future = self._start(query)
+        if future is None:
+            return cached
+
+        try:
+            result = future.result(timeout=self.timeout)
+        except FutureTimeoutError:
+            return self._failed("timeouts", f"Web search timed out after {self.timeout}s")
+        except Exception as e:
+            return self._failed("errors", f"Web search error: {e}")
+        return self._succeeded(key, result)
+
+    async def search_async(self, query: str) -> Optional[Dict]:
+        key, cached, future = self._start(query)
+        if future is None:
+            return cached
+
+        try:
+            result = await asyncio.wait_for(asyncio.wrap_future(future), self.timeout)
+        except asyncio.TimeoutError:
+            return self._failed("timeouts", f"Web search timed out after {self.timeout}s")
+        except Exception as e:
+            return self._failed("errors", f"Web search error: {e}")
+        return self._succeeded(key, result)
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def stats(self) -> Dict:
+        return {
+            "provider": self.provider.name,
+            "timeout_s": self.timeout,
+            "circuit": self.breaker.state,
+            "circuit_opened": self.breaker.times_opened,
+            "calls": self.calls,
+            "timeouts": self.timeouts,
+            "errors": self.errors,
+            "rejected": self.rejected,
+            "skipped_open_circuit": self.skipped_open_circuit,
+            "cache": self.cache.stats(),
+        }
+
+
+def build_provider(name: str):
+    if name == "duckduckgo":
+        return DuckDuckGoProvider()
+    if name == "stub":
+        return StubProvider()
+    raise ValueError(f"Unknown web search provider '{name}'")